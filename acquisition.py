@@ -0,0 +1,683 @@
+"""
+Acquisition des images de la caméra dans un thread séparé.
+
+Un thread de lecture date chaque image et la place dans un tampon circulaire borné ;
+l'analyse et l'affichage consomment ensuite ce tampon à leur propre rythme, si bien
+qu'une étape lente ne bloque plus la lecture de la caméra.
+
+L'enregistrement vidéo suit le même principe (AsyncVideoWriter) : l'encodage et l'écriture
+sur le disque se font dans un thread séparé.
+
+Profiler chronomètre les étapes des boucles en direct (lecture, conversion, filtrage, dessin,
+waitKey, ...) image par image, pour savoir laquelle ralentit l'acquisition.
+"""
+
+#%%
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+import cv2
+
+#%%
+
+class FrameBuffer:
+    """
+    Tampon circulaire borné partagé entre threads.
+
+    Lorsque le tampon est plein, policy détermine le comportement de put :
+    - "block" : attend qu'une place se libère,
+    - "drop" : supprime l'image la plus ancienne et compte la perte dans dropped.
+    """
+
+    def __init__(self, maxsize=64, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Politique de tampon inconnue : {policy}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0  # Nombre d'images supprimées
+        self.closed = False
+        self.items = deque()
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """
+        Ajoute un élément au tampon. Renvoie False si le tampon a été fermé.
+
+        """
+        with self.condition:
+            if self.policy == "block":
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+
+            if self.closed:
+                return False
+
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Retire et renvoie l'élément le plus ancien, ou None si le tampon est fermé et vide
+        ou si rien n'est arrivé avant timeout secondes.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            if not self.items:
+                return None
+
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        """
+        Ferme le tampon et réveille les threads en attente.
+
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+#%%
+
+class StageTimer:
+    """
+    Accumule les durées d'une étape de traitement.
+
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+
+    def summary(self):
+        """
+        Renvoie le nombre de mesures et les durées moyenne, maximale et dernière en millisecondes.
+
+        """
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "last_ms": self.last * 1000,
+        }
+
+class RateMeter:
+    """
+    Mesure la fréquence réelle des images à partir de leurs instants de capture.
+
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.duration = 0.0
+        self.last = None
+
+    def add(self, timestamp):
+        if self.last is not None:
+            self.frames += 1
+            self.duration += timestamp - self.last
+        self.last = timestamp
+
+    def pause(self):
+        """
+        Interrompt la mesure : l'intervalle jusqu'à la prochaine image n'est pas compté.
+
+        """
+        self.last = None
+
+    @property
+    def fps(self):
+        return self.frames / self.duration if self.duration > 0 else 0.0
+
+#%%
+
+class _Stage:
+    # Chronomètre d'une étape, utilisé avec with (voir Profiler.stage)
+    __slots__ = ("profiler", "name", "session", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.session = profiler.session
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start, self.session)
+
+class Profiler:
+    """
+    Chronomètre les étapes d'une boucle d'acquisition, image par image.
+
+    Chaque étape est mesurée avec "with profiler.stage(nom):" et frame est appelé une fois par image :
+    la durée de chaque étape pour cette image, la fréquence obtenue, les images perdues et la
+    profondeur du tampon (si pipeline est donné) sont ajoutées à la série temporelle (les history
+    dernières images), exportable en CSV ou JSON, et les cumuls sont tenus dans des StageTimer.
+
+    Désactivé (enabled False), stage renvoie un contexte vide et frame ne fait rien : les mesures
+    peuvent rester dans la boucle sans la ralentir.
+
+    Les méthodes peuvent être appelées depuis plusieurs threads, mais les durées sont rattachées
+    à l'image que termine le prochain appel à frame : une boucle exécutée dans un autre thread
+    (analyse de CapturePipeline.consume, par exemple) doit avoir son propre Profiler.
+    """
+
+    def __init__(self, nominal_fps=None, enabled=True, history=100000):
+        self.nominal_fps = nominal_fps
+        self.enabled = enabled
+        self.stages = {}  # StageTimer de chaque étape
+        self.rate = RateMeter()
+        self.series = deque(maxlen=history)  # Une ligne par image
+        self.current = {}  # Durées des étapes de l'image en cours
+        self.start = None
+        self.session = 0  # Incrémenté à chaque activation ou désactivation
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """
+        Renvoie le chronomètre de l'étape name, à utiliser avec with.
+
+        """
+        if not self.enabled:
+            return nullcontext()
+        return _Stage(self, name)
+
+    def add(self, name, duration, session=None):
+        """
+        Ajoute une durée (en secondes) à l'étape name de l'image en cours. Une étape commencée
+        avant une activation ou une désactivation (session différente) est ignorée.
+        """
+        with self.lock:
+            if not self.enabled or (session is not None and session != self.session):
+                return
+            if name not in self.stages:
+                self.stages[name] = StageTimer()
+            self.stages[name].add(duration)
+            self.current[name] = self.current.get(name, 0.0) + duration
+
+    def frame(self, timestamp=None, pipeline=None):
+        """
+        Termine l'image en cours (instant de capture timestamp, maintenant par défaut) et l'ajoute
+        à la série temporelle, avec la lecture, l'attente et l'analyse mesurées par pipeline.
+        """
+        if not self.enabled:
+            return
+
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        row = {}
+        if pipeline is not None:
+            for name, stage in pipeline.stages.items():
+                row[name] = stage.last * 1000
+            row["dropped"] = pipeline.buffer.dropped
+            row["depth"] = len(pipeline.buffer)
+
+        with self.lock:
+            if not self.enabled:
+                return
+            if self.start is None:
+                self.start = timestamp
+            self.rate.add(timestamp)
+            row = {"time": timestamp - self.start, **row}
+            row.update({name: duration * 1000 for name, duration in self.current.items()})
+            self.current = {}
+            self.series.append(row)
+
+    def toggle(self):
+        """
+        Active ou désactive les mesures (la fréquence n'est pas mesurée pendant l'arrêt).
+
+        """
+        with self.lock:
+            self.enabled = not self.enabled
+            self.session += 1
+            self.rate.pause()
+            self.current = {}
+
+    def recent(self, frames=30):
+        """
+        Renvoie les lignes de la série temporelle des frames dernières images.
+
+        """
+        with self.lock:
+            return [self.series[i] for i in range(-min(frames, len(self.series)), 0)]
+
+    def recent_fps(self, frames=30):
+        """
+        Renvoie la fréquence des frames dernières images mesurées.
+
+        """
+        rows = self.recent(frames)
+        if len(rows) < 2 or rows[-1]["time"] <= rows[0]["time"]:
+            return 0.0
+        return (len(rows) - 1) / (rows[-1]["time"] - rows[0]["time"])
+
+    def draw(self, frame, frames=30, x=10, title=None):
+        """
+        Affiche sur frame, en bas à partir de l'abscisse x, la fréquence obtenue et nominale, la
+        durée moyenne de chaque étape sur les frames dernières images, les images perdues et la
+        profondeur du tampon, précédées de title s'il est donné.
+        """
+        if not self.enabled:
+            return
+        rows = self.recent(frames)
+        if not rows:
+            return
+
+        nominal = f" / {self.nominal_fps:.0f}" if self.nominal_fps else ""
+        lines = [f"{self.recent_fps(frames):.1f}{nominal} images/s"]
+        if title:
+            lines.insert(0, title)
+        for name in rows[-1]:
+            if name in ("time", "dropped", "depth"):
+                continue
+            lines.append(f"{name} : {sum(row.get(name, 0.0) for row in rows) / len(rows):.2f} ms")
+        if "dropped" in rows[-1]:
+            lines.append(f"perdues : {rows[-1]['dropped']}  tampon : {rows[-1]['depth']}")
+
+        y = frame.shape[0] - 10 - 18 * (len(lines) - 1)
+        for line in lines:
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1, cv2.LINE_AA)
+            y += 18
+
+    def stats(self):
+        """
+        Renvoie les durées par étape, au format de CapturePipeline.stats (voir print_stats).
+
+        """
+        with self.lock:
+            return {name: stage.summary() for name, stage in self.stages.items()}
+
+    def export(self, file_name):
+        """
+        Enregistre la série temporelle dans un fichier CSV (une ligne par image, durées en ms)
+        ou JSON (même série, avec la fréquence nominale et obtenue et le cumul de chaque étape).
+        """
+        with self.lock:
+            rows = list(self.series)
+        if file_name.endswith(".json"):
+            with open(file_name, "w") as file:
+                json.dump({"nominal_fps": self.nominal_fps, "fps": self.rate.fps, "stages": self.stats(), "frames": rows}, file, indent=1)
+            return
+
+        columns = list(dict.fromkeys(name for row in rows for name in row))
+        with open(file_name, "w", newline="") as table:
+            writer = csv.DictWriter(table, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+#%%
+
+class CapturePipeline:
+    """
+    Lit les images de cap dans un thread et les place, datées, dans un FrameBuffer.
+
+    Chaque image est un dictionnaire {"index", "timestamp", "frame"}. Les images sont consommées :
+    - soit dans l'ordre, avec read (même interface que cv2.VideoCapture.read) ou get,
+    - soit par un thread d'analyse lancé avec consume.
+    latest renvoie la dernière image lue sans la retirer du tampon, pour l'affichage
+    (qui doit rester dans le thread principal avec HighGUI).
+
+    Les propriétés de la caméra modifiées avec set sont appliquées par le thread de lecture
+    entre deux images, pour ne pas appeler cap.set pendant un cap.read. Pour la même raison,
+    la caméra est libérée avec release, qui attend la fin du thread de lecture.
+    """
+
+    def __init__(self, cap, maxsize=64, policy="block"):
+        self.cap = cap
+        self.buffer = FrameBuffer(maxsize, policy)
+        self.stages = {"read": StageTimer(), "queue": StageTimer(), "analysis": StageTimer()}
+        self.running = False
+        self.threads = []
+        self.pending = {}  # Propriétés de la caméra à appliquer
+        self.last_packet = None
+        self.new_frame = threading.Condition()
+        self.lock = threading.Lock()  # Protège pending et la libération de la caméra
+        self.reading = False  # Thread de lecture en cours (peut être dans cap.read)
+        self.release_on_exit = False  # Caméra à libérer par le thread de lecture en sortant
+
+    def start(self):
+        self.running = True
+        self.reading = True
+        self._start_thread(self._reader)
+        return self
+
+    def _start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _reader(self):
+        try:
+            self._read_loop()
+        finally:
+            with self.lock:
+                self.reading = False
+                if self.release_on_exit:
+                    self.cap.release()
+
+    def _read_loop(self):
+        index = 0
+        while self.running:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for prop, value in pending.items():
+                self.cap.set(prop, value)
+
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            timestamp = time.perf_counter()
+            if not ret:
+                break
+
+            self.stages["read"].add(timestamp - start)
+            packet = {"index": index, "timestamp": timestamp, "frame": frame}
+
+            with self.new_frame:
+                self.last_packet = packet
+                self.new_frame.notify_all()
+
+            if not self.buffer.put(packet):
+                break
+            index += 1
+
+        self.running = False
+        self.buffer.close()
+        with self.new_frame:
+            self.new_frame.notify_all()
+
+    def set(self, prop, value):
+        """
+        Demande la modification d'une propriété de la caméra (appliquée par le thread de lecture).
+
+        """
+        with self.lock:
+            self.pending[prop] = value
+
+    def get(self, timeout=None):
+        """
+        Retire et renvoie la plus ancienne image du tampon (None à la fin de l'acquisition).
+
+        """
+        packet = self.buffer.get(timeout)
+        if packet is not None:
+            self.stages["queue"].add(time.perf_counter() - packet["timestamp"])
+        return packet
+
+    def read(self, timeout=None):
+        """
+        Équivalent de cv2.VideoCapture.read sur le tampon.
+
+        """
+        packet = self.get(timeout)
+        if packet is None:
+            return False, None
+        return True, packet["frame"]
+
+    def latest(self, after=-1, timeout=1.0):
+        """
+        Renvoie la dernière image lue si son index est supérieur à after, en l'attendant au plus
+        timeout secondes. Renvoie None si l'acquisition est terminée ou si rien n'est arrivé.
+        """
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: not self.running or (self.last_packet is not None and self.last_packet["index"] > after), timeout)
+            packet = self.last_packet
+        if packet is None or packet["index"] <= after:
+            return None
+        return packet
+
+    def consume(self, callback):
+        """
+        Lance un thread d'analyse qui appelle callback(packet) sur chaque image du tampon.
+
+        """
+        self._start_thread(self._consumer, callback)
+
+    def _consumer(self, callback):
+        while True:
+            packet = self.get()
+            if packet is None:
+                break
+            start = time.perf_counter()
+            callback(packet)
+            self.stages["analysis"].add(time.perf_counter() - start)
+
+    def stop(self, timeout=2):
+        """
+        Arrête la lecture et attend la fin des threads (au plus timeout secondes chacun).
+        Renvoie False si un thread est encore actif, par exemple bloqué dans cap.read.
+        """
+        self.running = False
+        self.buffer.close()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        return not self.threads
+
+    def release(self, timeout=2):
+        """
+        Arrête la lecture puis libère la caméra. Si le thread de lecture est encore dans
+        cap.read, la libération est faite par ce thread dès qu'il en sort.
+        Renvoie True si la caméra a été libérée immédiatement.
+        """
+        self.stop(timeout)
+        with self.lock:
+            if self.reading:
+                self.release_on_exit = True
+                return False
+        self.cap.release()
+        return True
+
+    def stats(self):
+        """
+        Renvoie les latences par étape, le nombre d'images perdues et la profondeur du tampon.
+
+        """
+        stats = {name: stage.summary() for name, stage in self.stages.items()}
+        stats["dropped"] = self.buffer.dropped
+        stats["depth"] = len(self.buffer)
+        return stats
+
+#%%
+
+class CameraControl:
+    """
+    Réglages de la caméra (contraste, luminosité, gain, ...) envoyés seulement lorsqu'ils changent.
+
+    Sur beaucoup de pilotes UVC, chaque cap.set est un transfert USB bloquant : set mémorise la
+    valeur voulue et update ne transmet (avec apply, par exemple CapturePipeline.set) que les
+    valeurs différentes de la dernière valeur appliquée. Pendant qu'une trackbar est déplacée,
+    les valeurs intermédiaires sont regroupées : une valeur est envoyée lorsqu'elle n'a pas
+    changé depuis settle secondes, ou au plus tard interval secondes après son premier changement.
+    """
+
+    def __init__(self, apply, initial=None, settle=0.1, interval=0.25):
+        self.apply = apply
+        self.settle = settle
+        self.interval = interval
+        self.applied = dict(initial or {})  # Dernières valeurs envoyées à la caméra
+        self.wanted = {}  # {prop: (valeur demandée, instant du dernier changement, instant du premier changement non envoyé)}
+        self.writes = 0  # Nombre de réglages envoyés
+
+    def set(self, prop, value, now=None):
+        """
+        Demande la valeur value pour la propriété prop (envoyée par update).
+
+        """
+        now = time.perf_counter() if now is None else now
+        previous, _, pending = self.wanted.get(prop, (None, None, None))
+        if value != previous:
+            self.wanted[prop] = (value, now, now if pending is None else pending)
+
+    def update(self, now=None):
+        """
+        Envoie les réglages modifiés qui sont stables ou en attente depuis trop longtemps.
+        Renvoie le nombre de réglages envoyés.
+        """
+        now = time.perf_counter() if now is None else now
+        pushed = 0
+        for prop, (value, changed, pending) in self.wanted.items():
+            if pending is None:
+                continue
+            if self.applied.get(prop) != value:
+                if now - changed < self.settle and now - pending < self.interval:
+                    continue  # Trackbar en mouvement : envoi différé
+                self.apply(prop, value)
+                self.applied[prop] = value
+                pushed += 1
+            self.wanted[prop] = (value, changed, None)
+
+        self.writes += pushed
+        return pushed
+
+#%%
+
+class AsyncVideoWriter:
+    """
+    Enregistre une vidéo dans un thread séparé : write place l'image dans un tampon borné
+    et rend la main immédiatement. Si l'encodeur ou le disque n'arrive pas à suivre, les images
+    les plus anciennes du tampon sont supprimées (comptées dans stats) au lieu de bloquer l'acquisition.
+
+    L'enregistrement est découpé en segments (base_name.avi, base_name_part2.avi, ...) lorsque
+    max_bytes octets ou max_seconds secondes sont atteints. Chaque segment est accompagné d'un
+    fichier .csv donnant, pour chaque image enregistrée, son index de capture et son instant de capture.
+    """
+
+    def __init__(self, base_name, fps, codec="MJPG", maxsize=128, max_bytes=None, max_seconds=None):
+        self.base_name = base_name
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer = FrameBuffer(maxsize, "drop")
+        self.timer = StageTimer()
+        self.segments = []  # Noms des fichiers vidéo écrits
+        self.thread = None
+        self.writer = None
+        self.sidecar = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, frame, timestamp=None, index=None):
+        """
+        Ajoute une image à enregistrer, avec son instant et son index de capture.
+        L'image ne doit plus être modifiée ensuite (dessiner sur une copie).
+        """
+        self.buffer.put({"frame": frame, "timestamp": time.perf_counter() if timestamp is None else timestamp, "index": index})
+
+    def _open_segment(self, frame):
+        self._close_segment()
+
+        n = len(self.segments)
+        file_name = self.base_name + (f"_part{n + 1}" if n else "") + ".avi"
+        self.writer = cv2.VideoWriter(file_name, self.fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+        if not self.writer.isOpened():
+            print(f"Erreur : Impossible de créer le fichier {file_name}.")
+            self.writer = None
+            return False
+
+        self.segments.append(file_name)
+        self.sidecar = open(os.path.splitext(file_name)[0] + ".csv", "w", newline="")
+        self.sidecar_writer = csv.writer(self.sidecar)
+        self.sidecar_writer.writerow(["frame", "index", "timestamp"])
+        self.segment_frames = 0
+        self.segment_start = None
+        return True
+
+    def _close_segment(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+        if self.sidecar is not None:
+            self.sidecar.close()
+            self.sidecar = None
+
+    def _segment_full(self, timestamp):
+        if self.max_seconds is not None and timestamp - self.segment_start >= self.max_seconds:
+            return True
+        if self.max_bytes is not None and os.path.getsize(self.segments[-1]) >= self.max_bytes:
+            return True
+        return False
+
+    def _run(self):
+        while True:
+            packet = self.buffer.get()
+            if packet is None:
+                break
+
+            frame, timestamp = packet["frame"], packet["timestamp"]
+            if self.writer is None or self._segment_full(timestamp):
+                if not self._open_segment(frame):
+                    break
+
+            start = time.perf_counter()
+            self.writer.write(frame)
+            self.timer.add(time.perf_counter() - start)
+
+            if self.segment_start is None:
+                self.segment_start = timestamp
+            self.sidecar_writer.writerow([self.segment_frames, packet["index"], f"{timestamp:.6f}"])
+            self.segment_frames += 1
+
+        self._close_segment()
+        self.buffer.close()
+
+    def close(self):
+        """
+        Termine l'écriture des images en attente et ferme les fichiers.
+
+        """
+        self.buffer.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self._close_segment()
+
+    def stats(self):
+        """
+        Renvoie la durée d'écriture des images, le nombre d'images perdues et la profondeur du tampon
+        (même format que CapturePipeline.stats).
+        """
+        return {"write": self.timer.summary(), "dropped": self.buffer.dropped, "depth": len(self.buffer), "segments": len(self.segments)}
+
+#%%
+
+def print_stats(stats):
+    """
+    Affiche les statistiques renvoyées par CapturePipeline.stats (ou Profiler.stats).
+
+    """
+    print("Latence par étape :")
+    for name, stage in stats.items():
+        if isinstance(stage, dict) and stage["count"]:
+            print(f"  {name:<15} {stage['count']:7d} images  moyenne {stage['mean_ms']:7.2f} ms  max {stage['max_ms']:7.2f} ms")
+    if "dropped" in stats:
+        print(f"Images perdues : {stats['dropped']}  (tampon : {stats['depth']} images en attente)")
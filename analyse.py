@@ -8,7 +8,11 @@ Created on Fri Feb  7 22:17:24 2025
 
 import cv2
 import numpy as np
-from scipy.signal import savgol_filter
+from contextlib import nullcontext
+from functools import lru_cache
+from scipy.fft import rfft
+from scipy.ndimage import convolve1d, maximum_filter1d, minimum_filter1d
+from scipy.signal import find_peaks, hilbert, savgol_coeffs, savgol_filter
 
 #%%
 
@@ -21,55 +25,464 @@ def get_position(event, x, y, flags, param):
         param["click_position"] = (x, y)  
         
 
+#%%
+
+def estimate_center(frame, width=160, iterations=3, search=None):
+    """
+    Estime automatiquement le centre des anneaux par vote de symétrie radiale.
+    
+    Si search = ((x, y), rayon) est donné, seul le carré de côté 2 * rayon centré sur (x, y)
+    est analysé (suivi d'un centre déjà connu).
+    L'image (ou le carré) est réduite à width pixels de large et lissée. Pour des anneaux concentriques,
+    le gradient de luminosité est radial : chaque pixel de fort gradient définit une droite
+    passant par le centre. Le centre est le point le plus proche (moindres carrés pondérés
+    par la norme du gradient) de toutes ces droites, les droites trop éloignées étant
+    progressivement écartées.
+    
+    Retourne le centre (x, y) en pixels de l'image d'origine et un indice de confiance entre
+    0 et 1 : la part du gradient portée par des droites passant à moins de 2 % de la diagonale
+    du centre trouvé.
+    """
+    x0, y0 = 0, 0
+    if search is not None:
+        (x, y), radius = search
+        x0, y0 = max(x - radius, 0), max(y - radius, 0)
+        frame = frame[y0:y + radius, x0:x + radius]
+    
+    height, full_width = frame.shape[:2]
+    if height < 8 or full_width < 8:
+        return None, 0.0
+    scale = min(width / full_width, 1)
+    small = cv2.resize(frame, (max(int(full_width * scale), 1), max(int(height * scale), 1)), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    small = cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+    
+    gx = cv2.Sobel(small, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(small, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude = np.hypot(gx, gy)
+    
+    # Les 20 % de pixels de plus fort gradient votent
+    threshold = np.percentile(magnitude, 80)
+    ys, xs = np.nonzero(magnitude > max(threshold, 1e-6))
+    if len(xs) < 10:
+        return None, 0.0
+    
+    w = magnitude[ys, xs]
+    nx = -gy[ys, xs] / w  # Normale à la droite portée par le gradient
+    ny = gx[ys, xs] / w
+    d = nx * xs + ny * ys  # Équation de la droite : nx * x + ny * y = d
+    
+    tolerance = 0.02 * np.hypot(*small.shape)
+    weights = w
+    center = None
+    for _ in range(iterations):
+        A = np.array([[np.sum(weights * nx * nx), np.sum(weights * nx * ny)],
+                      [np.sum(weights * nx * ny), np.sum(weights * ny * ny)]])
+        b = np.array([np.sum(weights * nx * d), np.sum(weights * ny * d)])
+        if abs(np.linalg.det(A)) < 1e-9:
+            return None, 0.0
+        center = np.linalg.solve(A, b)
+        
+        distance = np.abs(nx * center[0] + ny * center[1] - d)
+        weights = w / (1 + (distance / tolerance) ** 2)  # Écarte les droites éloignées du centre
+    
+    confidence = float(np.sum(w[distance < tolerance]) / np.sum(w))
+    
+    x, y = (center + 0.5) / scale - 0.5  # Centres des pixels de l'image réduite dans l'image d'origine
+    if not (0 <= x < full_width and 0 <= y < height):
+        return None, 0.0
+    
+    return (int(round(x)) + x0, int(round(y)) + y0), confidence
+
+class CenterTracker:
+    """
+    Suivi de la dérive du centre des anneaux pendant un long comptage.
+    
+    Toutes les every images, le centre est réestimé avec estimate_center dans un carré de
+    rayon radius autour de l'estimation précédente, réduit à width pixels de large. Une
+    estimation de confiance inférieure à min_confidence est ignorée. Si center vaut None, la
+    première estimation porte sur l'image entière.
+    La trajectoire (image, x, y, confiance) est enregistrée à chaque estimation.
+    """
+    
+    def __init__(self, center, every=10, radius=120, width=96, min_confidence=0.5):
+        self.center = tuple(center) if center is not None else None
+        self.every = every
+        self.radius = radius
+        self.width = width
+        self.min_confidence = min_confidence
+        self.frames = 0  # Nombre d'images reçues
+        self.trajectory = []
+    
+    def update(self, frame):
+        """
+        Renvoie le centre à utiliser pour cette image, après réestimation si nécessaire.
+        
+        """
+        if self.center is None:
+            self.center, confidence = estimate_center(frame)
+            if self.center is None:
+                return None
+            self.trajectory.append((self.frames, self.center[0], self.center[1], confidence))
+        elif self.frames % self.every == 0:
+            center, confidence = estimate_center(frame, self.width, search=(self.center, self.radius))
+            if center is not None and confidence >= self.min_confidence:
+                self.center = center
+            self.trajectory.append((self.frames, self.center[0], self.center[1], confidence))
+        
+        self.frames += 1
+        return self.center
+    
+    def get_trajectory(self):
+        """
+        Renvoie la trajectoire du centre sous forme de tableau (estimations * [image, x, y, confiance]).
+        
+        """
+        return np.array(self.trajectory, dtype=float).reshape(-1, 4)
+
 #%% 
 
-def get_position_luminosity(center,frame):
+@lru_cache(maxsize=None)
+def get_roi_mask(size=11, shape="square", inner=0):
+    """
+    Renvoie le masque booléen (size*size) de la zone de mesure :
+    - "square" : tout le carré,
+    - "disk" : le disque inscrit dans le carré,
+    - "annulus" : l'anneau compris entre les rayons inner et size // 2 (0 <= inner < size // 2).
+    
+    """
+    if shape == "annulus" and not 0 <= inner < size // 2:
+        raise ValueError(f"Rayon intérieur de l'anneau invalide : {inner} (0 <= inner < {size // 2})")
+    
+    offsets = np.arange(size) - size // 2
+    radius = np.hypot(offsets[:, None], offsets[None, :])
+    
+    if shape == "square":
+        mask = np.ones((size, size), dtype=bool)
+    elif shape == "disk":
+        mask = radius <= size // 2
+    elif shape == "annulus":
+        mask = (radius >= inner) & (radius <= size // 2)
+    else:
+        raise ValueError(f"Forme de zone inconnue : {shape}")
+    
+    mask.setflags(write=False)  # Le masque est partagé par le cache
+    return mask
+
+def get_roi(center, frame_shape, size=11, shape="square", inner=0):
     """
-   Calcule la luminosité moyenne dans un carré de 10*10 autour du centre sélectionné.
+    Renvoie les tranches (lignes, colonnes) de la zone de mesure centrée sur center,
+    limitées aux bords de l'image, et le masque correspondant.
+    Lève une ValueError si la zone est entièrement hors de l'image.
+    """
+    x, y = center
+    height, width = frame_shape[:2]
+    y0, x0 = y - size // 2, x - size // 2
+    
+    top, left = min(max(y0, 0), height), min(max(x0, 0), width)
+    rows = slice(top, max(min(y0 + size, height), top))
+    cols = slice(left, max(min(x0 + size, width), left))
+    mask = get_roi_mask(size, shape, inner)[rows.start - y0:rows.stop - y0, cols.start - x0:cols.stop - x0]
+    if not mask.any():
+        raise ValueError(f"Zone de mesure hors de l'image ({width}x{height}) : {tuple(center)}")
+    
+    return rows, cols, mask
+
+def get_position_luminosity(center, frame, size=11, shape="square", inner=0):
+    """
+   Calcule la luminosité moyenne dans une zone de size*size autour du centre sélectionné
+   (carré, disque ou anneau, voir get_roi_mask).
+   Seule la zone est convertie en niveaux de gris, pas l'image entière.
    
    """
-    frame=cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    x,y=center
-    pixels=frame[y-5:y+6,x-5:x+6]
+    rows, cols, mask = get_roi(center, frame.shape, size, shape, inner)
+    pixels = frame[rows, cols]
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+    
+    if shape != "square":
+        pixels = pixels[mask]
     return int(np.mean(pixels))
+
+def get_position_luminosity_stack(center, frames, size=11, shape="square", inner=0):
+    """
+    Calcule la luminosité moyenne de la zone de mesure pour une pile d'images
+    (images * hauteur * largeur [* 3]) en une seule conversion en niveaux de gris.
+    
+    Retourne un tableau d'entiers, égal à get_position_luminosity appliqué à chaque image.
+    """
+    frames = np.asarray(frames)
+    rows, cols, mask = get_roi(center, frames.shape[1:], size, shape, inner)
+    pixels = frames[:, rows, cols]
+    n, h, w = pixels.shape[:3]
+    
+    if pixels.ndim == 4:
+        pixels = cv2.cvtColor(np.ascontiguousarray(pixels).reshape(n * h, w, 3), cv2.COLOR_BGR2GRAY).reshape(n, h, w)
+    
+    sums = pixels.reshape(n, -1)[:, mask.ravel()].sum(axis=1, dtype=np.int64)
+    return (sums / np.count_nonzero(mask)).astype(int)
       
+class PointSampler:
+    """
+    Mesure simultanée de la luminosité moyenne autour de plusieurs points.
+    
+    Les indices des pixels de toutes les zones de mesure (voir get_roi) sont calculés une fois
+    pour toutes : chaque image ne demande qu'une lecture groupée des pixels concernés et une
+    conversion en niveaux de gris de ces seuls pixels. Le résultat est identique à
+    get_position_luminosity appliqué à chaque point.
+    Un point dont la zone de mesure est entièrement hors de l'image lève une ValueError.
+    """
+    
+    def __init__(self, centers, frame_shape, size=11, shape="square", inner=0):
+        height, width = frame_shape[:2]
+        self.centers = [tuple(center) for center in centers]
+        self.frame_shape = (height, width)
+        
+        offsets = np.arange(size) - size // 2
+        mask = get_roi_mask(size, shape, inner).ravel()
+        
+        xs = np.array([x for x, y in self.centers])[:, None, None] + offsets[None, None, :]
+        ys = np.array([y for x, y in self.centers])[:, None, None] + offsets[None, :, None]
+        xs, ys = np.broadcast_arrays(xs, ys)
+        xs = xs.reshape(len(self.centers), -1)
+        ys = ys.reshape(len(self.centers), -1)
+        
+        # Pixels hors de l'image : indice ramené dans l'image mais poids nul
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height) & mask
+        self.index = np.clip(ys, 0, height - 1) * width + np.clip(xs, 0, width - 1)
+        self.weights = inside.astype(np.int64)
+        self.counts = inside.sum(axis=1)
+        
+        outside = [center for center, count in zip(self.centers, self.counts) if count == 0]
+        if outside:
+            raise ValueError(f"Zone de mesure hors de l'image ({width}x{height}) : {outside}")
+    
+    def __call__(self, frame):
+        """
+        Renvoie le tableau des luminosités moyennes (entiers) de chaque point pour une image.
+        
+        """
+        if frame.ndim == 3:
+            pixels = frame.reshape(-1, 3)[self.index]  # (points, pixels, 3)
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+        else:
+            pixels = frame.reshape(-1)[self.index]
+        
+        sums = (pixels * self.weights).sum(axis=1)
+        return (sums / self.counts).astype(int)
+
 #%% 
 
-def luminosity_array(frame, center):
+@lru_cache(maxsize=None)
+def get_savgol_kernel(window_length=13, polyorder=3):
+    """
+    Renvoie les coefficients du filtre de Savitzky-Golay, calculés une seule fois par couple
+    (window_length, polyorder) : le noyau de convolution et les matrices des deux bords.
+    
+    Ligne i de la matrice d'un bord : coefficients donnant la valeur au point i du polynôme
+    ajusté sur la première (resp. dernière) fenêtre, comme le mode "interp" de savgol_filter :
+    window_length // 2 points de chaque côté, que la fenêtre soit de longueur paire ou impaire.
+    """
+    half = window_length // 2
+    kernel = savgol_coeffs(window_length, polyorder)
+    edges = np.array([savgol_coeffs(window_length, polyorder, pos=pos, use="dot") for pos in range(window_length)])
+    
+    left, right = edges[:half], edges[window_length - half:]
+    for array in (kernel, left, right):
+        array.setflags(write=False)  # Partagés par tous les appels
+    return kernel, left, right
+
+def savgol_smooth(L, window_length=13, polyorder=3, axis=-1):
+    """
+    Lisse L par un filtre de Savitzky-Golay le long de axis. Même résultat que
+    savgol_filter(L, window_length, polyorder, axis=axis) aux arrondis près, sans recalculer
+    les coefficients ni ajuster de polynôme aux bords à chaque appel.
+    
+    L peut être un profil, une trace temporelle de luminosité ou une pile de profils
+    (images × largeur), lissée en une seule convolution.
+    """
+    L = np.moveaxis(np.asarray(L, dtype=float), axis, -1)
+    n = L.shape[-1]
+    if n < window_length:
+        return savgol_filter(np.moveaxis(L, -1, axis), window_length, polyorder, axis=axis)
+    
+    kernel, left, right = get_savgol_kernel(window_length, polyorder)
+    half = window_length // 2
+    
+    L_smooth = convolve1d(L, kernel, axis=-1, mode="constant")
+    L_smooth[..., :half] = L[..., :window_length] @ left.T
+    L_smooth[..., n - half:] = L[..., n - window_length:] @ right.T
+    
+    return np.moveaxis(L_smooth, -1, axis)
+
+#%% 
+
+def _no_stage(name):
+    # Étape non chronométrée (luminosity_array sans profiler)
+    return nullcontext()
+
+def luminosity_array(frame, center, mode="band", profiler=None):
     """
         Extrait et lisse le profil de luminosité horizontal à partir d'une image en niveaux de gris.
         
-        - Applique un filtre bilatéral pour réduire le bruit tout en préservant les contours.
+        - Applique un filtre pour réduire le bruit, selon mode :
+            - "full" : filtre bilatéral (préserve les contours) sur l'image entière,
+            - "band" : même filtre bilatéral limité à la bande de lignes utilisée par le noyau
+              autour de y, résultat identique à "full",
+            - "gaussian" : filtre gaussien séparable sur la même bande, plus rapide mais qui
+              ne préserve pas les contours.
         - Extrait la ligne de luminosité passant par le centre donné.
         - Utilise un filtre de Savitzky-Golay pour lisser les variations.
+        
+        Avec profiler (voir acquisition.Profiler), la conversion, le filtrage et le lissage sont
+        chronométrés séparément ("cvtColor", "bilateralFilter" ou "GaussianBlur", "savgol").
     """
     
     x, y = center
-
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) # Conversion en niveaux de gris
-
-    height, width = frame.shape
-    filtered_frame = cv2.bilateralFilter(frame, 15, 75, 100) # Filtrage pour réduire le bruit
+    stage = profiler.stage if profiler is not None else _no_stage
+    
+    diameter = 15  # Diamètre du voisinage du filtre
+    
+    if mode == "full":
+        with stage("cvtColor"):
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) # Conversion en niveaux de gris
+        with stage("bilateralFilter"):
+            filtered_frame = cv2.bilateralFilter(frame, diameter, 75, 100) # Filtrage pour réduire le bruit
+        row = y
+    elif mode in ("band", "gaussian"):
+        # Seules les lignes à moins d'un rayon du noyau de y interviennent dans la ligne filtrée
+        height = frame.shape[0]
+        top = max(y - diameter // 2, 0)
+        bottom = min(y + diameter // 2 + 1, height)
+        with stage("cvtColor"):
+            frame = cv2.cvtColor(frame[top:bottom], cv2.COLOR_BGR2GRAY) # Conversion de la bande en niveaux de gris
+        
+        if mode == "band":
+            with stage("bilateralFilter"):
+                filtered_frame = cv2.bilateralFilter(frame, diameter, 75, 100)
+        else:
+            with stage("GaussianBlur"):
+                filtered_frame = cv2.GaussianBlur(frame, (diameter, diameter), 0)
+        row = y - top
+    else:
+        raise ValueError(f"Mode de filtrage inconnu : {mode}")
     
     # Extraction du profil de luminosité le long de la ligne horizontale passant par y
-    L = [filtered_frame[y, k] for k in range(width)]
+    L = filtered_frame[row]
     
     # Paramètres du filtre Savitzky-Golay déterminés empiriquement
     window_length = 13  
     polyorder = 3
     
     # Lissage du profil de luminosité
-    L_smooth = savgol_filter(L, window_length, polyorder)
-    # Conversion en entiers
-    L_smooth = list(map(int, L_smooth))
+    with stage("savgol"):
+        L_smooth = savgol_smooth(L, window_length, polyorder)
+        # Conversion en entiers (troncature, comme int)
+        L_smooth = L_smooth.astype(int)
 
     return L_smooth
 
+#%%
+
+class RadialProfile:
+    """
+    Profil radial de luminosité : moyenne azimutale de l'image sur des couronnes de largeur
+    bin_width centrées sur center, jusqu'au rayon max_radius (toute l'image par défaut).
+    
+    Le numéro de couronne de chaque pixel est calculé une fois pour toutes : le profil d'une
+    image ne coûte ensuite qu'une conversion en niveaux de gris et un np.bincount.
+    """
+    
+    def __init__(self, frame_shape, center, bin_width=1.0, max_radius=None):
+        height, width = frame_shape[:2]
+        x, y = center
+        self.frame_shape = (height, width)
+        self.center = tuple(center)
+        
+        radius = np.hypot(np.arange(width)[None, :] - x, np.arange(height)[:, None] - y)
+        if max_radius is None:
+            max_radius = radius.max()
+        self.nbins = int(max_radius / bin_width) + 1
+        
+        # Les pixels au-delà de max_radius sont envoyés dans une couronne supplémentaire ignorée
+        self.index = np.minimum(radius / bin_width, self.nbins).astype(np.intp).ravel()
+        self.counts = np.bincount(self.index, minlength=self.nbins + 1)[:self.nbins]
+        self.radii = (np.arange(self.nbins) + 0.5) * bin_width  # Rayon moyen de chaque couronne
+    
+    def __call__(self, frame):
+        """
+        Renvoie la luminosité moyenne de chaque couronne (NaN pour une couronne vide).
+        
+        """
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        sums = np.bincount(self.index, weights=frame.ravel(), minlength=self.nbins + 1)[:self.nbins]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / self.counts
+    
+    def rings(self, frame, prominence=10):
+        """
+        Renvoie les rayons des anneaux sombres de l'image (voir ring_radii).
+        
+        """
+        return ring_radii(self(frame), self.radii, prominence)
+
+def ring_radii(profile, radii, prominence=10):
+    """
+    Renvoie les rayons des anneaux sombres : minima locaux du profil radial lissé dont la
+    profondeur dépasse prominence niveaux de gris.
+    
+    """
+    profile = np.asarray(profile, dtype=float)
+    valid = np.isfinite(profile)
+    if not valid.any():
+        return radii[:0]  # Aucune couronne dans l'image (centre hors de l'image, max_radius trop petit)
+    profile = np.interp(np.arange(len(profile)), np.flatnonzero(valid), profile[valid])  # Couronnes vides
+    if len(profile) > 7:
+        profile = savgol_smooth(profile, 7, 2)
+    
+    minima, _ = find_peaks(-profile, prominence=prominence)
+    return radii[minima]
+
+def ring_analysis(radii, wavelength=None, focal_px=None):
+    """
+    Exploite les rayons des anneaux sombres successifs (en pixels) : pour des anneaux d'égale
+    inclinaison, le carré du rayon du k-ième anneau est r_k² = f² * lambda * (k + epsilon) / e,
+    avec e l'épaisseur de la lame d'air et f la focale (en pixels) de l'objectif.
+    
+    Retourne un dictionnaire contenant la pente et l'ordonnée à l'origine de la droite r_k² = f(k),
+    l'excédent fractionnaire epsilon et, si wavelength (m) et focal_px sont donnés,
+    l'épaisseur "thickness" (m) et l'ordre d'interférence au centre "order" = 2e / lambda.
+    """
+    radii = np.asarray(radii, dtype=float)
+    if len(radii) < 2:
+        return None
+    
+    k = np.arange(1, len(radii) + 1)
+    slope, intercept = np.polyfit(k, radii ** 2, 1)
+    
+    res = {"slope": float(slope), "intercept": float(intercept), "fraction": float(intercept / slope)}
+    
+    if wavelength is not None and focal_px is not None:
+        thickness = focal_px ** 2 * wavelength / slope
+        res["thickness"] = float(thickness)
+        res["order"] = float(2 * thickness / wavelength)
+    
+    return res
+
 #%%
 def get_interval(L):
+    """
+    Calcule les seuils d'hystérésis (bas, haut) et la luminosité moyenne à partir
+    des valeurs extrêmes de la trace.
+    
+    """
+    L = np.asarray(L)
     
-    l_max=max(L)
-    l_min=min(L)
+    l_max=int(np.max(L))
+    l_min=int(np.min(L))
     
     mean_luminosity=int((l_max+l_min)/2)# Moyenne des valeurs extrêmes
          
@@ -80,33 +493,627 @@ def get_interval(L):
         
     return interval,mean_luminosity
 
+def get_envelope_interval(l_min, l_max, min_amplitude=0):
+    """
+    Calcule les seuils d'hystérésis et la luminosité moyenne échantillon par échantillon à
+    partir d'une enveloppe (tableaux des minima et maxima locaux), comme get_interval.
+    
+    Là où l'écart l_max - l_min est inférieur à min_amplitude (miroir immobile, bruit seul),
+    l'enveloppe est élargie à min_amplitude autour de son milieu pour que le bruit ne fasse
+    pas basculer le trigger.
+    """
+    l_min = np.asarray(l_min, dtype=np.int64)
+    l_max = np.asarray(l_max, dtype=np.int64)
+    
+    excess = np.maximum(min_amplitude - (l_max - l_min), 0)
+    l_min = l_min - excess // 2
+    l_max = l_max + (excess - excess // 2)
+    
+    mean = (l_max + l_min) // 2
+    interval = ((mean + l_min) // 2, (mean + l_max) // 2)
+    
+    return interval, mean
+
+def get_windowed_interval(L, window, min_amplitude=10):
+    """
+    Seuils d'hystérésis glissants : calculés en chaque point comme get_interval, mais sur
+    l'enveloppe de la trace dans une fenêtre centrée de window échantillons (quelques périodes
+    de franges), pour suivre une dérive de la puissance du laser ou du contraste.
+    La fenêtre doit être plus longue que les arrêts du miroir : sur une plage immobile plus
+    longue que window, seul min_amplitude empêche le bruit d'être compté.
+    Les minima et maxima glissants sont calculés en O(n) quelle que soit la fenêtre.
+    
+    Retourne les tableaux (seuils bas, seuils hauts) et la luminosité moyenne (voir get_envelope_interval).
+    """
+    L = np.floor(np.asarray(L))
+    l_min = minimum_filter1d(L, window, mode="nearest")
+    l_max = maximum_filter1d(L, window, mode="nearest")
+    
+    return get_envelope_interval(l_min, l_max, min_amplitude)
+
 #%%
 
-def luminosity_analyse(L):
+def get_crossings(L, interval, position):
+    """
+    Détecte de façon vectorisée les basculements d'un trigger de Schmitt sur la trace L.
+    
+    - interval : (seuil bas, seuil haut), scalaires ou tableaux de la même longueur que L,
+    - position : état initial (True si la trace part au-dessus du seuil moyen).
+    
+    Retourne les indices des basculements et l'état final.
+    """
+    L = np.asarray(L)
     
-    nb_dp = 0
-    interval, l_mean = get_interval(L)  # Définition des seuils initiaux
-    position = L[0] >= l_mean  # Détermine si la première valeur est au-dessus ou en dessous du seuil moyen
+    above = L >= interval[1]  # Échantillons qui font basculer vers le haut
+    below = L <= interval[0]  # Échantillons qui font basculer vers le bas
     
-    for k in range(len(L)):
+    if np.any(np.asarray(interval[0]) >= np.asarray(interval[1])):
+        # Seuils confondus : un échantillon égal aux deux seuils bascule vers le haut puis vers le bas
+        events = np.flatnonzero(above | below)
+        states = above[events]
+        both = below[events] & states
+        repeats = 1 + both
+        last = np.cumsum(repeats) - 1
+        events = np.repeat(events, repeats)
+        states = np.repeat(states, repeats)
+        states[last[both]] = False
+    else:
+        # Seuls les débuts de plages de code non nul (+1 au-dessus, -1 en dessous, 0 entre les seuils)
+        # peuvent changer l'état
+        code = above.view(np.int8) - below.view(np.int8)
+        starts = np.flatnonzero((code[1:] != code[:-1]) & (code[1:] != 0)) + 1
+        if len(code) and code[0] != 0:
+            starts = np.concatenate(([0], starts))
+        events = starts
+        states = code[starts] > 0
+    
+    if len(events) == 0:
+        return events, position
+    
+    previous = np.empty_like(states)
+    previous[0] = position
+    previous[1:] = states[:-1]
+    
+    crossings = events[states != previous]
+    
+    return crossings, bool(states[-1])
+
+#%%
+
+def print_result(res):
+    """
+    Affiche le nombre d'extinctions d'un résultat de comptage.
+    
+    """
+    if res["half_period"]:
+        print(res["count"])
+        print("Attention : le programme s'est arrêté sur une demi-période")
+        print(f"Nombre d'extinctions : {res['count']} (+1) ")
+    else:
+        print(res["count"])
+        print(f"Nombre d'extinctions : {res['count']}")
+
+#%%
+
+def luminosity_analyse(L, verbose=True, smooth=0, window=None, min_amplitude=10):
+    """
+    Compte le nombre d'extinctions de la trace de luminosité L à l'aide d'un trigger de Schmitt
+    dont les seuils sont donnés par get_interval.
+    Avec smooth > 0, la trace est d'abord lissée par un filtre de Savitzky-Golay d'ordre 3
+    sur smooth échantillons (au moins 4, voir savgol_smooth).
+    Avec window, les seuils suivent l'enveloppe locale de la trace (voir get_windowed_interval) :
+    "interval" et "mean" sont alors des tableaux de la longueur de L.
+    
+    Retourne un dictionnaire contenant :
+    - "count" : le nombre d'extinctions,
+    - "half_period" : True si le comptage s'est arrêté sur une demi-période,
+    - "crossings" : les indices des passages de seuil,
+    - "interval" et "mean" : les seuils utilisés.
+    """
+    
+    L = np.asarray(L)
+    if smooth:
+        L = savgol_smooth(L, smooth, 3)
+    if window:
+        interval, l_mean = get_windowed_interval(L, window, min_amplitude)  # Seuils glissants
+        position = bool(L[0] >= l_mean[0])
+    else:
+        interval, l_mean = get_interval(L)  # Définition des seuils initiaux
+        position = bool(L[0] >= l_mean)  # Détermine si la première valeur est au-dessus ou en dessous du seuil moyen
+    
+    crossings, _ = get_crossings(L, interval, position)
+    nb_dp = len(crossings)  # Nombre de demi-périodes
+    
+    res = {
+        "count": nb_dp // 2,
+        "half_period": nb_dp % 2 != 0,
+        "crossings": crossings,
+        "interval": interval,
+        "mean": l_mean,
+    }
+    
+    if verbose:
+        print_result(res)
+
+    return res
+
+#%%
+
+class FringeCounter:
+    """
+    Compteur de franges incrémental pour l'acquisition en direct.
+    
+    Les échantillons sont fournis un par un ou par paquets avec update. Le compteur ne garde
+    que l'état du trigger de Schmitt, le minimum et le maximum courants et la durée moyenne
+    d'une demi-période : la mémoire utilisée ne dépend pas de la durée de l'acquisition.
+    Les seuils sont ceux de get_interval calculés sur les extrêmes observés jusqu'ici, et le
+    comptage ne démarre qu'une fois que l'écart max - min atteint min_amplitude.
+    Avec window, les extrêmes sont ceux des window derniers échantillons (seuls ceux-ci sont
+    gardés en mémoire) : les seuils suivent une dérive du contraste, comme avec
+    luminosity_analyse(window=...), et l'enveloppe n'est jamais plus étroite que min_amplitude.
+    """
+    
+    def __init__(self, fps=None, min_amplitude=10, smoothing=0.3, window=None):
+        self.fps = fps  # Utilisé pour dater les échantillons si aucun temps n'est fourni
+        self.min_amplitude = min_amplitude
+        self.smoothing = smoothing  # Poids de la dernière demi-période dans la moyenne glissante
+        self.window = window
+        self.reset()
+    
+    def reset(self):
+        """
+        Remet le compteur à zéro.
         
-        if L[k] >= interval[1] and not position:  # Passage au-dessus du seuil haut
-            nb_dp += 1
-            position = True  
+        """
+        self.nb_dp = 0  # Nombre de demi-périodes
+        self.samples = 0  # Nombre d'échantillons reçus
+        self.l_min = None
+        self.l_max = None
+        self.position = None  # État du trigger (None tant que le comptage n'a pas démarré)
+        self.t_last = None  # Date du dernier échantillon
+        self.t_crossing = None  # Date du dernier basculement
+        self.half_period = None  # Durée moyenne d'une demi-période
+        self.history = np.empty(0, dtype=np.int64)  # Derniers échantillons (fenêtre glissante)
+    
+    def update(self, samples, timestamps=None):
+        """
+        Ajoute un échantillon ou un paquet d'échantillons et renvoie le nombre d'extinctions.
+        
+        """
+        L = np.atleast_1d(np.asarray(samples, dtype=np.int64))
+        n = len(L)
+        if n == 0:
+            return self.count
+        
+        if timestamps is None:
+            t = self.samples + np.arange(1, n + 1, dtype=float)
+            if self.fps:
+                t /= self.fps
+        else:
+            t = np.atleast_1d(np.asarray(timestamps, dtype=float))
+        
+        # Extrêmes courants et seuils correspondants, échantillon par échantillon
+        if self.window:
+            # Extrêmes des window derniers échantillons (fenêtre se terminant sur chaque échantillon)
+            extended = np.concatenate((self.history, L))
+            origin = (self.window - 1) // 2
+            l_min = minimum_filter1d(extended, self.window, mode="nearest", origin=origin)[len(self.history):]
+            l_max = maximum_filter1d(extended, self.window, mode="nearest", origin=origin)[len(self.history):]
+            self.history = extended[-(self.window - 1):] if self.window > 1 else extended[:0]
+            interval, mean = get_envelope_interval(l_min, l_max, self.min_amplitude)
+        else:
+            l_min = np.minimum.accumulate(L)
+            l_max = np.maximum.accumulate(L)
+            if self.l_min is not None:
+                np.minimum(l_min, self.l_min, out=l_min)
+                np.maximum(l_max, self.l_max, out=l_max)
+            mean = (l_max + l_min) // 2
+            interval = ((mean + l_min) // 2, (mean + l_max) // 2)
+        
+        start = 0
+        if self.position is None:
+            armed = np.flatnonzero(l_max - l_min >= self.min_amplitude)
+            if len(armed):
+                start = armed[0]
+                self.position = bool(L[start] >= mean[start])
+        
+        if self.position is not None:
+            crossings, self.position = get_crossings(L[start:], (interval[0][start:], interval[1][start:]), self.position)
+            self.nb_dp += len(crossings)
             
+            # Moyenne glissante de la durée des demi-périodes
+            for t_crossing in t[start + crossings].tolist():
+                if self.t_crossing is not None:
+                    duration = t_crossing - self.t_crossing
+                    if self.half_period is None:
+                        self.half_period = duration
+                    else:
+                        self.half_period += self.smoothing * (duration - self.half_period)
+                self.t_crossing = t_crossing
+        
+        self.l_min = int(l_min[-1])
+        self.l_max = int(l_max[-1])
+        self.samples += n
+        self.t_last = float(t[-1])
+        
+        return self.count
+    
+    @property
+    def count(self):
+        """
+        Nombre d'extinctions comptées.
+        
+        """
+        return self.nb_dp // 2
+    
+    @property
+    def rate(self):
+        """
+        Nombre de franges par seconde (par échantillon si fps est inconnu et qu'aucun temps
+        n'est fourni). Diminue si aucun basculement n'a eu lieu depuis une demi-période moyenne.
+        """
+        if not self.half_period:
+            return 0.0
+        half_period = max(self.half_period, self.t_last - self.t_crossing)
+        return float(0.5 / half_period)
+    
+    def result(self):
+        """
+        Renvoie le résultat du comptage sous la même forme que luminosity_analyse
+        (sans les indices des basculements, qui ne sont pas conservés).
+        """
+        interval, l_mean = ((None, None), None)
+        if self.l_min is not None:
+            interval, l_mean = get_interval((self.l_min, self.l_max))
+        
+        return {
+            "count": self.count,
+            "half_period": self.nb_dp % 2 != 0,
+            "interval": interval,
+            "mean": l_mean,
+            "rate": self.rate,
+            "samples": self.samples,
+        }
 
-        if L[k] <= interval[0] and position:  # Passage en dessous du seuil bas
-            nb_dp += 1
-            position = False
-           
+#%%
+
+def get_wrapped_phase(L):
+    """
+    Renvoie la phase (modulo 2pi) du signal analytique de la trace centrée L.
     
-    if nb_dp % 2 != 0:
-        print(nb_dp // 2)
-        print("Attention : le programme s'est arrêté sur une demi-période")
-        print(f"Nombre d'extinctions : {nb_dp // 2} (+1) ")
+    """
+    L = np.asarray(L, dtype=float)
+    return np.angle(hilbert(L - L.mean()))
+
+def extrapolate_phase(phase, start, stop, index):
+    """
+    Estime la phase en index par une droite ajustée sur phase[start:stop].
+    La transformée de Hilbert est faussée près des bords de la trace : la phase des premiers
+    et derniers échantillons est plus fiable extrapolée depuis l'intérieur.
+    
+    """
+    k = np.arange(start, stop)
+    slope, intercept = np.polyfit(k, phase[start:stop], 1)
+    return slope * index + intercept
+
+#%%
+
+def phase_analyse(L, margin=64, verbose=True):
+    """
+    Suit la phase de la trace de luminosité L par démodulation du signal analytique
+    (transformée de Hilbert de la trace centrée, puis déroulement de la phase).
+    La phase de départ et celle d'arrivée sont extrapolées à partir des échantillons situés
+    entre margin et 2 * margin des bords, margin devant couvrir plusieurs périodes de franges.
+    
+    Retourne un dictionnaire contenant :
+    - "phase" : la phase déroulée (en radians) pour chaque échantillon, nulle au départ,
+    - "fringes" : le nombre fractionnaire de franges défilées pour chaque échantillon,
+    - "count" : le nombre total (fractionnaire) de franges.
+    Une frange correspond à un déplacement du miroir de lambda/2. Avec un seul point de mesure,
+    le sens du déplacement n'est pas connu : la phase est toujours croissante.
+    """
+    
+    L = np.asarray(L, dtype=float)
+    n = len(L)
+    
+    phase = np.unwrap(get_wrapped_phase(L))
+    
+    if n >= 4 * margin:
+        origin = extrapolate_phase(phase, margin, 2 * margin, 0)
+        end = extrapolate_phase(phase, n - 2 * margin, n - margin, n - 1)
     else:
-        print(nb_dp // 2)
-        print(f"Nombre d'extinctions : {nb_dp // 2}")
+        origin, end = phase[0], phase[-1]  # Trace trop courte pour extrapoler
+    
+    phase -= origin
+    fringes = phase / (2 * np.pi)
+    
+    res = {"phase": phase, "fringes": fringes, "count": float((end - origin) / (2 * np.pi))}
+    
+    if verbose:
+        print(f"Nombre de franges : {res['count']:.2f}")
+    
+    return res
+
+#%%
+
+class PhaseTracker:
+    """
+    Suivi de phase incrémental pour l'acquisition en direct, sur le principe de phase_analyse.
+    
+    Chaque paquet est démodulé avec les margin échantillons qui l'entourent, pour éviter les
+    effets de bord de la transformée de Hilbert : la phase des margin derniers échantillons
+    reçus n'est donc donnée qu'au paquet suivant, et rien n'est renvoyé avant d'avoir reçu
+    3 * margin échantillons (extrapolation de la phase de départ). margin doit couvrir
+    plusieurs périodes de franges.
+    """
+    
+    def __init__(self, margin=64):
+        self.margin = margin
+        self.reset()
+    
+    def reset(self):
+        """
+        Remet le suivi à zéro.
+        
+        """
+        self.buffer = np.empty(0)  # Derniers échantillons reçus
+        self.emitted = 0  # Nombre d'échantillons du début de buffer dont la phase est déjà donnée
+        self.origin = None  # Phase extrapolée du premier échantillon
+        self.phase = None  # Dernière phase déroulée
+    
+    def update(self, samples):
+        """
+        Ajoute un paquet d'échantillons et renvoie la phase déroulée (nulle au départ)
+        des échantillons dont la démodulation est terminée.
+        """
+        buffer = np.concatenate((self.buffer, np.atleast_1d(np.asarray(samples, dtype=float))))
+        end = len(buffer) - self.margin
+        if end <= self.emitted or (self.phase is None and end < 2 * self.margin):
+            self.buffer = buffer
+            return np.empty(0)
+        
+        wrapped = get_wrapped_phase(buffer)[self.emitted:end]
+        
+        if self.phase is None:
+            phase = np.unwrap(wrapped)
+            self.origin = extrapolate_phase(phase, self.margin, 2 * self.margin, 0)
+        else:
+            phase = np.unwrap(np.concatenate(([self.phase], wrapped)))[1:]  # Continuité avec le paquet précédent
+        self.phase = phase[-1]
+        
+        # Conserve margin échantillons de contexte avant les échantillons non traités
+        keep = max(end - self.margin, 0)
+        self.buffer = buffer[keep:]
+        self.emitted = end - keep
+        
+        return phase - self.origin
+    
+    @property
+    def fringes(self):
+        """
+        Nombre fractionnaire de franges défilées jusqu'au dernier échantillon démodulé.
+        
+        """
+        if self.phase is None:
+            return 0.0
+        return float((self.phase - self.origin) / (2 * np.pi))
+
+#%%
+
+@lru_cache(maxsize=None)
+def get_spectral_window(size, pad=4):
+    """
+    Renvoie la fenêtre de Hann de size échantillons utilisée par fringe_rate, sa somme (gain
+    d'amplitude) et la longueur des transformées (size * pad, complétées par des zéros),
+    calculées une seule fois par couple (size, pad).
+    """
+    window = np.hanning(size)
+    window.setflags(write=False)
+    return window, float(window.sum()), size * pad
+
+def spectral_peak(frames, size, pad=4):
+    """
+    Renvoie, pour chaque ligne de frames (blocs de size échantillons), la fréquence du pic du
+    spectre en cycles par échantillon (interpolation parabolique entre les raies) et l'amplitude
+    de la sinusoïde correspondante.
+    
+    """
+    window, gain, n_fft = get_spectral_window(size, pad)
+    frames = frames - frames.mean(axis=-1, keepdims=True)
+    spectrum = np.abs(rfft(frames * window, n_fft, axis=-1))
+    
+    # Pic hors composante continue, puis interpolation parabolique sur le logarithme
+    k = np.argmax(spectrum[..., 1:-1], axis=-1) + 1
+    a, b, c = (np.log(np.take_along_axis(spectrum, (k + offset)[..., None], axis=-1)[..., 0] + 1e-12) for offset in (-1, 0, 1))
+    denominator = a - 2 * b + c
+    delta = np.where(denominator < 0, 0.5 * (a - c) / np.where(denominator < 0, denominator, 1), 0.0)
+    
+    frequency = (k + delta) / n_fft
+    amplitude = 2 * np.take_along_axis(spectrum, k[..., None], axis=-1)[..., 0] / gain
+    return frequency, amplitude
 
-    return 
+def fringe_rate(L, fps, window=128, step=16, wavelength=None, min_amplitude=10, verbose=False):
+    """
+    Estime la fréquence des franges au cours du temps par transformée de Fourier à court terme :
+    spectre de blocs de window échantillons de la trace (fenêtre de Hann) décalés de step échantillons.
+    
+    Retourne un dictionnaire contenant :
+    - "time" : l'instant du milieu de chaque bloc (s),
+    - "rate" : le nombre de franges par seconde, nul là où l'amplitude des franges (crête à crête)
+      est inférieure à min_amplitude (miroir arrêté),
+    - "amplitude" : l'amplitude crête à crête des franges dans chaque bloc,
+    - "velocity" : la vitesse du miroir (m/s, lambda / 2 par frange) si wavelength est donnée.
+    La fréquence mesurable est limitée à fps / 2 franges par seconde.
+    """
+    L = np.asarray(L, dtype=float)
+    if len(L) < window:
+        print("Erreur : Trace plus courte que la fenêtre d'analyse.")
+        return None
+    
+    frames = np.lib.stride_tricks.sliding_window_view(L, window)[::step]
+    frequency, amplitude = spectral_peak(frames, window)
+    
+    res = {
+        "time": (np.arange(len(frames)) * step + (window - 1) / 2) / fps,
+        "rate": np.where(2 * amplitude >= min_amplitude, frequency * fps, 0.0),
+        "amplitude": 2 * amplitude,
+    }
+    if wavelength is not None:
+        res["velocity"] = res["rate"] * wavelength / 2
+    
+    if verbose:
+        print_rate(res)
+    
+    return res
+
+def print_rate(res):
+    """
+    Affiche le résumé d'un résultat de fringe_rate.
+    
+    """
+    moving = res["rate"] > 0
+    if not moving.any():
+        print("Miroir immobile")
+        return
+    
+    rate = res["rate"][moving]
+    print(f"Fréquence des franges : moyenne {rate.mean():.2f} /s, min {rate.min():.2f} /s, max {rate.max():.2f} /s")
+    if "velocity" in res:
+        print(f"Vitesse du miroir : moyenne {res['velocity'][moving].mean() * 1e6:.3f} µm/s")
+    stopped = (~moving).sum()
+    if stopped:
+        print(f"Arrêts : {stopped} blocs sur {len(moving)}")
+
+class FringeRateMeter:
+    """
+    Fréquence des franges en direct : même estimation que fringe_rate sur les window derniers
+    échantillons, recalculée tous les step échantillons (une seule transformée de Fourier).
     
+    """
+    
+    def __init__(self, fps, window=128, step=8, wavelength=None, min_amplitude=10):
+        self.fps = fps
+        self.window = window
+        self.step = step
+        self.wavelength = wavelength
+        self.min_amplitude = min_amplitude
+        self.reset()
+    
+    def reset(self):
+        """
+        Remet la mesure à zéro.
+        
+        """
+        self.buffer = np.zeros(self.window)
+        self.samples = 0  # Nombre d'échantillons reçus
+        self.pending = 0  # Échantillons reçus depuis la dernière estimation
+        self.rate = 0.0
+        self.amplitude = 0.0
+    
+    def update(self, samples):
+        """
+        Ajoute un échantillon ou un paquet d'échantillons et renvoie la fréquence des franges.
+        
+        """
+        L = np.atleast_1d(np.asarray(samples, dtype=float))
+        n = len(L)
+        L = L[-self.window:]
+        self.buffer = np.roll(self.buffer, -len(L))
+        self.buffer[-len(L):] = L
+        self.samples += n
+        self.pending += n
+        
+        if self.samples >= self.window and self.pending >= self.step:
+            frequency, amplitude = spectral_peak(self.buffer, self.window)
+            self.amplitude = float(2 * amplitude)
+            self.rate = float(frequency * self.fps) if self.amplitude >= self.min_amplitude else 0.0
+            self.pending = 0
+        
+        return self.rate
+    
+    @property
+    def velocity(self):
+        """
+        Vitesse du miroir en m/s (None si la longueur d'onde est inconnue).
+        
+        """
+        return self.rate * self.wavelength / 2 if self.wavelength is not None else None
+
+#%%
+
+def luminosity_analyse_multi(T, verbose=False, smooth=0, window=None):
+    """
+    Compte indépendamment les extinctions de chaque colonne de T (images * points),
+    avec luminosity_analyse. Avec smooth > 0, toutes les colonnes sont lissées en une
+    seule convolution. Retourne la liste des résultats.
+    """
+    T = np.asarray(T)
+    if smooth:
+        T = savgol_smooth(T, smooth, 3, axis=0)
+    return [luminosity_analyse(T[:, k], verbose, window=window) for k in range(T.shape[1])]
+
+class MultiFringeCounter:
+    """
+    Compteurs de franges incrémentaux (FringeCounter) indépendants pour plusieurs points.
+    
+    Les échantillons sont regroupés par blocs de block images avant d'être transmis aux
+    compteurs, pour que le coût par image reste faible même avec beaucoup de points.
+    """
+    
+    def __init__(self, n, block=8, **kwargs):
+        self.counters = [FringeCounter(**kwargs) for _ in range(n)]
+        self.block = block
+        self.reset()
+    
+    def reset(self):
+        """
+        Remet tous les compteurs à zéro.
+        
+        """
+        for counter in self.counters:
+            counter.reset()
+        self.values = []
+        self.timestamps = []
+    
+    def update(self, values, timestamp=None):
+        """
+        Ajoute les luminosités d'une image (une valeur par point).
+        
+        """
+        self.values.append(values)
+        self.timestamps.append(timestamp)
+        if len(self.values) >= self.block:
+            self.flush()
+    
+    def flush(self):
+        """
+        Transmet aux compteurs les échantillons en attente.
+        
+        """
+        if not self.values:
+            return
+        
+        values = np.array(self.values)
+        timestamps = None if self.timestamps[0] is None else self.timestamps
+        for k, counter in enumerate(self.counters):
+            counter.update(values[:, k], timestamps)
+        
+        self.values = []
+        self.timestamps = []
+    
+    @property
+    def counts(self):
+        """
+        Nombre d'extinctions comptées pour chaque point (hors bloc en attente).
+        
+        """
+        return [counter.count for counter in self.counters]
+    
+    def results(self):
+        """
+        Renvoie le résultat de chaque compteur (voir FringeCounter.result).
+        
+        """
+        self.flush()
+        return [counter.result() for counter in self.counters]
+
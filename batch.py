@@ -0,0 +1,252 @@
+"""
+Analyse par lot des enregistrements de l'interféromètre.
+
+Chaque vidéo est comptée sans affichage (voir main.luminosity_trace_from_file) dans un
+processus séparé et le résultat est ajouté au tableau récapitulatif dès qu'il est connu :
+après une interruption, les fichiers déjà traités ne sont pas recalculés.
+
+Une longue vidéo peut aussi être découpée en plages d'images décodées en parallèle
+(voir parallel_luminosity_trace).
+
+Exemples :
+python main.py batch enregistrements/ --center 320 240 --output resultats.csv --workers 4
+python main.py count video.avi --center 320 240 --workers 8
+"""
+
+#%%
+
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+import analyse as an
+import main
+import tracefile as tf
+
+#%%
+
+# Colonnes du tableau récapitulatif ("error" en dernier : une ligne tronquée par un arrêt
+# brutal n'a pas de valeur pour "error" et n'est donc pas considérée comme traitée)
+FIELDS = ["file", "center", "count", "half_period", "frames", "fps", "duration_s", "elapsed_s", "trace", "error"]
+
+#%%
+
+def find_videos(path, pattern="*.avi"):
+    """
+    Renvoie la liste triée des vidéos d'un dossier (selon pattern) ou correspondant à un motif glob.
+
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, pattern)
+    return sorted(os.path.abspath(file_name) for file_name in glob.glob(path))
+
+#%%
+
+def load_results(output):
+    """
+    Lit le tableau récapitulatif et renvoie les lignes des fichiers traités sans erreur,
+    indexées par nom de fichier (une ligne tronquée par un arrêt brutal n'a pas de valeur
+    pour "error" et est ignorée).
+    """
+    if not os.path.exists(output):
+        return {}
+
+    with open(output, newline="") as table:
+        return {row["file"]: row for row in csv.DictReader(table) if row.get("error") == ""}
+
+def trace_name(file_name, root):
+    """
+    Renvoie le nom du fichier de trace d'une vidéo : son chemin relatif à root, sans
+    extension, pour que deux vidéos de même nom dans des sous-dossiers différents ne
+    partagent pas la même trace.
+    """
+    return os.path.splitext(os.path.relpath(file_name, root))[0] + ".trace"
+
+#%%
+
+def _init_worker():
+    # Un seul thread OpenCV par processus : le parallélisme vient du nombre de processus
+    cv2.setNumThreads(1)
+
+def count_file(file_name, center, trace_dir, size=11, shape="square", name=None, inner=0):
+    """
+    Compte les franges d'une vidéo et sauvegarde sa trace de luminosité dans trace_dir, sous
+    le nom name (nom de la vidéo par défaut, voir trace_name) : fichier de trace, voir
+    tracefile, qui peut être recompté sans relire la vidéo.
+
+    Si center vaut None, le centre des anneaux est détecté sur la première image et enregistré
+    dans la trace et dans la ligne du tableau.
+    Retourne la ligne correspondante du tableau récapitulatif.
+    """
+    start = time.perf_counter()
+    row = {"file": file_name, "error": ""}
+
+    if center is None:
+        frame = main.read_frame_at(file_name)
+        if frame is None:
+            row["error"] = "lecture impossible"
+            return row
+        center = main.detect_center(frame)
+        if center is None:
+            row["error"] = "centre introuvable"  # Pas d'anneaux visibles sur la première image
+            return row
+    row["center"] = f"{center[0]} {center[1]}"
+
+    L, fps = main.luminosity_trace_from_file(file_name, center, size=size, shape=shape, inner=inner)
+    if L is None or len(L) == 0:
+        row["error"] = "lecture impossible"
+        return row
+
+    res = an.luminosity_analyse(L, verbose=False)
+
+    trace = os.path.join(trace_dir, name or trace_name(file_name, os.path.dirname(file_name)))
+    os.makedirs(os.path.dirname(trace), exist_ok=True)
+    timestamps = np.arange(len(L)) / fps if fps else None
+    tf.save_trace(trace, L, timestamps, video=file_name, centers=[center], size=size, shape=shape, inner=inner, fps=fps)
+
+    row.update({
+        "count": res["count"],
+        "half_period": res["half_period"],
+        "frames": len(L),
+        "fps": fps,
+        "duration_s": round(len(L) / fps, 3) if fps else "",
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "trace": trace,
+    })
+    return row
+
+#%%
+
+def batch_count(path, center, output="resultats.csv", trace_dir=None, workers=None, size=11, shape="square", resume=True, inner=0):
+    """
+    Compte les franges de toutes les vidéos de path (dossier ou motif glob) dans un groupe
+    de workers processus et écrit un tableau récapitulatif CSV (output) avec, pour chaque fichier,
+    le nombre d'extinctions, la durée, le temps de calcul et le chemin de la trace sauvegardée.
+
+    Avec resume, les fichiers déjà présents sans erreur dans output ne sont pas recalculés ;
+    le tableau est réécrit avec ces seules lignes avant de relancer les autres fichiers
+    (erreurs et lignes tronquées comprises), pour qu'il reste une ligne par fichier.
+    Les traces sont rangées dans trace_dir selon leur chemin relatif au dossier commun des vidéos.
+    Retourne la liste des lignes du tableau.
+    """
+    files = find_videos(path)
+    done = load_results(output) if resume else {}
+    todo = [file_name for file_name in files if file_name not in done]
+
+    if trace_dir is None:
+        trace_dir = os.path.splitext(output)[0] + "_traces"
+    os.makedirs(trace_dir, exist_ok=True)
+    root = os.path.commonpath([os.path.dirname(file_name) for file_name in files]) if files else ""
+
+    print(f"{len(files)} vidéos, {len(files) - len(todo)} déjà traitées")
+
+    rows = list(done.values())
+
+    # Réécriture du tableau : une seule ligne par fichier déjà traité
+    temporary = output + ".tmp"
+    with open(temporary, "w", newline="") as table:
+        writer = csv.DictWriter(table, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temporary, output)
+
+    with open(output, "a", newline="") as table:
+        writer = csv.DictWriter(table, FIELDS)
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(count_file, file_name, center, trace_dir, size, shape, trace_name(file_name, root), inner): file_name for file_name in todo}
+
+            for future in as_completed(futures):
+                try:
+                    row = future.result()
+                except Exception as error:
+                    row = {"file": futures[future], "error": repr(error)}
+
+                # Écriture immédiate pour pouvoir reprendre après une interruption
+                writer.writerow(row)
+                table.flush()
+                rows.append(row)
+
+                print(f"[{len(rows)}/{len(files)}] {os.path.relpath(row['file'], root)} : {row.get('count', '-')} extinctions {row['error']}")
+
+    return rows
+
+#%%
+
+def _trace_chunk(file_name, center, start, stop, size, shape, inner):
+    # Trace d'une plage d'images, exécutée dans un processus du groupe
+    return main.luminosity_trace_from_file(file_name, center, start, stop, size, shape, inner=inner)[0]
+
+def parallel_luminosity_trace(file_name, center, workers=None, start=0, stop=None, size=11, shape="square", chunks=None, inner=0):
+    """
+    Extrait la trace de luminosité d'une vidéo en découpant [start, stop) en chunks plages
+    d'images (workers par défaut) décodées en parallèle, chaque processus se positionnant
+    avec CAP_PROP_POS_FRAMES, puis en recollant les morceaux dans l'ordre.
+    
+    Si center vaut None, le centre des anneaux est détecté sur l'image start.
+    Le résultat est identique à main.luminosity_trace_from_file : la dernière plage est lue
+    jusqu'à stop (ou la fin de la vidéo) même si le nombre d'images annoncé est faux, et un
+    positionnement refusé est remplacé par une lecture depuis le début.
+    Retourne le tableau des luminosités et le nombre d'images par seconde de la vidéo, ou
+    None, None si le fichier est illisible, le centre introuvable ou la zone de mesure hors de l'image.
+    """
+    cap = cv2.VideoCapture(file_name)
+    if not cap.isOpened():
+        print("Erreur : Impossible d'ouvrir le fichier.")
+        return None, None
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    cap.release()
+    
+    if center is None:
+        # Centre détecté une seule fois, pour que toutes les plages mesurent le même point
+        frame = main.read_frame_at(file_name, start)
+        if frame is None:
+            return None, None
+        center = main.detect_center(frame)  # Même seuil de confiance que le comptage séquentiel
+        if center is None:
+            return None, None
+    
+    try:
+        an.get_roi(center, frame_shape, size, shape, inner)  # Zone vérifiée une fois, avant de lancer les processus
+    except ValueError as error:
+        print(f"Erreur : {error}")
+        return None, None
+    
+    workers = workers or os.cpu_count()
+    chunks = chunks or workers
+    end = frame_count if stop is None else min(stop, frame_count)
+    
+    if end - start < 2 * chunks:
+        # Trop peu d'images (ou nombre inconnu) : lecture séquentielle
+        return main.luminosity_trace_from_file(file_name, center, start, stop, size, shape, inner=inner)
+    
+    bounds = np.linspace(start, end, chunks + 1).astype(int)
+    starts = list(bounds[:-1])
+    stops = list(bounds[1:-1]) + [stop]
+    
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        parts = list(pool.map(_trace_chunk, [file_name] * chunks, [center] * chunks, starts, stops, [size] * chunks, [shape] * chunks, [inner] * chunks))
+    
+    if any(part is None for part in parts):
+        return None, None  # Erreur déjà signalée par le processus concerné
+    return np.concatenate(parts), fps
+
+def parallel_fringe_counter(file_name, center, workers=None, start=0, stop=None, size=11, shape="square", smooth=0, window=None, inner=0):
+    """
+    Équivalent de main.fringe_counter_headless utilisant parallel_luminosity_trace.
+    
+    """
+    L, fps = parallel_luminosity_trace(file_name, center, workers, start, stop, size, shape, inner=inner)
+    if L is None:
+        return None, None  # Erreur déjà signalée (fichier illisible ou centre introuvable)
+    if len(L) == 0:
+        print("Erreur : Aucune image n'a pu être lue.")
+        return None, L
+    
+    return an.luminosity_analyse(L, smooth=smooth, window=window), L
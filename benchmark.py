@@ -0,0 +1,258 @@
+"""
+Mesure des temps d'exécution des fonctions d'analyse.
+
+Exemples :
+python benchmark.py video.avi --center 320 240
+python benchmark.py --suite  (données synthétiques, débit et erreur de comptage de chaque étape)
+python benchmark.py --parallel --workers 1 2 4 8  (débit du décodage parallèle selon le nombre de processus)
+"""
+
+#%%
+
+import argparse
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+import analyse as an
+import synthetic as sy
+
+#%%
+
+def timeit(function, *args, repeat=20, **kwargs):
+    """
+    Renvoie la durée moyenne d'un appel de function, en millisecondes.
+
+    """
+    function(*args, **kwargs)  # Premier appel hors mesure (allocations, caches)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(*args, **kwargs)
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+#%%
+
+def bench_luminosity_array(frame, center, repeat=20):
+    """
+    Compare les modes de filtrage de an.luminosity_array sur une image.
+
+    Retourne un dictionnaire {mode: durée en ms} et affiche le gain par rapport au mode "full".
+    """
+
+    timings = {}
+    for mode in ("full", "band", "gaussian"):
+        timings[mode] = timeit(an.luminosity_array, frame, center, mode, repeat=repeat)
+
+    identical = np.array_equal(an.luminosity_array(frame, center, "full"), an.luminosity_array(frame, center, "band"))
+
+    print(f"luminosity_array sur une image {frame.shape[1]}x{frame.shape[0]} :")
+    for mode, duration in timings.items():
+        print(f"  {mode:<10} {duration:8.2f} ms  (x{timings['full'] / duration:.1f})")
+    print(f"  résultats identiques full/band : {identical}")
+
+    return timings
+
+def bench_savgol(L, repeat=20):
+    """
+    Compare savgol_filter (coefficients et bords recalculés à chaque appel) et an.savgol_smooth
+    sur un profil L puis sur une pile de 100 profils.
+    
+    Retourne un dictionnaire {méthode: durée en ms}.
+    """
+    from scipy.signal import savgol_filter
+    
+    L = list(L)
+    stack = np.tile(np.asarray(L), (100, 1))
+    timings = {
+        "savgol_filter": timeit(savgol_filter, L, 13, 3, repeat=repeat),
+        "savgol_smooth": timeit(an.savgol_smooth, L, 13, 3, repeat=repeat),
+        "savgol_filter x100": timeit(lambda: [savgol_filter(profile, 13, 3) for profile in stack], repeat=repeat),
+        "savgol_smooth pile": timeit(an.savgol_smooth, stack, 13, 3, repeat=repeat),
+    }
+    
+    print(f"Lissage de Savitzky-Golay sur {len(L)} points :")
+    for method, duration in timings.items():
+        print(f"  {method:<20} {duration:8.3f} ms")
+    
+    return timings
+
+def bench_seek(file_name, n=50, seed=0):
+    """
+    Mesure les temps d'accès de videoindex.IndexedVideo : sauts aléatoires puis retours
+    en arrière image par image.
+    
+    Retourne un dictionnaire {accès: (durée moyenne, durée maximale) en ms}.
+    """
+    import videoindex as vi
+    
+    start = time.perf_counter()
+    video = vi.IndexedVideo(file_name)
+    print(f"Index de {file_name} : {len(video)} images, {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    def latencies(indices):
+        durations = []
+        for i in indices:
+            start = time.perf_counter()
+            video.read(int(i))
+            durations.append((time.perf_counter() - start) * 1000)
+        return np.mean(durations), np.max(durations)
+    
+    rng = np.random.default_rng(seed)
+    timings = {
+        "saut aléatoire": latencies(rng.integers(0, len(video), n)),
+        "image précédente": latencies(range(len(video) // 2, max(len(video) // 2 - n, 0), -1)),
+    }
+    video.release()
+    
+    for access, (mean, maximum) in timings.items():
+        print(f"  {access:<18} moyenne {mean:7.2f} ms  max {maximum:7.2f} ms")
+    
+    return timings
+
+#%%
+
+def _measure(function, *args):
+    # Renvoie le résultat de function et sa durée d'exécution en secondes
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def bench_suite(shape=(720, 1280), frames=300, samples=10 ** 6, seed=0):
+    """
+    Mesure, sur des images et des traces synthétiques (voir synthetic) dont la vérité terrain
+    est connue, le débit et l'erreur de comptage de chaque étape de l'analyse.
+    
+    Retourne un dictionnaire {étape: (débit, unité, erreur)} ; l'erreur est l'écart entre le
+    nombre de franges compté et la vérité terrain (en pixels pour le centre des anneaux).
+    """
+    import main
+    
+    results = {}
+    center = (shape[1] // 2, shape[0] // 2)
+    displacement = sy.mirror_displacement(frames, 30, speed=1e-6)
+    truth = sy.ground_truth(displacement)
+    images = list(sy.synthetic_frames(frames, shape, displacement=displacement, seed=seed))
+    
+    # Étapes appliquées à chaque image
+    L, duration = _measure(lambda: np.array([an.get_position_luminosity(center, frame) for frame in images]))
+    results["get_position_luminosity"] = (frames / duration, "images/s", an.luminosity_analyse(L, verbose=False)["count"] - truth["extinctions"])
+    
+    _, duration = _measure(lambda: [an.luminosity_array(frame, center) for frame in images[:50]])
+    results["luminosity_array"] = (50 / duration, "images/s", None)
+    
+    (found, _), duration = _measure(an.estimate_center, images[0])
+    results["estimate_center"] = (1 / duration, "images/s", float(np.hypot(found[0] - center[0], found[1] - center[1])) if found else None)
+    
+    # Étapes appliquées à la trace temporelle
+    displacement = sy.mirror_displacement(samples, 30, speed=1e-6)
+    L, truth_trace = sy.synthetic_trace(samples, displacement=displacement, seed=seed)
+    
+    res, duration = _measure(an.luminosity_analyse, L, False)
+    results["luminosity_analyse"] = (samples / duration, "échantillons/s", res["count"] - truth_trace["extinctions"])
+    
+    counter = an.FringeCounter()
+    _, duration = _measure(lambda: [counter.update(block) for block in np.array_split(L, max(samples // 64, 1))])
+    results["FringeCounter (blocs de 64)"] = (samples / duration, "échantillons/s", counter.count - truth_trace["extinctions"])
+    
+    res, duration = _measure(an.phase_analyse, L, 64, False)
+    results["phase_analyse"] = (samples / duration, "échantillons/s", abs(res["count"]) - truth_trace["fringes"])
+    
+    # Chaîne complète sur un fichier vidéo MJPG
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "synthetique.avi")
+        truth_video = sy.write_synthetic_video(file_name, frames, shape=shape, displacement=sy.mirror_displacement(frames, 30, speed=1e-6), seed=seed)
+        (L, _), duration = _measure(main.luminosity_trace_from_file, file_name, center)
+        results["luminosity_trace_from_file"] = (frames / duration, "images/s", an.luminosity_analyse(L, verbose=False)["count"] - truth_video["extinctions"])
+    
+    print(f"Données synthétiques : {frames} images {shape[1]}x{shape[0]}, trace de {samples} échantillons")
+    for stage, (rate, unit, error) in results.items():
+        print(f"  {stage:<30} {rate:14.0f} {unit:<16} erreur : {'-' if error is None else f'{error:+.2f}'}")
+    
+    return results
+
+#%%
+
+def bench_parallel(file_name=None, center=None, workers=(1, 2, 4, 8), frames=600, shape=(720, 1280), seed=0):
+    """
+    Mesure le débit de batch.parallel_luminosity_trace selon le nombre de processus, comparé
+    à la lecture séquentielle (main.luminosity_trace_from_file), et vérifie que les traces
+    sont identiques. Sans file_name, une vidéo synthétique de frames images est utilisée.
+    
+    Retourne un dictionnaire {processus: (débit en images/s, accélération, trace identique)}.
+    """
+    import batch as bt
+    import main
+    
+    with tempfile.TemporaryDirectory() as directory:
+        if file_name is None:
+            file_name = os.path.join(directory, "synthetique.avi")
+            sy.write_synthetic_video(file_name, frames, shape=shape, displacement=sy.mirror_displacement(frames, 30, speed=1e-6), seed=seed)
+            center = center or (shape[1] // 2, shape[0] // 2)
+        
+        (reference, _), duration = _measure(main.luminosity_trace_from_file, file_name, center)
+        if reference is None:
+            return None
+        sequential = len(reference) / duration
+        
+        results = {}
+        for n in workers:
+            (L, _), duration = _measure(bt.parallel_luminosity_trace, file_name, center, n)
+            identical = L is not None and np.array_equal(L, reference)
+            results[n] = (len(reference) / duration, len(reference) / duration / sequential, identical)
+    
+    print(f"Décodage de {len(reference)} images ({os.cpu_count()} cœurs) : séquentiel {sequential:.0f} images/s")
+    for n, (rate, speedup, identical) in results.items():
+        print(f"  {n:>2} processus : {rate:8.0f} images/s  accélération {speedup:5.2f} (efficacité {speedup / n:4.0%})  {'trace identique' if identical else 'TRACE DIFFÉRENTE'}")
+    
+    return results
+
+#%%
+
+def read_frame(file_name, index=0):
+    """
+    Renvoie l'image numéro index d'un fichier vidéo, ou None si elle ne peut pas être lue.
+
+    """
+    cap = cv2.VideoCapture(file_name)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    ret, frame = cap.read()
+    cap.release()
+
+    return frame if ret else None
+
+#%%
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure des temps d'exécution des fonctions d'analyse")
+    parser.add_argument("file_name", nargs="?", default=None, help="vidéo dont la première image est utilisée (image aléatoire 1920x1080 sinon)")
+    parser.add_argument("--center", nargs=2, type=int, default=None, metavar=("X", "Y"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--suite", action="store_true", help="mesure chaque étape sur des données synthétiques")
+    parser.add_argument("--frames", type=int, default=300, help="nombre d'images synthétiques (avec --suite)")
+    parser.add_argument("--samples", type=int, default=10 ** 6, help="longueur de la trace synthétique (avec --suite)")
+    parser.add_argument("--parallel", action="store_true", help="débit du décodage parallèle d'une vidéo (synthétique sans file_name) selon le nombre de processus")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8], help="nombres de processus essayés (avec --parallel)")
+    args = parser.parse_args()
+    
+    if args.suite:
+        bench_suite(frames=args.frames, samples=args.samples)
+        raise SystemExit
+    
+    if args.parallel:
+        bench_parallel(args.file_name, tuple(args.center) if args.center else None, args.workers, frames=args.frames)
+        raise SystemExit
+
+    if args.file_name:
+        frame = read_frame(args.file_name)
+    else:
+        frame = np.random.default_rng(0).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+
+    center = tuple(args.center) if args.center else (frame.shape[1] // 2, frame.shape[0] // 2)
+
+    bench_luminosity_array(frame, center, args.repeat)
+    bench_savgol(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)[center[1]], args.repeat)
+    if args.file_name:
+        bench_seek(args.file_name)
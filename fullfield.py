@@ -0,0 +1,385 @@
+"""
+Cartes de phase plein champ d'une série d'images de l'interféromètre.
+
+Au lieu de réduire chaque image à la luminosité d'un point, la phase des franges est calculée
+en chaque pixel, ce qui donne la forme du miroir (inclinaison, planéité) :
+- méthode temporelle (temporal_phase) : le décalage de phase entre les images est connu grâce
+  aux pas du moteur, et I = a + b cos(phi + delta) est ajusté par moindres carrés en chaque pixel,
+- méthode de Fourier (fourier_phase, méthode de Takeda) : une seule image suffit si les franges
+  sont rectilignes (miroirs inclinés, coin d'air) ; le pic de la porteuse est isolé dans le spectre.
+
+La phase repliée (entre -pi et pi) est dépliée par moindres carrés (unwrap_phase), puis d'une
+image à la suivante en suivant la phase moyenne.
+
+Les images sont traitées par paquets de chunk images et les cartes sont écrites au fur et à
+mesure dans des fichiers .npy ouverts avec numpy.memmap : la mémoire utilisée ne dépend pas de
+la longueur de la vidéo (de l'ordre de 70 octets par pixel et par image du paquet, soit
+environ 1 Go pour des paquets de 8 images HD).
+
+Exemple :
+res = phase_maps("video.avi", "carte", method="fourier")
+unwrapped = np.load(res["unwrapped"], mmap_mode="r")
+"""
+
+#%%
+
+import csv
+import os
+from functools import lru_cache
+import cv2
+import numpy as np
+from scipy.fft import dctn, fft2, fftfreq, idctn, ifft2
+
+import moteur as mo
+import videoindex as vi
+
+#%%
+
+def wrap_phase(phase):
+    """
+    Ramène une phase entre -pi et pi.
+
+    """
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+def read_gray_frames(video, start=0, stop=None, scale=1.0):
+    """
+    Lit les images start (incluse) à stop (exclue) d'une vidéo indexée (voir videoindex.IndexedVideo)
+    en niveaux de gris (float32), réduites d'un facteur scale.
+    """
+    stop = len(video) if stop is None else min(stop, len(video))
+    for i in range(start, stop):
+        frame = video.read(i)
+        if frame is None:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        yield gray.astype(np.float32)
+
+def chunks(frames, size):
+    """
+    Regroupe les images d'un itérable en paquets (images * hauteur * largeur) de size images au plus.
+
+    """
+    chunk = []
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) == size:
+            yield np.stack(chunk)
+            chunk = []
+    if chunk:
+        yield np.stack(chunk)
+
+#%%
+
+def load_frame_timestamps(file_name):
+    """
+    Relit les instants de capture des images d'une vidéo enregistrée par acquisition.AsyncVideoWriter
+    (fichier .csv à côté de la vidéo). Renvoie None si ce fichier n'existe pas.
+    """
+    sidecar = os.path.splitext(file_name)[0] + ".csv"
+    if not os.path.exists(sidecar):
+        return None
+
+    with open(sidecar, newline="") as table:
+        return np.array([float(row["timestamp"]) for row in csv.DictReader(table)])
+
+def phase_shifts(steps, fringes_per_step):
+    """
+    Renvoie le décalage de phase (rad) de chaque image d'après le nombre de pas du moteur
+    (voir moteur.align_steps) : 2 pi par frange défilée.
+    """
+    return 2 * np.pi * fringes_per_step * np.asarray(steps, dtype=float)
+
+def video_phase_shifts(file_name, steps, fringes_per_step):
+    """
+    Renvoie le décalage de phase de chaque image d'une vidéo enregistrée par video_from_camera,
+    d'après les pas du moteur lus pendant l'enregistrement (voir moteur.StepReader et load_steps) :
+    les instants des pas et ceux des images sont donnés par la même horloge.
+    NaN pour les images prises avant le premier ou après le dernier message du moteur.
+    """
+    timestamps = load_frame_timestamps(file_name)
+    if timestamps is None:
+        print("Erreur : Instants de capture des images introuvables (fichier .csv de l'enregistrement).")
+        return None
+
+    return phase_shifts(mo.align_steps(steps, timestamps), fringes_per_step)
+
+#%%
+
+def temporal_phase(frames, shifts, chunk=16):
+    """
+    Calcule la carte de phase par décalage de phase : en chaque pixel, les images successives
+    I_k = a + b cos(phi + shifts[k]) sont ajustées par moindres carrés (images de décalage NaN ignorées).
+    Les images sont lues par paquets de chunk : seuls les trois coefficients sont gardés en mémoire.
+
+    Retourne un dictionnaire contenant la phase repliée "phase" pour un décalage nul, l'amplitude
+    des franges "modulation" et la luminosité moyenne "mean" (cartes hauteur * largeur),
+    ou None si les décalages ne couvrent pas assez de phase.
+    """
+    shifts = np.asarray(shifts, dtype=float)
+    valid = np.isfinite(shifts)
+    design = np.column_stack([np.ones(valid.sum()), np.cos(shifts[valid]), np.sin(shifts[valid])])
+    if valid.sum() < 3 or np.linalg.cond(design) > 10:
+        print("Erreur : Décalages de phase insuffisants (le miroir doit défiler d'au moins une demi-frange).")
+        return None
+
+    # Solution des moindres carrés : coefficients = solve @ images
+    solve = np.zeros((3, len(shifts)), dtype=np.float32)
+    solve[:, valid] = np.linalg.pinv(design)
+
+    coefficients = None
+    n = 0
+    for block in chunks(frames, chunk):
+        block = block[:len(shifts) - n]
+        if coefficients is None:
+            coefficients = np.zeros((3,) + block.shape[1:])
+        coefficients += np.tensordot(solve[:, n:n + len(block)], block, axes=1)
+        n += len(block)
+        if n == len(shifts):
+            break
+
+    if n < len(shifts):
+        print("Erreur : La vidéo contient moins d'images que de décalages de phase.")
+        return None
+
+    mean, cosine, sine = coefficients
+    return {
+        "phase": np.arctan2(-sine, cosine).astype(np.float32),
+        "modulation": np.hypot(cosine, sine).astype(np.float32),
+        "mean": mean.astype(np.float32),
+    }
+
+#%%
+
+def find_carrier(frame, min_frequency=2):
+    """
+    Renvoie la fréquence de la porteuse (fy, fx) en cycles par pixel : pic du spectre de l'image
+    dans le demi-plan fx >= 0, à au moins min_frequency franges sur l'image de la composante continue.
+    """
+    height, width = frame.shape
+    spectrum = np.abs(fft2(frame - frame.mean()))
+    fy = fftfreq(height)[:, None]
+    fx = fftfreq(width)
+    excluded = (np.hypot(fy * height, fx * width) < min_frequency) | (fx < 0) | ((fx == 0) & (fy <= 0))
+    spectrum[excluded] = 0
+
+    i, j = np.unravel_index(np.argmax(spectrum), spectrum.shape)
+    return float(fy[i, 0]), float(fx[j])
+
+@lru_cache(maxsize=8)
+def get_carrier_filter(shape, carrier, radius):
+    """
+    Renvoie le filtre (fenêtre de Hann radiale de rayon radius, en cycles par pixel) qui isole
+    la porteuse carrier dans le spectre d'une image de taille shape, calculé une seule fois.
+    """
+    fy = fftfreq(shape[0])[:, None]
+    fx = fftfreq(shape[1])
+    distance = np.hypot(fy - carrier[0], fx - carrier[1]) / radius
+    mask = np.where(distance < 1, 0.5 * (1 + np.cos(np.pi * distance)), 0).astype(np.float32)
+    mask.setflags(write=False)
+    return mask
+
+def fourier_phase(frames, carrier=None, radius=None):
+    """
+    Calcule la carte de phase d'une image (hauteur * largeur) ou d'un paquet d'images
+    (images * hauteur * largeur) par la méthode de Takeda : seul le pic de la porteuse est
+    gardé dans le spectre, dont la transformée inverse donne la phase.
+    La porteuse est cherchée sur la première image si carrier vaut None ; le filtre a par défaut
+    un rayon égal à la moitié de sa fréquence.
+
+    Retourne un dictionnaire contenant la phase repliée "phase", l'amplitude des franges
+    "modulation" et la porteuse "carrier" (à réutiliser pour les images suivantes).
+    La phase contient la porteuse, c'est-à-dire l'inclinaison entre les deux miroirs.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    if carrier is None:
+        carrier = find_carrier(frames if frames.ndim == 2 else frames[0])
+    if radius is None:
+        radius = np.hypot(*carrier) / 2
+
+    mask = get_carrier_filter(frames.shape[-2:], tuple(carrier), float(radius))
+    spectrum = fft2(frames - frames.mean(axis=(-2, -1), keepdims=True), workers=-1)
+    spectrum *= mask
+    analytic = ifft2(spectrum, overwrite_x=True, workers=-1)
+
+    return {
+        "phase": np.angle(analytic),
+        "modulation": 2 * np.abs(analytic),
+        "carrier": tuple(carrier),
+    }
+
+#%%
+
+@lru_cache(maxsize=8)
+def get_poisson_denominator(shape):
+    """
+    Renvoie les valeurs propres du laplacien discret (conditions de Neumann) dans la base des
+    cosinus, pour une carte de taille shape.
+    """
+    i = np.arange(shape[0])[:, None]
+    j = np.arange(shape[1])
+    denominator = 2 * (np.cos(np.pi * i / shape[0]) + np.cos(np.pi * j / shape[1]) - 2)
+    denominator[0, 0] = 1  # Constante arbitraire, fixée plus bas
+    denominator = denominator.astype(np.float32)
+    denominator.setflags(write=False)
+    return denominator
+
+def unwrap_phase(wrapped):
+    """
+    Déplie une carte de phase (ou un paquet de cartes, selon les deux derniers axes) par moindres
+    carrés : la phase dont le gradient est le plus proche du gradient replié est obtenue en
+    résolvant une équation de Poisson par transformée en cosinus (méthode de Ghiglia et Romero).
+    Le résultat est ensuite ramené à la phase repliée à 2 pi près.
+    """
+    wrapped = np.asarray(wrapped, dtype=np.float32)
+    dy = wrap_phase(np.diff(wrapped, axis=-2))
+    dx = wrap_phase(np.diff(wrapped, axis=-1))
+
+    # Laplacien du gradient replié
+    rho = np.zeros_like(wrapped)
+    rho[..., :-1, :] += dy
+    rho[..., 1:, :] -= dy
+    rho[..., :, :-1] += dx
+    rho[..., :, 1:] -= dx
+
+    solution = dctn(rho, axes=(-2, -1), norm="ortho", overwrite_x=True, workers=-1)
+    solution /= get_poisson_denominator(wrapped.shape[-2:])
+    solution[..., 0, 0] = 0
+    phase = idctn(solution, axes=(-2, -1), norm="ortho", overwrite_x=True, workers=-1)
+
+    return phase + wrap_phase(wrapped - phase)
+
+def fit_plane(phase, weights=None, step=4):
+    """
+    Ajuste un plan phi = ax * x + ay * y + c sur une carte de phase dépliée (un pixel sur step
+    dans chaque direction), pondéré par weights (par exemple l'amplitude des franges).
+
+    Retourne l'inclinaison (ax, ay) en rad par pixel, la phase moyenne c et l'écart-type des
+    résidus (planéité, en rad).
+    """
+    phase = phase[::step, ::step]
+    y, x = np.mgrid[0:phase.shape[0], 0:phase.shape[1]] * step
+    w = np.ones(phase.shape) if weights is None else np.sqrt(weights[::step, ::step])
+    valid = np.isfinite(phase) & (w > 0)
+    if valid.sum() < 3:
+        return (np.nan, np.nan), np.nan, np.nan
+
+    design = np.column_stack([x[valid], y[valid], np.ones(valid.sum())])
+    (ax, ay, c), *_ = np.linalg.lstsq(design * w[valid, None], phase[valid] * w[valid], rcond=None)
+    residuals = phase[valid] - design @ (ax, ay, c)
+    return (float(ax), float(ay)), float(c), float(np.sqrt(np.average(residuals ** 2, weights=w[valid] ** 2)))
+
+#%%
+
+def phase_maps(file_name, output, method="fourier", shifts=None, start=0, stop=None, scale=1.0, chunk=8, wavelength=None):
+    """
+    Calcule les cartes de phase repliée et dépliée de chaque image d'une vidéo, de l'image start
+    (incluse) à l'image stop (exclue), et les écrit au fur et à mesure dans output + "_wrapped.npy"
+    et output + "_unwrapped.npy" (float32, images * hauteur * largeur, à relire avec mmap_mode="r").
+    Les images sont d'abord réduites d'un facteur scale.
+
+    - method "fourier" : chaque image est traitée seule (voir fourier_phase), par paquets de chunk images,
+    - method "temporal" : shifts donne le décalage de phase de chaque image à partir de start (voir
+      video_phase_shifts) ; la carte de phase est ajustée sur toutes les images (voir temporal_phase)
+      et celle de chaque image est obtenue en lui ajoutant son décalage.
+    D'une image à la suivante, la phase dépliée est ramenée au même tour que la précédente.
+
+    Retourne un dictionnaire contenant les noms des fichiers, le nombre d'images, l'inclinaison
+    (rad par pixel de l'image réduite) et la planéité (rad, et m si wavelength est donnée :
+    lambda / 4 pi par radian) de chaque image, ou None en cas d'erreur.
+    """
+    if method not in ("fourier", "temporal"):
+        print(f"Erreur : Méthode inconnue ({method}).")
+        return None
+
+    video = vi.IndexedVideo(file_name, cache_size=1, backfill=1)
+    if not video.isOpened():
+        print("Erreur : Impossible d'ouvrir le fichier.")
+        return None
+
+    stop = len(video) if stop is None else min(stop, len(video))
+    if method == "temporal":
+        if shifts is None:
+            print("Erreur : La méthode temporelle nécessite le décalage de phase de chaque image.")
+            video.release()
+            return None
+        stop = min(stop, start + len(shifts))
+        shifts = np.asarray(shifts[:stop - start], dtype=float)
+
+    n = stop - start
+    if n <= 0:
+        print("Erreur : Aucune image à analyser.")
+        video.release()
+        return None
+
+    if method == "temporal":
+        fit = temporal_phase(read_gray_frames(video, start, stop, scale), shifts, chunk)
+        video.release()
+        if fit is None:
+            return None
+        base = unwrap_phase(fit["phase"])
+        blocks = ((wrap_phase(fit["phase"] + block_shifts[:, None, None]), base + block_shifts[:, None, None], fit["modulation"])
+                  for block_shifts in (shifts[i:i + chunk] for i in range(0, n, chunk)))
+    else:
+        def fourier_blocks():
+            carrier = None
+            for block in chunks(read_gray_frames(video, start, stop, scale), chunk):
+                res = fourier_phase(block, carrier)
+                carrier = res["carrier"]
+                yield res["phase"], unwrap_phase(res["phase"]), res["modulation"]
+            video.release()
+        blocks = fourier_blocks()
+
+    wrapped_file, unwrapped_file = output + "_wrapped.npy", output + "_unwrapped.npy"
+    wrapped_maps = unwrapped_maps = None
+    tilts = np.full((n, 2), np.nan)
+    flatness = np.full(n, np.nan)
+    previous = None  # Phase moyenne de l'image précédente
+    i = 0
+
+    for wrapped, unwrapped, modulation in blocks:
+        if wrapped_maps is None:
+            shape = (n,) + wrapped.shape[1:]
+            wrapped_maps = np.lib.format.open_memmap(wrapped_file, mode="w+", dtype=np.float32, shape=shape)
+            unwrapped_maps = np.lib.format.open_memmap(unwrapped_file, mode="w+", dtype=np.float32, shape=shape)
+
+        for k in range(len(wrapped)):
+            if method == "fourier":
+                # Même tour que l'image précédente (la phase varie de moins de pi entre deux images)
+                mean = np.mean(unwrapped[k])
+                if previous is not None:
+                    unwrapped[k] += 2 * np.pi * np.round((previous - mean) / (2 * np.pi))
+                previous = np.mean(unwrapped[k])
+            if np.isfinite(unwrapped[k]).any():
+                tilts[i + k], _, flatness[i + k] = fit_plane(unwrapped[k], modulation[k] if modulation.ndim == 3 else modulation)
+
+        wrapped_maps[i:i + len(wrapped)] = wrapped
+        unwrapped_maps[i:i + len(wrapped)] = unwrapped
+        i += len(wrapped)
+
+    if wrapped_maps is None:
+        print("Erreur : Impossible de lire les images.")
+        return None
+    wrapped_maps.flush()
+    unwrapped_maps.flush()
+    del wrapped_maps, unwrapped_maps
+
+    res = {"wrapped": wrapped_file, "unwrapped": unwrapped_file, "frames": i, "tilt": tilts[:i], "flatness": flatness[:i]}
+    if wavelength is not None:
+        res["flatness_m"] = res["flatness"] * wavelength / (4 * np.pi)
+    return res
+
+def print_phase_maps(res):
+    """
+    Affiche le résumé d'un résultat de phase_maps.
+
+    """
+    print(f"Cartes de phase : {res['wrapped']}, {res['unwrapped']} ({res['frames']} images)")
+    tilt = np.nanmedian(res["tilt"], axis=0)
+    print(f"Inclinaison médiane : {tilt[0] * 1e3:.3f} mrad/pixel en x, {tilt[1] * 1e3:.3f} mrad/pixel en y")
+    line = f"Planéité (écart au plan) : {np.nanmedian(res['flatness']):.3f} rad"
+    if "flatness_m" in res:
+        line += f" ({np.nanmedian(res['flatness_m']) * 1e9:.1f} nm)"
+    print(line)
@@ -4,9 +4,18 @@ Created on Fri Feb  7 22:14:01 2025
 @author: gaspa
 """
 
+import argparse
+import os
+import threading
 import cv2
+import numpy as np
 from datetime import datetime
 import analyse as an
+import acquisition as acq
+import tracefile as tf
+import videoindex as vi
+import moteur as mo
+import fullfield as ff
 
 #%% 
 def nothing(x):
@@ -15,15 +24,115 @@ def nothing(x):
     """
     pass
 
+#%%
+
+def new_base_name(extension):
+    """
+    Renvoie un nom de fichier daté (sans extension) qui n'est pas encore utilisé avec extension,
+    suffixé par _2, _3, ... si plusieurs fichiers sont créés dans la même seconde.
+    """
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_name, n = stamp, 2
+    while os.path.exists(base_name + extension):
+        base_name, n = f"{stamp}_{n}", n + 1
+    return base_name
+
+def close_profiler(profiler, profile=None):
+    """
+    Affiche les durées mesurées par profiler (voir acquisition.Profiler) et les exporte dans
+    le fichier profile (.csv ou .json) s'il est donné.
+    """
+    if not profiler.series:
+        return
+    print(f"Boucle mesurée : {profiler.rate.fps:.1f} images/s" + (f" (nominal {profiler.nominal_fps:.0f})" if profiler.nominal_fps else ""))
+    acq.print_stats(profiler.stats())
+    if profile:
+        profiler.export(profile)
+        print(f"Mesures enregistrées : {profile}")
+
+def analysis_file(profile):
+    """
+    Renvoie le nom du fichier des mesures du thread d'analyse associé à profile
+    (mesures.csv -> mesures_analyse.csv), ou None.
+    """
+    if not profile:
+        return None
+    base, extension = os.path.splitext(profile)
+    return base + "_analyse" + extension
+
+def resize_preview(frame, scale):
+    """
+    Réduit l'image d'un facteur scale pour l'aperçu (rien n'est fait si scale vaut 1).
+    
+    """
+    if scale == 1:
+        return frame
+    return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def draw_luminosity_curve(frame, L, thickness=2, scale=1.0):
+    """
+    Trace sur l'image la courbe de luminosité L (une valeur par colonne), depuis le bas de l'image,
+    en un seul appel à cv2.polylines. Les luminosités sont multipliées par scale (aperçu réduit).
+    
+    """
+    height = frame.shape[0]
+    points = np.empty((len(L), 2), dtype=np.int32)
+    points[:, 0] = np.arange(len(L))
+    points[:, 1] = height - np.asarray(L) * scale
+    cv2.polylines(frame, [points], False, (255, 0, 0), thickness)
+
+#%%
+
+def auto_center(frame, min_confidence=0.5):
+    """
+    Détecte automatiquement le centre des anneaux (voir an.estimate_center).
+    Retourne le centre si la confiance est suffisante, None sinon (sélection à la souris).
+    """
+    center, confidence = an.estimate_center(frame)
+    if center is None or confidence < min_confidence:
+        print(f"Centre non détecté automatiquement (confiance {confidence:.2f}) : cliquez au centre des anneaux")
+        return None
+    
+    print(f"Centre détecté automatiquement : {center} (confiance {confidence:.2f})")
+    return center
+
+def detect_center(frame, min_confidence=0.5):
+    """
+    Détecte le centre des anneaux sans interface graphique, avec le même seuil de confiance
+    que auto_center. Retourne None si la confiance est insuffisante (pas d'anneaux visibles) :
+    on ne compte pas à un point arbitraire.
+    """
+    center, confidence = an.estimate_center(frame)
+    if center is None or confidence < min_confidence:
+        print(f"Erreur : Centre des anneaux introuvable (confiance {confidence:.2f}).")
+        return None
+    
+    print(f"Centre détecté automatiquement : {center} (confiance {confidence:.2f})")
+    return center
+
 #%% 
 
-def video_from_camera(index=0, codec='MJPG'):
+def video_from_camera(index=0, codec='MJPG', segment_seconds=None, segment_bytes=None, legacy_controls=False, motor=None, profile=None):
     """
     Capture un flux vidéo depuis la caméra et permet :
     - d'ajuster contraste, luminosité et gain avec des trackbars,
     - de basculer en mode noir et blanc avec 'g',
     - de démarrer/arrêter l'enregistrement de la vidéo avec la touche 'r',
+    - de basculer entre l'envoi des réglages à chaque image (ancien fonctionnement) et
+      l'envoi des seuls changements (voir acquisition.CameraControl) avec 'l',
     - de quitter avec 'Échap'.
+    Le nombre d'images par seconde obtenu dans chacun des deux modes est affiché à la fin
+    (legacy_controls choisit le mode de départ).
+    Les images sont lues dans un thread séparé (voir acquisition.CapturePipeline) et
+    enregistrées dans un autre (voir acquisition.AsyncVideoWriter), avec l'instant de capture
+    de chaque image dans un fichier .csv. L'enregistrement est découpé en fichiers de
+    segment_seconds secondes ou segment_bytes octets au plus.
+    Si motor est donné (voir moteur.open_transport), les pas du moteur sont enregistrés pendant toute
+    la session dans un fichier .steps.csv, avec la même horloge que les images : ils donnent le
+    décalage de phase de chaque image pour les cartes de phase (voir phase_maps_from_file).
+    La touche 'p' active ou désactive la mesure de la durée de chaque étape de la boucle, affichée
+    sur l'image (voir acquisition.Profiler) ; avec profile (fichier .csv ou .json), la mesure est
+    active dès le départ et exportée à la fin.
     """
     
     # Ouvre la caméra avec l'index spécifié
@@ -49,30 +158,73 @@ def video_from_camera(index=0, codec='MJPG'):
     recording = False  # Indicateur d'enregistrement vidéo
     video_writer=None
     
+    def close_writer():
+        # Termine l'enregistrement en cours et affiche ses statistiques
+        video_writer.close()
+        print(f"Enregistrement : {', '.join(video_writer.segments)}")
+        acq.print_stats(video_writer.stats())
     
-    while cap.isOpened():
-        # Capture une image depuis la caméra
-        ret, frame = cap.read()
-        if not ret:
+    # Lecture des images dans un thread séparé, sans perte tant que le tampon n'est pas plein
+    pipeline = acq.CapturePipeline(cap, maxsize=64, policy="block").start()
+    
+    # Lecture des pas du moteur, datés avec la même horloge que les images
+    step_reader = None
+    if motor is not None:
+        step_reader = mo.StepReader(mo.open_transport(motor), log=new_base_name(".steps.csv") + ".steps.csv").start()
+    
+    # Réglages envoyés à la caméra seulement lorsqu'ils changent
+    initial = {cv2.CAP_PROP_CONTRAST: init_contrast, cv2.CAP_PROP_BRIGHTNESS: init_brightness, cv2.CAP_PROP_GAIN: init_gain}
+    control = acq.CameraControl(pipeline.set, initial)
+    legacy_writes = 0  # Réglages envoyés dans l'ancien mode
+    rates = {True: acq.RateMeter(), False: acq.RateMeter()}  # Images par seconde selon legacy_controls
+    profiler = acq.Profiler(cap.get(cv2.CAP_PROP_FPS), enabled=profile is not None)  # Durée de chaque étape
+    
+    while True:
+        # Récupère la prochaine image capturée
+        with profiler.stage("get"):
+            packet = pipeline.get()
+        if packet is None:
             print("Erreur : Impossible de lire une image depuis la caméra.")
             break
+        frame = packet["frame"]
+        rates[legacy_controls].add(packet["timestamp"])
         
-        # Lecture des valeurs des trackbars
-        contrast = cv2.getTrackbarPos('Contrast', 'Video')
-        brightness = cv2.getTrackbarPos('Brightness', 'Video')
-        gain = cv2.getTrackbarPos('Gain', 'Video')
-        
-        # Application des nouveaux paramètres à la caméra
-        cap.set(cv2.CAP_PROP_CONTRAST, contrast)
-        cap.set(cv2.CAP_PROP_BRIGHTNESS, brightness)
-        cap.set(cv2.CAP_PROP_GAIN, gain)
+        with profiler.stage("controls"):
+            # Lecture des valeurs des trackbars
+            contrast = cv2.getTrackbarPos('Contrast', 'Video')
+            brightness = cv2.getTrackbarPos('Brightness', 'Video')
+            gain = cv2.getTrackbarPos('Gain', 'Video')
+            
+            # Application des nouveaux paramètres à la caméra
+            if legacy_controls:
+                pipeline.set(cv2.CAP_PROP_CONTRAST, contrast)
+                pipeline.set(cv2.CAP_PROP_BRIGHTNESS, brightness)
+                pipeline.set(cv2.CAP_PROP_GAIN, gain)
+                legacy_writes += 3
+            else:
+                control.set(cv2.CAP_PROP_CONTRAST, contrast)
+                control.set(cv2.CAP_PROP_BRIGHTNESS, brightness)
+                control.set(cv2.CAP_PROP_GAIN, gain)
+                control.update()
         
         # Gestion des entrées clavier
-        key = cv2.waitKey(1) & 0xFF
+        with profiler.stage("waitKey"):
+            key = cv2.waitKey(1) & 0xFF
+        
+        # Mesure de la durée des étapes
+        if key == ord('p'):
+            profiler.toggle()
         
         # Activation/désactivation du mode noir et blanc
         if key == ord('g'):
             grayscale = not grayscale
+        
+        # Changement du mode d'envoi des réglages
+        if key == ord('l'):
+            rates[legacy_controls].pause()
+            legacy_controls = not legacy_controls
+            # L'ancien mode vient d'envoyer les valeurs des trackbars
+            control.applied.update({cv2.CAP_PROP_CONTRAST: contrast, cv2.CAP_PROP_BRIGHTNESS: brightness, cv2.CAP_PROP_GAIN: gain})
             
         
         # Gestion de l'enregistrement vidéo
@@ -81,44 +233,63 @@ def video_from_camera(index=0, codec='MJPG'):
             
             if recording:
                 # Configuration du codec et des paramètres de sortie
-                fourcc = cv2.VideoWriter_fourcc(*codec)
                 fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-                frame_size = (frame.shape[1], frame.shape[0])
-                output_filename = '{}.avi'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
-                video_writer = cv2.VideoWriter(output_filename, fourcc, fps, frame_size)
+                output_filename = new_base_name(".avi")
+                video_writer = acq.AsyncVideoWriter(output_filename, fps, codec, max_bytes=segment_bytes, max_seconds=segment_seconds).start()
                 
             else:
-                video_writer.release()
+                close_writer()
                 
         if grayscale:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)  # Conversion en niveaux de gris
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)  # Conversion en 3 canaux pour compatibilité
+            with profiler.stage("cvtColor"):
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)  # Conversion en niveaux de gris
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)  # Conversion en 3 canaux pour compatibilité
             
         # Écriture de l'image dans le fichier si l'enregistrement est actif
         if recording:
-            video_writer.write(frame)
-            # Ajout d'un indicateur visuel lorsque l'enregistrement est actif
-            cv2.circle(frame, (10, 10), 10, (0, 0, 255), -1)  # Ajout d'un point rouge
-            cv2.putText(frame, 'REC', (30, 17), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            with profiler.stage("write"):
+                video_writer.write(frame, packet["timestamp"], packet["index"])
+            with profiler.stage("drawing"):
+                # Ajout d'un indicateur visuel lorsque l'enregistrement est actif, sur une copie :
+                # l'image enregistrée est encore dans le tampon du thread d'écriture
+                frame = frame.copy()
+                cv2.circle(frame, (10, 10), 10, (0, 0, 255), -1)  # Ajout d'un point rouge
+                cv2.putText(frame, 'REC', (30, 17), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
         
+        with profiler.stage("overlay"):
+            profiler.draw(frame)  # Durées des étapes, si la mesure est active
         
         # Affichage de l'image dans la fenêtre
-        cv2.imshow("Video", frame)
+        with profiler.stage("imshow"):
+            cv2.imshow("Video", frame)
+        profiler.frame(packet["timestamp"], pipeline)
         
         # Quitter si la touche Échap est appuyée
         if key == 27:
             break
     
-    # Restauration des paramètres initiaux de la caméra
-    cap.set(cv2.CAP_PROP_CONTRAST, init_contrast)
-    cap.set(cv2.CAP_PROP_BRIGHTNESS, init_brightness)
-    cap.set(cv2.CAP_PROP_GAIN, init_gain)
+    stopped = pipeline.stop()
+    if step_reader is not None:
+        step_reader.stop()
+        print(f"Pas du moteur : {step_reader.log}")
+    acq.print_stats(pipeline.stats())
+    close_profiler(profiler, profile)
+    for legacy, rate in rates.items():
+        if rate.frames:
+            writes = legacy_writes if legacy else control.writes
+            print(f"{'Réglages à chaque image' if legacy else 'Réglages modifiés seulement'} : {rate.fps:.1f} images/s ({rate.frames} images, {writes} réglages envoyés)")
+    
+    # Restauration des paramètres initiaux de la caméra (si le thread de lecture n'est plus dans cap.read)
+    if stopped:
+        cap.set(cv2.CAP_PROP_CONTRAST, init_contrast)
+        cap.set(cv2.CAP_PROP_BRIGHTNESS, init_brightness)
+        cap.set(cv2.CAP_PROP_GAIN, init_gain)
     
     # Libération des ressources et fermeture des fenêtres
-    if video_writer:
-        video_writer.release()
+    if recording:
+        close_writer()
         
-    cap.release()
+    pipeline.release()
     cv2.destroyAllWindows() 
     
     return
@@ -132,37 +303,86 @@ def play_file(file_name):
     - de basculer en mode noir et blanc avec la touche 'g',
     - d'accélérer la lecture avec la touche '+',
     - de ralentir la lecture avec la touche '-',
+    - d'avancer ou de reculer d'une image avec 'd' et 'a' (la lecture est mise en pause),
+    - d'avancer ou de reculer d'une seconde avec 'f' et 'b',
+    - d'aller à une image donnée avec 'j', suivi du numéro et de ENTRÉE,
+    - de se déplacer dans la vidéo avec la barre "Image",
     - de quitter avec la touche ÉCHAP.
+    Les déplacements utilisent l'index de la vidéo et un cache des images décodées
+    (voir videoindex.IndexedVideo).
     """
     
-    # Ouvre le fichier vidéo
-    cap = cv2.VideoCapture(file_name)
+    # Ouvre le fichier vidéo (l'index est construit au premier passage)
+    video = vi.IndexedVideo(file_name)
+    if not video.isOpened() or len(video) == 0:
+        print("Erreur : Impossible d'ouvrir le fichier.")
+        return
     
     # Récupère le nombre d'images par seconde (FPS) de la vidéo
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    fps = video.index.fps
     
     # Calcul du délai entre chaque image en millisecondes 
     delay = int(1000 / fps) if fps > 0 else 20  # Valeur par défaut de 20 ms si FPS inconnu
+    step = int(round(fps)) if fps > 0 else 25  # Nombre d'images sautées par 'f' et 'b'
     
     grayscale = False  # Indicateur du mode noir et blanc
     pause = False  # Indicateur de pause
+    jump = None  # Numéro d'image en cours de saisie après 'j'
+    index = -1  # Image affichée
+    target = 0  # Image à afficher
+    request = {"frame": None}  # Position demandée avec la barre
     
-    while cap.isOpened():
+    def on_trackbar(value):
+        # Ignore les appels provoqués par la mise à jour de la barre pendant la lecture
+        if value != index:
+            request["frame"] = value
+    
+    cv2.namedWindow("Video")
+    cv2.createTrackbar("Image", "Video", 0, max(len(video) - 1, 1), on_trackbar)
+    
+    while True:
         
-        if not pause:  # Lire une nouvelle image seulement si la vidéo n'est pas en pause
-            ret, frame = cap.read()  # Capture une image
-            
-            if not ret:
+        if target != index:  # Lire une nouvelle image seulement si la position a changé
+            if target >= len(video):
                 print("Fin de la vidéo")
-                break  # Quitte la boucle si la vidéo est terminée ou si une erreur survient
+                break  # Quitte la boucle si la vidéo est terminée
             
-            if grayscale:  # Applique un filtre noir et blanc si activé
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                
-            cv2.imshow("Video", frame)  # Affiche l'image
+            frame = video.read(target)  # Image du cache ou décodée
+            if frame is None:
+                print("Erreur : Impossible de lire l'image", target)
+                break
+            index = target
+            cv2.setTrackbarPos("Image", "Video", index)
+        
+        if grayscale:  # Applique un filtre noir et blanc si activé
+            display = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        else:
+            display = frame.copy()  # L'image du cache n'est pas modifiée
+        
+        # Numéro de l'image à l'arrêt, ou numéro en cours de saisie
+        if jump is not None:
+            cv2.putText(display, f"Aller a l'image : {jump}_", (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 1, cv2.LINE_AA)
+        elif pause:
+            cv2.putText(display, f"Image {index}/{len(video) - 1}  ({video.timestamp(index):.2f} s)", (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 1, cv2.LINE_AA)
+        
+        cv2.imshow("Video", display)  # Affiche l'image
         
         # Gestion des entrées clavier avec délai ajustable
-        key = cv2.waitKey(delay if not pause else 1) & 0xFF
+        key = cv2.waitKey(delay if not pause else 20) & 0xFF
+        
+        if jump is not None:
+            # Saisie du numéro de l'image : chiffres, RETOUR ARRIÈRE, ENTRÉE pour valider, ÉCHAP pour annuler
+            if ord('0') <= key <= ord('9'):
+                jump += chr(key)
+            elif key == 8:
+                jump = jump[:-1]
+            elif key in (10, 13):
+                if jump:
+                    target = min(int(jump), len(video) - 1)
+                jump = None
+            elif key == 27:
+                jump = None
+            continue
         
         # Ralentit la lecture en augmentant le délai entre les images
         if key == ord('-'):
@@ -184,20 +404,57 @@ def play_file(file_name):
         # Active/désactive le mode noir et blanc
         if key == ord('g'):
             grayscale = not grayscale
+        
+        # Déplacements dans la vidéo
+        if key in (ord('a'), ord('d')):
+            pause = True
+            target = min(max(index + (1 if key == ord('d') else -1), 0), len(video) - 1)
+        elif key in (ord('b'), ord('f')):
+            target = min(max(index + (step if key == ord('f') else -step), 0), len(video) - 1)
+        elif key == ord('j'):
+            jump = ""
+        elif request["frame"] is not None:
+            target = request["frame"]
+        elif not pause:
+            target = index + 1
+        request["frame"] = None
     
     # Libération des ressources et fermeture des fenêtres 
-    cap.release()
+    video.release()
     cv2.destroyAllWindows()
     return
 
 
 #%%
-def fringe_counter_from_camera(index=0):
+def fringe_counter_from_camera(index=0, centers=None, auto=True, track=0, save_trace=True, motor=None, wavelength=None, pitch=None, window=None, profile=None):
     """
     Capture un flux vidéo depuis la caméra et compte le nombre de frange 
-    ayant défilées au niveau d'un point sélectionné par l'utilisateur et permet:
+    ayant défilées au niveau d'un point sélectionné par l'utilisateur (ou, si centers est
+    donné, indépendamment au niveau de chacun de ces points) et permet:
     - de lancer/arrêter le comptage des franges avec la touche 'c',
     - de quitter la fonction avec la touche ÉCHAP.
+    Avec auto, le centre des anneaux est d'abord détecté automatiquement ; la sélection
+    à la souris n'est demandée que si la détection n'est pas assez sûre.
+    Avec track > 0, le point mesuré suit la dérive du centre des anneaux, réestimé toutes les
+    track images (voir an.CenterTracker), et sa trajectoire est ajoutée au résultat.
+    Le nombre de franges et leur fréquence sont affichés en direct pendant le comptage, ainsi que
+    la fréquence estimée par le spectre des dernières images (voir an.FringeRateMeter), qui
+    donne la vitesse du miroir si wavelength (m) est connue.
+    Avec window, les seuils du comptage suivent l'enveloppe des window dernières images
+    (dérive du contraste, voir an.FringeCounter).
+    Les images sont lues dans un thread et comptées dans un autre (voir acquisition.CapturePipeline) :
+    un affichage lent ne fait pas perdre d'images au comptage.
+    Avec save_trace, la trace de luminosité de chaque comptage est enregistrée au fil de l'eau
+    dans un fichier de trace daté (voir tracefile), pour pouvoir la recompter plus tard.
+    Si motor est donné (port série, ou "replay:<fichier>", voir moteur.open_transport), les pas
+    du moteur sont lus pendant toute la session et enregistrés dans un fichier .steps.csv ; à la
+    fin de chaque comptage, le nombre de franges par pas est ajusté (voir moteur.calibrate) et
+    donne la longueur d'onde si pitch (m par tour de vis) est connu, ou le pas de vis si
+    wavelength (m) est connue.
+    La touche 'p' active ou désactive la mesure de la durée de chaque étape (analyse et affichage),
+    affichée sur l'image (voir acquisition.Profiler) ; avec profile (fichier .csv ou .json), la
+    mesure est active dès le départ et exportée à la fin, celle du thread d'analyse dans un
+    fichier séparé (mesures_analyse.csv pour mesures.csv).
     
     """
     
@@ -208,47 +465,169 @@ def fringe_counter_from_camera(index=0):
         return
     
     # Initialisation des paramètres
-    counting = False  # Indique si le comptage est en cours
-    center = None  # Coordonnées du point sélectionné
+    session = {"counting": False, "center": None, "closed": False}  # Comptage en cours, point sélectionné et fin de l'acquisition, partagés avec le thread d'analyse
     click_data = {"click_position": None}  # Stocke la position du clic
-    L = []  # Liste des valeurs de luminosité
+    counter = an.FringeCounter(window=window)  # Compteur de franges incrémental
+    lock = threading.Lock()  # Protège session et counter
+    sampler = None  # Mesure simultanée des points de centers
+    tracker = None  # Suivi de la dérive du centre
+    writer = None  # Fichier de trace du comptage en cours
     res=None
-
+    
+    if centers:
+        # Plusieurs points donnés : pas de sélection à la souris
+        session["center"] = centers[0]
+        counter = an.MultiFringeCounter(len(centers), window=window)
+        
+        # Points vérifiés avant le lancement du thread d'analyse
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width > 0 and height > 0:
+            try:
+                an.PointSampler(centers, (height, width))
+            except ValueError as error:
+                print(f"Erreur : {error}")
+                cap.release()
+                return
+    
+    def count(packet):
+        # Exécuté par le thread d'analyse pour chaque image capturée
+        nonlocal sampler
+        with lock:
+            if session["closed"]:
+                return  # Thread d'analyse encore actif après close : la trace est déjà fermée
+            with analysis_profiler.stage("luminosity"):
+                if session["counting"] and centers:
+                    if sampler is None:
+                        sampler = an.PointSampler(centers, packet["frame"].shape)
+                    luminosity = sampler(packet["frame"])
+                elif session["counting"] and session["center"]:
+                    if tracker is not None:
+                        session["center"] = tracker.update(packet["frame"])
+                    luminosity = an.get_position_luminosity(session["center"], packet["frame"])
+                else:
+                    return
+            with analysis_profiler.stage("counter"):
+                counter.update(luminosity, packet["timestamp"])
+                if rate_meter is not None and not centers:
+                    rate_meter.update(luminosity)
+            if save_trace:
+                with analysis_profiler.stage("trace"):
+                    record(luminosity, packet["timestamp"])
+    
+    def record(luminosity, timestamp):
+        # Ajoute l'échantillon au fichier de trace, créé au début de chaque comptage
+        nonlocal writer
+        if writer is None:
+            file_name = new_base_name(".trace") + ".trace"
+            writer = tf.TraceWriter(file_name, len(centers) if centers else 1, camera=index, centers=centers or [session["center"]], size=11, shape="square", fps=fps)
+        writer.append(luminosity, timestamp)
+    
+    def close_trace():
+        nonlocal writer
+        if writer is not None:
+            writer.close()
+            print(f"Trace enregistrée : {writer.file_name} ({writer.count} images)")
+            if step_reader is not None and not centers:
+                calibration_from_trace(writer.file_name, step_reader.get_steps(), wavelength, pitch)
+            writer = None
+    
+    def print_results():
+        # Affiche le résultat du comptage en cours et le renvoie
+        if centers:
+            res = counter.results()
+            for center, res_point in zip(centers, res):
+                print(f"Point {center} : {res_point['count']} extinctions" + (" (+1)" if res_point["half_period"] else ""))
+        else:
+            res = counter.result()
+            an.print_result(res)
+            if tracker is not None:
+                res["centers"] = tracker.get_trajectory()
+                print_drift(res["centers"])
+        return res
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)  # Fréquence nominale, enregistrée avec la trace
+    rate_meter = an.FringeRateMeter(fps, wavelength=wavelength) if fps > 0 else None  # Fréquence spectrale des franges
+    profiler = acq.Profiler(fps, enabled=profile is not None)  # Durée de chaque étape de l'affichage
+    analysis_profiler = acq.Profiler(fps, enabled=profile is not None)  # Et du thread d'analyse, image par image
+    
+    def analyse(packet):
+        # Une ligne de mesures par image analysée
+        count(packet)
+        analysis_profiler.frame(packet["timestamp"])
+    
+    pipeline = acq.CapturePipeline(cap, maxsize=256, policy="block").start()
+    pipeline.consume(analyse)
+    
+    # Lecture des pas du moteur, datés avec la même horloge que les images
+    step_reader = None
+    if motor is not None:
+        step_reader = mo.StepReader(mo.open_transport(motor), log=new_base_name(".steps.csv") + ".steps.csv").start()
+    
+    def close():
+        pipeline.release()
+        with lock:
+            session["closed"] = True
+            close_trace()  # Plus aucune image comptée : la trace est complète
+        if step_reader is not None:
+            step_reader.stop()
+        cv2.destroyAllWindows()
     
     cv2.namedWindow("Video")  # Crée une fenêtre pour l'affichage
     cv2.setMouseCallback("Video", an.get_position, click_data)  # Associe une fonction de récupération des clics à la souris
     
-    while cap.isOpened():
-        # Capture une image depuis la caméra
-        ret, frame = cap.read()
-        if not ret:
+    last = -1  # Index de la dernière image affichée
+    while True:
+        # Récupère la dernière image capturée pour l'affichage
+        with profiler.stage("latest"):
+            packet = pipeline.latest(last)
+        if packet is None:
             print("Erreur : Impossible de lire une image depuis la caméra.")
             break
+        last = packet["index"]
+        timestamp = packet["timestamp"]
+        frame = packet["frame"].copy()
         
+        # Affichage du comptage en direct
+        with profiler.stage("drawing"):
+            if session["counting"] and centers:
+                for center, count_point in zip(centers, counter.counts):
+                    cv2.circle(frame, center, 3, (0, 0, 255), -1)
+                    cv2.putText(frame, str(count_point), (center[0] + 5, center[1] - 5),cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+            elif session["counting"] and session["center"]:
+                if tracker is not None:
+                    cv2.circle(frame, session["center"], 5, (0, 0, 255), -1)  # Position actuelle du centre suivi
+                cv2.putText(frame, f'Franges : {counter.count}  ({counter.rate:.1f} /s)', (30, 30),cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 1, cv2.LINE_AA)
+                if rate_meter is not None:
+                    text = f'Spectre : {rate_meter.rate:.2f} /s'
+                    if rate_meter.velocity is not None:
+                        text += f'  ({rate_meter.velocity * 1e6:.2f} um/s)'
+                    cv2.putText(frame, text, (30, 60),cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
         
-        cv2.imshow('Video', frame)  # Affiche l'image capturée
+        with profiler.stage("overlay"):
+            # Durées des étapes, si la mesure est active
+            profiler.draw(frame, title="Affichage")
+            analysis_profiler.draw(frame, x=frame.shape[1] // 2, title="Analyse")
         
-        # Si le comptage est activé et que le centre est défini, on enregistre la luminosité
-        if counting and center:
-            luminosity = an.get_position_luminosity(center, frame)
-            L.append(luminosity)
+        with profiler.stage("imshow"):
+            cv2.imshow('Video', frame)  # Affiche l'image capturée
         
         # Si le comptage est activé mais que le centre n'est pas encore défini
-        if counting and not center:
+        if session["counting"] and not session["center"]:
             click_data["click_position"] = None
+            center = auto_center(packet["frame"]) if auto else None
             
             #recupération du centre 
             while not center:
-                ret, frame = cap.read()
-                if not ret:
+                packet = pipeline.latest(last)
+                if packet is None:
                     print("Erreur : Impossible de lire une image depuis la caméra.")
                     break
+                last = packet["index"]
+                frame = packet["frame"].copy()
                 
                 key = cv2.waitKey(1) & 0xFF
                 if key == 27:
-                    cap.release()
-                    cv2.destroyAllWindows()
-                    return
+                    break
                 
                 og_frame = frame.copy()  # Sauvegarde de l'image originale
                 #créer et affiche une image donnant les instructions à l'utilisateur
@@ -274,24 +653,42 @@ def fringe_counter_from_camera(index=0):
                             click_data["click_position"] = None
                             break
                         if key == 27:  # Quitter si la touche ÉCHAP est pressée
-                            cap.release()
-                            cv2.destroyAllWindows()
-                            return
+                            center = None
+                            break
+                    
+                    if key == 27:
+                        break
             
-            # Enregistre la première valeur de luminosité
-            luminosity = an.get_position_luminosity(center, og_frame)
-            L.append(luminosity)
+            if not center:
+                break  # Échap ou fin de la lecture : même sortie que la boucle principale
+            
+            # Le thread d'analyse compte à partir des images suivantes
+            with lock:
+                session["center"] = center
+                tracker = an.CenterTracker(center, every=track) if track else None
+        
+        with profiler.stage("waitKey"):
+            key = cv2.waitKey(1) & 0xFF
+        profiler.frame(timestamp, pipeline)
         
-        key = cv2.waitKey(1) & 0xFF
+        # Mesure de la durée des étapes
+        if key == ord('p'):
+            profiler.toggle()
+            analysis_profiler.toggle()
         
         # Activation/désactivation du comptage des franges
         if key == ord('c'):
-            counting = not counting
-            if not counting:
-                res=an.luminosity_analyse(L)  # Analyse des valeurs enregistrées
-                center = None  # Réinitialisation des paramètres
-                click_data["click_position"] = None
-                L = []
+            with lock:
+                session["counting"] = not session["counting"]
+                if not session["counting"]:
+                    res=print_results()  # Résultat du comptage
+                    close_trace()
+                    if not centers:
+                        session["center"] = None  # Réinitialisation des paramètres
+                    click_data["click_position"] = None
+                    counter.reset()
+                    if rate_meter is not None:
+                        rate_meter.reset()
         
         # Quitter si la touche ÉCHAP est pressée
         if key == 27:
@@ -299,17 +696,19 @@ def fringe_counter_from_camera(index=0):
         
     
     # Libération des ressources et fermeture des fenêtres
-    cap.release()
-    cv2.destroyAllWindows()
+    close()
+    acq.print_stats(pipeline.stats())
+    close_profiler(profiler, profile)
+    close_profiler(analysis_profiler, analysis_file(profile))
     
-    # Analyse si des données étaient en train d'êtres enregistrées
-    if L!=[]:
-        res=an.luminosity_analyse(L)
+    # Résultat si un comptage était en cours (et un centre choisi)
+    if session["counting"] and session["center"]:
+        res=print_results()
     
     return res
 
 #%%
-def fringe_counter_from_file(file_name):
+def fringe_counter_from_file(file_name, auto=True, track=0):
     
     """
     Capture un flux vidéo depuis un fichier vidéo et compte le nombre de frange 
@@ -325,6 +724,7 @@ def fringe_counter_from_file(file_name):
        
     counting=False
     center=None
+    tracker=None
     click_data = {"click_position": None} 
     L=[]
     
@@ -343,6 +743,9 @@ def fringe_counter_from_file(file_name):
         
         if counting and center:
             
+            if tracker is not None:
+                center = tracker.update(frame)
+            
             luminosity = an.get_position_luminosity(center, frame)
             
             L.append(luminosity)
@@ -353,7 +756,9 @@ def fringe_counter_from_file(file_name):
             
             click_data["click_position"] = None
             og_frame=frame.copy()
-            cv2.putText(frame, 'cliquer au centre des anneaux', (30,30),cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
+            center = auto_center(og_frame) if auto else None
+            if not center:
+                cv2.putText(frame, 'cliquer au centre des anneaux', (30,30),cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
             
             while not center:
                                
@@ -398,6 +803,10 @@ def fringe_counter_from_file(file_name):
                         
             x,y = center
             
+            tracker = an.CenterTracker(center, every=track) if track else None
+            if tracker is not None:
+                center = tracker.update(og_frame)
+            
             luminosity = an.get_position_luminosity(center, og_frame)
             
             L.append(luminosity)
@@ -409,6 +818,8 @@ def fringe_counter_from_file(file_name):
             counting = not counting
             if not counting:
                 an.luminosity_analyse(L)
+                if tracker is not None:
+                    print_drift(tracker.get_trajectory())
                 center=None
                 click_data["click_position"]=None
                 L=[]
@@ -422,17 +833,375 @@ def fringe_counter_from_file(file_name):
     
     if L:
         an.luminosity_analyse(L)
+        if tracker is not None:
+            print_drift(tracker.get_trajectory())
         
     return
 
 
 #%%
-def luminosity_graph_from_camera(index=0):
+def open_video_at(file_name, start=0):
+    """
+    Ouvre un fichier vidéo positionné sur l'image start.
+    Si le positionnement est refusé ou imprécis, les images sont sautées une à une depuis le début.
+    
+    Retourne l'objet cv2.VideoCapture, ou None si le fichier ne peut pas être ouvert.
+    """
+    
+    cap = cv2.VideoCapture(file_name)
+    if not cap.isOpened():
+        print("Erreur : Impossible d'ouvrir le fichier.")
+        return None
+    
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)  # Positionnement sur la première image
+        
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            # Positionnement refusé ou imprécis : on avance image par image depuis le début
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            for _ in range(start):
+                if not cap.grab():
+                    break
+    
+    return cap
+
+def read_frame_at(file_name, start=0):
+    """
+    Renvoie l'image start d'un fichier vidéo, ou None si elle ne peut pas être lue.
+    
+    """
+    cap = open_video_at(file_name, start)
+    if cap is None:
+        return None
+    
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        print("Erreur : Impossible de lire une image.")
+        return None
+    return frame
+
+#%%
+def luminosity_trace_from_file(file_name, center, start=0, stop=None, size=11, shape="square", tracker=None, inner=0):
+    """
+    Extrait sans affichage la luminosité autour du point center pour chaque image
+    d'un fichier vidéo, de l'image start (incluse) à l'image stop (exclue).
+    La zone de mesure (taille, forme et rayon intérieur de l'anneau) est décrite par size,
+    shape et inner, voir an.get_roi_mask.
+    Si center vaut None, le centre des anneaux est détecté sur la première image (voir detect_center).
+    Si tracker (an.CenterTracker) est donné, le point mesuré suit la dérive du centre des anneaux.
+    Le décodage n'est pas cadencé par waitKey : il va aussi vite que le décodeur.
+    
+    Retourne le tableau des luminosités et le nombre d'images par seconde de la vidéo,
+    ou None, None si le fichier est illisible, le centre introuvable ou la zone de mesure
+    hors de l'image.
+    """
+    
+    cap = open_video_at(file_name, start)
+    if cap is None:
+        return None, None
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    
+    L = []
+    index = start
+    while stop is None or index < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break  # Fin de la vidéo
+        
+        if center is None:
+            center = detect_center(frame)
+            if center is None:
+                cap.release()
+                return None, None
+            if tracker is not None and tracker.center is None:
+                tracker.center = center  # Le suivi part du centre détecté
+        
+        if tracker is not None:
+            center = tracker.update(frame)
+        
+        try:
+            L.append(an.get_position_luminosity(center, frame, size, shape, inner))
+        except ValueError as error:
+            print(f"Erreur : {error}")
+            cap.release()
+            return None, None
+        index += 1
+    
+    cap.release()
+    
+    return np.array(L, dtype=np.uint8), fps
+
+#%%
+def luminosity_traces_from_file(file_name, centers, start=0, stop=None, size=11, shape="square", inner=0):
+    """
+    Équivalent de luminosity_trace_from_file pour plusieurs points mesurés simultanément
+    (voir an.PointSampler) : une seule lecture des pixels utiles par image.
+    
+    Retourne le tableau des luminosités (images * points) et le nombre d'images par seconde de la vidéo.
+    """
+    
+    cap = open_video_at(file_name, start)
+    if cap is None:
+        return None, None
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    
+    sampler = None
+    T = []
+    index = start
+    while stop is None or index < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break  # Fin de la vidéo
+        
+        if sampler is None:
+            try:
+                sampler = an.PointSampler(centers, frame.shape, size, shape, inner)
+            except ValueError as error:
+                print(f"Erreur : {error}")
+                cap.release()
+                return None, None
+        T.append(sampler(frame))
+        index += 1
+    
+    cap.release()
+    
+    return np.array(T, dtype=np.uint8).reshape(-1, len(centers)), fps
+
+#%%
+def fringe_counter_headless(file_name, center, start=0, stop=None, size=11, shape="square", track=0, smooth=0, window=None, inner=0):
+    """
+    Compte sans interface graphique le nombre de franges ayant défilé au niveau du point
+    center dans un fichier vidéo, entre les images start et stop.
+    Utilisable sur un serveur sans écran.
+    Avec track > 0, le centre des anneaux est réestimé toutes les track images (voir an.CenterTracker)
+    et sa trajectoire est ajoutée au résultat ("centers").
+    Avec smooth > 0, la trace est lissée avant le comptage et avec window, les seuils suivent
+    l'enveloppe locale de la trace (voir an.luminosity_analyse).
+    
+    Retourne le résultat de luminosity_analyse et la trace de luminosité (non lissée).
+    """
+    
+    tracker = an.CenterTracker(center, every=track) if track else None
+    
+    L, fps = luminosity_trace_from_file(file_name, center, start, stop, size, shape, tracker, inner)
+    if L is None:
+        return None, None  # Erreur déjà signalée (fichier illisible ou centre introuvable)
+    if len(L) == 0:
+        print("Erreur : Aucune image n'a pu être lue.")
+        return None, L
+    
+    res = an.luminosity_analyse(L, smooth=smooth, window=window)
+    
+    if tracker is not None:
+        res["centers"] = tracker.get_trajectory()
+        print_drift(res["centers"])
+    
+    return res, L
+
+#%%
+def print_drift(trajectory):
+    """
+    Affiche le déplacement du centre des anneaux entre la première et la dernière estimation.
+    
+    """
+    if len(trajectory) < 2:
+        return
+    dx, dy = trajectory[-1, 1:3] - trajectory[0, 1:3]
+    print(f"Dérive du centre : ({dx:+.0f}, {dy:+.0f}) pixels")
+
+#%%
+def radial_profiles_from_file(file_name, center=None, start=0, stop=None, bin_width=1.0, max_radius=None):
+    """
+    Calcule sans affichage le profil radial de luminosité (moyenne azimutale autour de center,
+    voir an.RadialProfile) et les rayons des anneaux sombres de chaque image d'un fichier vidéo.
+    Si center vaut None, le centre des anneaux est détecté sur la première image.
+    
+    Retourne les profils (images * couronnes), les rayons des couronnes et la liste des rayons
+    des anneaux de chaque image.
+    """
+    
+    cap = open_video_at(file_name, start)
+    if cap is None:
+        return None, None, None
+    
+    engine = None
+    profiles = []
+    rings = []
+    index = start
+    while stop is None or index < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break  # Fin de la vidéo
+        
+        if engine is None:
+            if center is None:
+                center = detect_center(frame)
+                if center is None:
+                    break
+            engine = an.RadialProfile(frame.shape, center, bin_width, max_radius)
+        
+        profile = engine(frame)
+        profiles.append(profile)
+        rings.append(an.ring_radii(profile, engine.radii))
+        index += 1
+    
+    cap.release()
+    
+    if engine is None:
+        return None, None, None
+    
+    return np.array(profiles), engine.radii, rings
+
+#%%
+def fringe_counter_multi_headless(file_name, centers, start=0, stop=None, size=11, shape="square", smooth=0, window=None, inner=0):
+    """
+    Compte sans interface graphique, indépendamment pour chaque point de centers, le nombre
+    de franges ayant défilé dans un fichier vidéo entre les images start et stop.
+    
+    Retourne la liste des résultats de luminosity_analyse et les traces de luminosité (images * points).
+    """
+    
+    T, fps = luminosity_traces_from_file(file_name, centers, start, stop, size, shape, inner)
+    if T is None:
+        return None, None  # Erreur déjà signalée (fichier illisible ou point hors de l'image)
+    if len(T) == 0:
+        print("Erreur : Aucune image n'a pu être lue.")
+        return None, T
+    
+    res = an.luminosity_analyse_multi(T, smooth=smooth, window=window)
+    for center, res_point in zip(centers, res):
+        print(f"Point {center} : {res_point['count']} extinctions" + (" (+1)" if res_point["half_period"] else ""))
+    
+    return res, T
+
+#%%
+def save_luminosity_trace(output, L, file_name, centers=None, start=0, size=11, shape="square", inner=0):
+    """
+    Sauvegarde la trace L extraite du fichier vidéo file_name à partir de l'image start :
+    au format .npy si output se termine par .npy, sinon dans un fichier de trace (voir tracefile)
+    avec l'instant de chaque image et la description de la mesure.
+    """
+    if output.endswith(".npy"):
+        np.save(output, L)
+        return
+    
+    cap = cv2.VideoCapture(file_name)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    
+    timestamps = (start + np.arange(len(L))) / fps if fps > 0 else None
+    tf.save_trace(output, L, timestamps, video=os.path.abspath(file_name), centers=centers, start=start, size=size, shape=shape, inner=inner, fps=fps)
+
+def fringe_counter_from_trace(file_name, smooth=0, phase=False, window=None, rate=False, wavelength=None):
+    """
+    Recompte les franges d'une trace sauvegardée (fichier de trace ou .npy) sans relire la vidéo.
+    La trace est relue avec numpy.memmap : seul le comptage est refait.
+    Avec rate, la fréquence des franges au cours du temps est aussi estimée par transformée de
+    Fourier à court terme (voir an.fringe_rate), ainsi que la vitesse du miroir si wavelength (m)
+    est donnée ; fps est lu dans l'en-tête de la trace ou déduit des instants de capture.
+    
+    Retourne le résultat de luminosity_analyse (liste de résultats si plusieurs points) et la trace.
+    """
+    if file_name.endswith(".npy"):
+        L, timestamps, header = np.load(file_name, mmap_mode="r"), None, {}
+    else:
+        L, timestamps, header = tf.load_trace(file_name)
+    
+    if len(L) == 0:
+        print("Erreur : Trace vide.")
+        return None, L
+    
+    if L.ndim > 1:
+        centers = header.get("centers") or range(L.shape[1])
+        res = an.luminosity_analyse_multi(L, smooth=smooth, window=window)
+        for center, res_point in zip(centers, res):
+            print(f"Point {tuple(center) if isinstance(center, list) else center} : {res_point['count']} extinctions" + (" (+1)" if res_point["half_period"] else ""))
+        return res, L
+    
+    res = an.luminosity_analyse(L, smooth=smooth, window=window)
+    if phase:
+        an.phase_analyse(L)
+    if rate:
+        fps = header.get("fps") or 0
+        if not fps > 0 and timestamps is not None and np.isfinite(timestamps).sum() > 1:
+            fps = 1 / np.nanmedian(np.diff(timestamps))
+        if fps > 0:
+            res["rate"] = an.fringe_rate(L, fps, wavelength=wavelength, verbose=True)
+        else:
+            print("Erreur : Fréquence d'acquisition inconnue, fréquence des franges non estimée.")
+    return res, L
+
+
+def calibration_from_trace(trace_file, steps, wavelength=None, pitch=None):
+    """
+    Ajuste le nombre de franges défilées en fonction du nombre de pas du moteur, à partir d'une
+    trace enregistrée (fichier de trace) et des pas datés (tableau de moteur.StepReader.get_steps,
+    ou nom du fichier .steps.csv), enregistrés avec la même horloge.
+    
+    Retourne le résultat de moteur.calibrate.
+    """
+    L, timestamps, _ = tf.load_trace(trace_file)
+    if isinstance(steps, str):
+        steps = mo.load_steps(steps)
+    if len(L) == 0:
+        print("Erreur : Trace vide.")
+        return None
+    
+    res = an.luminosity_analyse(L, verbose=False)
+    fringes = mo.fringes_from_crossings(res["crossings"], len(L))
+    
+    calibration = mo.calibrate(mo.align_steps(steps, timestamps), fringes, wavelength, pitch)
+    mo.print_calibration(calibration)
+    return calibration
+
+def phase_maps_from_file(file_name, output=None, method="fourier", steps=None, fringes_per_step=None, wavelength=None, pitch=None, start=0, stop=None, scale=1.0, chunk=8):
+    """
+    Calcule les cartes de phase plein champ d'une vidéo (voir fullfield.phase_maps) et les
+    enregistre dans output + "_wrapped.npy" et output + "_unwrapped.npy" (nom de la vidéo par défaut).
+    Pour la méthode temporelle, steps est le fichier .steps.csv enregistré avec la vidéo
+    (video_from_camera avec motor) ; le nombre de franges par pas est donné directement
+    (voir calibrate) ou déduit de la longueur d'onde et du pas de vis (m par tour).
+    
+    Retourne le résultat de fullfield.phase_maps.
+    """
+    if output is None:
+        output = os.path.splitext(file_name)[0]
+    
+    shifts = None
+    if method == "temporal":
+        if fringes_per_step is None and wavelength is not None and pitch is not None:
+            fringes_per_step = 2 * pitch / (mo.STEPS_PER_TURN * wavelength)  # lambda / 2 par frange
+        if steps is None or fringes_per_step is None:
+            print("Erreur : La méthode temporelle nécessite les pas du moteur et le nombre de franges par pas (ou la longueur d'onde et le pas de vis).")
+            return None
+        shifts = ff.video_phase_shifts(file_name, mo.load_steps(steps), fringes_per_step)
+        if shifts is None:
+            return None
+        shifts = shifts[start:]
+    
+    res = ff.phase_maps(file_name, output, method, shifts, start, stop, scale, chunk, wavelength)
+    if res is not None:
+        ff.print_phase_maps(res)
+    return res
+
+
+#%%
+def luminosity_graph_from_camera(index=0, auto=True, preview_scale=1.0, profile=None):
     """
     Capture un flux vidéo depuis une caméra et affiche une courbe de luminosité selon les 
     point d'une droite horizontale en fonction d'un point sélectionné par l'utilisateur et permet:
     - de lancer/arrêter l'affichage de la courbe de luminosité avec la touche 'g',
     - de quitter la fonction avec la touche ÉCHAP
+    preview_scale < 1 réduit les images avant le calcul et l'affichage (aperçu plus rapide).
+    Avec auto, le point suivi est le centre des anneaux détecté automatiquement, s'il est trouvé.
+    Les images sont lues dans un thread séparé qui ne garde que les plus récentes :
+    la courbe suit la caméra même si son calcul est plus lent que la capture.
+    La touche 'p' active ou désactive la mesure de la durée de chaque étape (conversion, filtrage,
+    lissage, dessin, ...), affichée sur l'image (voir acquisition.Profiler) ; avec profile (fichier
+    .csv ou .json), la mesure est active dès le départ et exportée à la fin.
     
     """
     # Ouvre la caméra avec l'index spécifié
@@ -443,7 +1212,6 @@ def luminosity_graph_from_camera(index=0):
     
     cv2.namedWindow("Video")  # Crée une fenêtre pour afficher la vidéo
     
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))  # Récupère la hauteur de la vidéo
     graph = False  # Indique si l'affichage de la courbe est activé
     center = None  # Stocke la position du point sélectionné
     click_data = {"click_position": None}  # Dictionnaire pour stocker la position du clic
@@ -451,38 +1219,52 @@ def luminosity_graph_from_camera(index=0):
     # Associe une fonction de rappel pour récupérer la position du clic de la souris
     cv2.setMouseCallback("Video", an.get_position, click_data)
     
-    while cap.isOpened():
-        ret, frame = cap.read()  # Capture une image de la caméra
+    # Lecture dans un thread séparé : les images trop anciennes sont abandonnées
+    pipeline = acq.CapturePipeline(cap, maxsize=2, policy="drop").start()
+    profiler = acq.Profiler(cap.get(cv2.CAP_PROP_FPS), enabled=profile is not None)  # Durée de chaque étape
+    
+    while True:
+        with profiler.stage("get"):
+            ret, frame = pipeline.read()  # Récupère une image de la caméra
         if not ret:
             print("Erreur : Impossible de lire une image depuis la caméra.")
             break
+        with profiler.stage("resize"):
+            frame = resize_preview(frame, preview_scale)
         
         if not graph:
-            cv2.imshow('Video', frame)  # Affiche l'image
+            with profiler.stage("overlay"):
+                profiler.draw(frame)  # Durées des étapes, si la mesure est active
+            with profiler.stage("imshow"):
+                cv2.imshow('Video', frame)  # Affiche l'image
         
         if graph and center:  # Si la courbe est activé et qu'un point est sélectionné
-            L = an.luminosity_array(frame, center)  # Récupère les valeurs de luminosité
+            L = an.luminosity_array(frame, center, profiler=profiler)  # Récupère les valeurs de luminosité
             
             # Trace la courbe de luminosité sur l'image
-            for i in range(1, len(L)):
-                cv2.line(frame, (i - 1, height - L[i - 1]), (i, height - L[i]), (255, 0, 0), 2)
+            with profiler.stage("drawing"):
+                draw_luminosity_curve(frame, L, 2, preview_scale)
+            with profiler.stage("overlay"):
+                profiler.draw(frame)
             
-            cv2.imshow('Video', frame)  #Affiche l'image
+            with profiler.stage("imshow"):
+                cv2.imshow('Video', frame)  #Affiche l'image
         
         if graph and not center:  # Si la courbe est activé mais qu'aucun point n'est défini
             click_data["click_position"] = None  # Réinitialise la position du clic
+            og_frame = frame.copy()
+            center = auto_center(og_frame) if auto else None  # Détection automatique du centre
             
             while not center:  # Attente d'un clic pour sélectionner un point
-                ret, frame = cap.read()
+                ret, frame = pipeline.read()
                 if not ret:
                     print("Erreur : Impossible de lire une image depuis la caméra.")
                     break
+                frame = resize_preview(frame, preview_scale)
                 
                 key = cv2.waitKey(1) & 0xFF  # Vérifie si une touche est pressée
                 if key == 27:  # Si "Échap" est pressé, quitte la boucle
-                    cap.release()
-                    cv2.destroyAllWindows()
-                    return
+                    break
                 
                 og_frame = frame.copy()  # Sauvegarde une copie de l'image actuelle
                 
@@ -514,20 +1296,29 @@ def luminosity_graph_from_camera(index=0):
                             break
                         
                         if key == 27:  # Si "Échap" est pressé, quitte le programme
-                            cap.release()
-                            cv2.destroyAllWindows()
-                            return
-
+                            center = None
+                            break
+                    
+                    if key == 27:
+                        break
+            
+            if not center:
+                break  # Échap ou fin de la lecture : même sortie que la boucle principale
+            
             x, y = center  # Récupère les coordonnées du point sélectionné
             
             # Calcule les valeurs de luminosité et trace la courbe
             L = an.luminosity_array(og_frame, center)
-            for i in range(1, len(L)):
-                cv2.line(frame, (i - 1, height - L[i - 1]), (i, height - L[i]), (255, 0, 0), 3)
+            draw_luminosity_curve(frame, L, 3, preview_scale)
             
             cv2.imshow('Video', frame)  # Met à jour l'affichage
         
-        key = cv2.waitKey(1) & 0xFF  # Attend une entrée clavier
+        with profiler.stage("waitKey"):
+            key = cv2.waitKey(1) & 0xFF  # Attend une entrée clavier
+        profiler.frame(pipeline=pipeline)
+        
+        if key == ord('p'):  # Active/désactive la mesure de la durée des étapes
+            profiler.toggle()
         
         if key == ord('g'):  # Active/désactive l'affichage du graphique
             graph = not graph
@@ -540,14 +1331,17 @@ def luminosity_graph_from_camera(index=0):
         if key == 27:  # Quitte le programme si "Échap" est pressé
             break
 
-    cap.release()  # Libère la caméra
+    pipeline.release()  # Libère la caméra
+    acq.print_stats(pipeline.stats())
+    close_profiler(profiler, profile)
+
     cv2.destroyAllWindows()  # Ferme toutes les fenêtres ouvertes
 
     return
 
 #%%
 
-def luminosity_graph_from_file(file_name):
+def luminosity_graph_from_file(file_name, auto=True, preview_scale=1.0):
     """
     Capture un flux vidéo depuis un fichier vidéo et affiche une courbe de luminosité selon les 
     point d'une droite horizontale en fonction d'un point sélectionné par l'utilisateur.
@@ -568,7 +1362,6 @@ def luminosity_graph_from_file(file_name):
     
     cv2.namedWindow("Video")
     
-    height= int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     graph=False
     center=None
     click_data = {"click_position": None}
@@ -583,6 +1376,7 @@ def luminosity_graph_from_file(file_name):
         if not ret:
             print("Fin de la vidéo.")
             break  
+        frame = resize_preview(frame, preview_scale)
         
         cv2.imshow('Video',frame)
         
@@ -590,8 +1384,7 @@ def luminosity_graph_from_file(file_name):
             
             L=an.luminosity_array(frame,center)
             
-            for i in range(1, len(L)):
-                cv2.line(frame,(i - 1,height-L[i - 1]),(i,height-L[i]),(255,0, 0), 2)
+            draw_luminosity_curve(frame, L, 2, preview_scale)
             
             cv2.imshow('Video',frame)
             
@@ -600,7 +1393,9 @@ def luminosity_graph_from_file(file_name):
             
             click_data["click_position"] = None
             og_frame=frame.copy()
-            cv2.putText(frame, 'cliquer ou vous shouaiter suivre la luminositee', (30,30),cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
+            center = auto_center(og_frame) if auto else None
+            if not center:
+                cv2.putText(frame, 'cliquer ou vous shouaiter suivre la luminositee', (30,30),cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
             
             while not center:
                 
@@ -648,8 +1443,7 @@ def luminosity_graph_from_file(file_name):
                 
             L=an.luminosity_array(og_frame,center)
             
-            for i in range(1, len(L)):
-                cv2.line(frame,(i - 1,height-L[i - 1]),(i,height- L[i]),(255,0, 0), 3)
+            draw_luminosity_curve(frame, L, 3, preview_scale)
             
             cv2.imshow('Video',frame)
             
@@ -671,4 +1465,153 @@ def luminosity_graph_from_file(file_name):
     
     cap.release()
     cv2.destroyAllWindows()
-    return
\ No newline at end of file
+    return
+
+
+#%%
+def smooth_window(value):
+    """
+    Type argparse de --smooth : 0 (pas de lissage) ou une fenêtre d'au moins 4 images
+    (polynôme d'ordre 3).
+    """
+    window = int(value)
+    if window != 0 and window < 4:
+        raise argparse.ArgumentTypeError(f"la fenêtre de lissage doit valoir 0 ou au moins 4 images : {value}")
+    return window
+
+def cli(argv=None):
+    """
+    Point d'entrée en ligne de commande, par exemple :
+    python main.py count video.avi --center 320 240 --start 0 --stop 1000 --output trace.npy
+    python main.py count video.avi  (centre des anneaux détecté automatiquement)
+    python main.py count video.avi --output mesure.trace puis python main.py recount mesure.trace --smooth 7
+    python main.py batch enregistrements/ --center 320 240 --output resultats.csv --workers 4
+    """
+    
+    parser = argparse.ArgumentParser(description="Analyse des vidéos de l'interféromètre de Michelson")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    count = subparsers.add_parser("count", help="compte les franges d'un fichier vidéo sans affichage")
+    count.add_argument("file_name", help="fichier vidéo à analyser")
+    count.add_argument("--center", nargs=2, type=int, action="append", metavar=("X", "Y"), help="centre de la zone mesurée (répéter l'option pour compter plusieurs points, détecté automatiquement par défaut)")
+    count.add_argument("--start", type=int, default=0, help="première image analysée")
+    count.add_argument("--stop", type=int, default=None, help="image de fin (exclue)")
+    count.add_argument("--size", type=int, default=11, help="taille de la zone mesurée en pixels")
+    count.add_argument("--shape", choices=("square", "disk", "annulus"), default="square", help="forme de la zone mesurée")
+    count.add_argument("--inner", type=int, default=0, help="rayon intérieur de l'anneau en pixels (--shape annulus, inférieur à size // 2)")
+    count.add_argument("--output", default=None, help="fichier où sauvegarder la trace de luminosité (.trace, ou .npy pour un simple tableau)")
+    count.add_argument("--workers", type=int, default=1, help="nombre de processus décodant chacun une partie de la vidéo")
+    count.add_argument("--track", type=int, default=0, metavar="N", help="réestime le centre des anneaux toutes les N images (dérive)")
+    count.add_argument("--phase", action="store_true", help="affiche aussi le nombre fractionnaire de franges (suivi de phase)")
+    count.add_argument("--smooth", type=smooth_window, default=0, metavar="N", help="lisse la trace sur N images (Savitzky-Golay d'ordre 3, N >= 4) avant le comptage")
+    count.add_argument("--window", type=int, default=None, metavar="N", help="seuils glissants sur N images (contraste variable, plus long que les arrêts du miroir)")
+    
+    calibrate = subparsers.add_parser("calibrate", help="ajuste le nombre de franges par pas du moteur")
+    calibrate.add_argument("trace", help="fichier de trace d'un comptage depuis la caméra")
+    calibrate.add_argument("steps", help="fichier .steps.csv des pas du moteur enregistrés pendant le comptage")
+    calibrate.add_argument("--wavelength", type=float, default=None, help="longueur d'onde du laser en mètres (donne le pas de vis)")
+    calibrate.add_argument("--pitch", type=float, default=None, help="pas de la vis micrométrique en mètres par tour (donne la longueur d'onde)")
+    
+    recount = subparsers.add_parser("recount", help="recompte une trace sauvegardée sans relire la vidéo")
+    recount.add_argument("file_name", help="fichier de trace (.trace ou .npy)")
+    recount.add_argument("--smooth", type=smooth_window, default=0, metavar="N", help="lisse la trace sur N images (Savitzky-Golay d'ordre 3, N >= 4) avant le comptage")
+    recount.add_argument("--window", type=int, default=None, metavar="N", help="seuils glissants sur N images (contraste variable, plus long que les arrêts du miroir)")
+    recount.add_argument("--phase", action="store_true", help="affiche aussi le nombre fractionnaire de franges (suivi de phase)")
+    recount.add_argument("--rate", action="store_true", help="estime la fréquence des franges au cours du temps (spectre glissant)")
+    recount.add_argument("--wavelength", type=float, default=None, help="longueur d'onde du laser en mètres (donne la vitesse du miroir)")
+    
+    rings = subparsers.add_parser("rings", help="mesure les rayons des anneaux et l'épaisseur de la lame d'air")
+    rings.add_argument("file_name", help="fichier vidéo à analyser")
+    rings.add_argument("--center", nargs=2, type=int, default=None, metavar=("X", "Y"), help="centre des anneaux (détecté automatiquement par défaut)")
+    rings.add_argument("--start", type=int, default=0, help="première image analysée")
+    rings.add_argument("--stop", type=int, default=None, help="image de fin (exclue)")
+    rings.add_argument("--wavelength", type=float, default=None, help="longueur d'onde du laser en mètres")
+    rings.add_argument("--focal", type=float, default=None, help="focale de l'objectif en pixels")
+    rings.add_argument("--output", default=None, help="fichier .npy où sauvegarder les profils radiaux")
+    
+    phase = subparsers.add_parser("phase", help="calcule les cartes de phase plein champ de chaque image (forme du miroir)")
+    phase.add_argument("file_name", help="fichier vidéo à analyser")
+    phase.add_argument("--output", default=None, help="préfixe des fichiers .npy des cartes de phase (nom de la vidéo par défaut)")
+    phase.add_argument("--method", choices=("fourier", "temporal"), default="fourier", help="franges rectilignes sur une image (fourier) ou décalage de phase par le moteur (temporal)")
+    phase.add_argument("--steps", default=None, help="fichier .steps.csv des pas du moteur enregistrés avec la vidéo (méthode temporelle)")
+    phase.add_argument("--fringes-per-step", type=float, default=None, help="nombre de franges par pas du moteur (voir calibrate)")
+    phase.add_argument("--wavelength", type=float, default=None, help="longueur d'onde du laser en mètres")
+    phase.add_argument("--pitch", type=float, default=None, help="pas de la vis micrométrique en mètres par tour")
+    phase.add_argument("--start", type=int, default=0, help="première image analysée")
+    phase.add_argument("--stop", type=int, default=None, help="image de fin (exclue)")
+    phase.add_argument("--scale", type=float, default=1.0, help="facteur de réduction des images avant le calcul")
+    phase.add_argument("--chunk", type=int, default=8, help="nombre d'images traitées ensemble (mémoire utilisée)")
+    
+    batch = subparsers.add_parser("batch", help="compte les franges de toutes les vidéos d'un dossier en parallèle")
+    batch.add_argument("path", help="dossier contenant les vidéos .avi ou motif glob")
+    batch.add_argument("--center", nargs=2, type=int, default=None, metavar=("X", "Y"), help="centre de la zone mesurée (détecté automatiquement dans chaque vidéo par défaut)")
+    batch.add_argument("--size", type=int, default=11, help="taille de la zone mesurée en pixels")
+    batch.add_argument("--shape", choices=("square", "disk", "annulus"), default="square", help="forme de la zone mesurée")
+    batch.add_argument("--inner", type=int, default=0, help="rayon intérieur de l'anneau en pixels (--shape annulus, inférieur à size // 2)")
+    batch.add_argument("--output", default="resultats.csv", help="tableau récapitulatif CSV")
+    batch.add_argument("--workers", type=int, default=None, help="nombre de processus (tous les cœurs par défaut)")
+    batch.add_argument("--restart", action="store_true", help="recalcule aussi les fichiers déjà traités")
+    
+    args = parser.parse_args(argv)
+    
+    # Combinaisons d'options non prises en charge
+    if args.command in ("count", "batch") and args.shape == "annulus" and not 0 <= args.inner < args.size // 2:
+        subparsers.choices[args.command].error(f"--inner doit être compris entre 0 et {args.size // 2 - 1} (--size {args.size})")
+    if args.command in ("count", "batch") and args.inner and args.shape != "annulus":
+        subparsers.choices[args.command].error("--inner n'est utilisé qu'avec --shape annulus")
+    if args.command == "count" and args.center and len(args.center) > 1:
+        unsupported = [option for option, used in (("--workers", args.workers > 1), ("--track", args.track), ("--phase", args.phase)) if used]
+        if unsupported:
+            count.error(f"{', '.join(unsupported)} : incompatible avec plusieurs --center")
+    if args.command == "count" and args.workers > 1 and args.track:
+        count.error("--track ne peut pas être utilisé avec --workers (le suivi du centre est séquentiel)")
+    
+    if args.command == "count" and args.center and len(args.center) > 1:
+        res, T = fringe_counter_multi_headless(args.file_name, [tuple(center) for center in args.center], args.start, args.stop, args.size, args.shape, args.smooth, args.window, args.inner)
+        if args.output and T is not None:
+            save_luminosity_trace(args.output, T, args.file_name, args.center, args.start, args.size, args.shape, args.inner)
+        return res
+    
+    if args.command == "count":
+        args.center = tuple(args.center[0]) if args.center else None
+        if args.workers > 1:
+            import batch as bt  # Import local : batch importe main
+            res, L = bt.parallel_fringe_counter(args.file_name, args.center, args.workers, args.start, args.stop, args.size, args.shape, args.smooth, args.window, args.inner)
+        else:
+            res, L = fringe_counter_headless(args.file_name, args.center, args.start, args.stop, args.size, args.shape, args.track, args.smooth, args.window, args.inner)
+        if args.output and L is not None:
+            save_luminosity_trace(args.output, L, args.file_name, [args.center] if args.center else None, args.start, args.size, args.shape, args.inner)
+        if args.phase and L is not None and len(L):
+            an.phase_analyse(L)
+        return res
+    
+    if args.command == "calibrate":
+        return calibration_from_trace(args.trace, args.steps, args.wavelength, args.pitch)
+    
+    if args.command == "recount":
+        return fringe_counter_from_trace(args.file_name, args.smooth, args.phase, args.window, args.rate, args.wavelength)[0]
+    
+    if args.command == "rings":
+        profiles, radii, rings = radial_profiles_from_file(args.file_name, tuple(args.center) if args.center else None, args.start, args.stop)
+        if profiles is None:
+            return None
+        if args.output:
+            np.save(args.output, profiles)
+        
+        res = [an.ring_analysis(radii_frame, args.wavelength, args.focal) for radii_frame in rings]
+        print(f"{len(rings)} images, {np.mean([len(radii_frame) for radii_frame in rings]):.1f} anneaux par image")
+        thickness = [res_frame["thickness"] for res_frame in res if res_frame and "thickness" in res_frame]
+        if thickness:
+            print(f"Épaisseur de la lame d'air : {np.mean(thickness) * 1e6:.2f} µm (écart-type {np.std(thickness) * 1e6:.2f} µm)")
+        return res
+    
+    if args.command == "phase":
+        return phase_maps_from_file(args.file_name, args.output, args.method, args.steps, args.fringes_per_step, args.wavelength, args.pitch, args.start, args.stop, args.scale, args.chunk)
+    
+    if args.command == "batch":
+        import batch as bt  # Import local : batch importe main
+        return bt.batch_count(args.path, tuple(args.center) if args.center else None, args.output, workers=args.workers, size=args.size, shape=args.shape, resume=not args.restart, inner=args.inner)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,266 @@
+"""
+Lecture des pas du moteur (moteur.ino) et calibration du déplacement du miroir.
+
+La carte envoie "steps:<n>" sur la liaison série (9600 bauds) à chaque pas ; un tour de la vis
+micrométrique correspond à STEPS_PER_TURN pas. StepReader lit ces messages dans un thread et les
+date avec la même horloge que l'acquisition (time.perf_counter, voir acquisition.CapturePipeline),
+ce qui permet de les aligner sur la trace de luminosité puis d'ajuster le nombre de franges par pas :
+une frange correspond à un déplacement du miroir de lambda / 2, d'où la longueur d'onde
+(pas de vis connu) ou le pas de vis (longueur d'onde connue).
+
+La liaison est fournie par un transport interchangeable : port série (pyserial, optionnel),
+pseudo-terminal ou fichier rejoué, pour tester sans le montage.
+
+Exemple :
+reader = StepReader(open_transport("COM3")).start()
+...
+reader.stop()
+res = calibrate(align_steps(reader.get_steps(), timestamps), fringes, wavelength=632.8e-9)
+"""
+
+#%%
+
+import csv
+import re
+import threading
+import time
+import numpy as np
+
+try:
+    import serial  # pyserial, seulement pour un vrai port série
+except ImportError:
+    serial = None
+
+#%%
+
+STEPS_PER_TURN = 3920  # Pas par tour de vis micrométrique (voir moteur.ino)
+BAUDRATE = 9600
+
+STEP_PATTERN = re.compile(rb"steps:\s*(-?\d+)")
+
+def parse_step(line):
+    """
+    Renvoie le nombre de pas d'une ligne "steps:<n>" envoyée par la carte, ou None.
+
+    """
+    match = STEP_PATTERN.search(line)
+    return int(match.group(1)) if match else None
+
+#%%
+
+class SerialTransport:
+    """
+    Port série (nécessite pyserial).
+
+    """
+
+    def __init__(self, port, baudrate=BAUDRATE, timeout=0.1):
+        if serial is None:
+            raise ImportError("pyserial est nécessaire pour lire un port série (pip install pyserial).")
+        self.port = serial.Serial(port, baudrate, timeout=timeout)
+
+    def readline(self):
+        return self.port.readline()
+
+    def close(self):
+        self.port.close()
+
+class FileTransport:
+    """
+    Fichier ou pseudo-terminal lu ligne par ligne, sans pyserial.
+
+    Pour rejouer un enregistrement de la liaison série, interval impose un délai (en secondes)
+    entre deux lignes (0.03 s environ dans moteur.ino). Un fichier se termine à sa dernière ligne.
+    """
+
+    def __init__(self, file_name, interval=0.0):
+        self.file = open(file_name, "rb", buffering=0)
+        self.interval = interval
+        self.ended = False  # Fin du fichier ou pseudo-terminal fermé
+
+    def readline(self):
+        if self.interval:
+            time.sleep(self.interval)
+        try:
+            line = self.file.readline()
+        except (OSError, ValueError):
+            line = b""  # Pseudo-terminal fermé par l'autre extrémité, ou transport fermé
+        if not line:
+            self.ended = True
+        return line
+
+    def close(self):
+        self.file.close()
+
+def open_transport(name, interval=0.0):
+    """
+    Ouvre le transport correspondant à name : "replay:<fichier>" pour rejouer un fichier
+    (ou lire un pseudo-terminal), sinon un port série ("COM3", "/dev/ttyACM0", ...).
+    """
+    if name.startswith("replay:"):
+        return FileTransport(name[len("replay:"):], interval)
+    return SerialTransport(name)
+
+#%%
+
+class StepReader:
+    """
+    Lit les messages du moteur dans un thread et date chaque pas à sa réception.
+
+    Avec log, les pas datés sont aussi écrits au fil de l'eau dans un fichier CSV
+    (colonnes "timestamp" et "steps"), relu par load_steps.
+    """
+
+    def __init__(self, transport, log=None, clock=time.perf_counter):
+        self.transport = transport
+        self.clock = clock
+        self.log = log
+        self.steps = []  # Liste de (instant, nombre de pas)
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        table = open(self.log, "w", newline="") if self.log else None
+        writer = csv.writer(table) if table else None
+        if writer:
+            writer.writerow(["timestamp", "steps"])
+
+        while self.running:
+            line = self.transport.readline()
+            timestamp = self.clock()
+            if not line:
+                if getattr(self.transport, "ended", False):
+                    break  # Fin du fichier rejoué
+                continue  # Délai de lecture du port série écoulé
+
+            step = parse_step(line)
+            if step is None:
+                continue
+
+            with self.lock:
+                self.steps.append((timestamp, step))
+            if writer:
+                writer.writerow([f"{timestamp:.6f}", step])
+                table.flush()
+
+        self.running = False
+        if table:
+            table.close()
+
+    @property
+    def latest(self):
+        """
+        Dernier nombre de pas reçu (None si aucun).
+
+        """
+        with self.lock:
+            return self.steps[-1][1] if self.steps else None
+
+    def get_steps(self):
+        """
+        Renvoie le tableau (pas reçus * 2) des instants de réception et des nombres de pas.
+
+        """
+        with self.lock:
+            return np.array(self.steps, dtype=float).reshape(-1, 2)
+
+    def stop(self):
+        """
+        Arrête la lecture et ferme le transport.
+
+        """
+        self.running = False
+        self.transport.close()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+def load_steps(file_name):
+    """
+    Relit le fichier CSV écrit par StepReader. Renvoie le même tableau que StepReader.get_steps.
+
+    """
+    with open(file_name, newline="") as table:
+        rows = [(float(row["timestamp"]), int(row["steps"])) for row in csv.DictReader(table)]
+    return np.array(rows, dtype=float).reshape(-1, 2)
+
+#%%
+
+def align_steps(steps, timestamps):
+    """
+    Renvoie le nombre de pas à chaque instant de timestamps (par exemple ceux de la trace de
+    luminosité), interpolé linéairement entre deux messages du moteur.
+    NaN avant le premier et après le dernier message.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    if len(steps) == 0:
+        return np.full(len(timestamps), np.nan)
+
+    return np.interp(timestamps, steps[:, 0], steps[:, 1], left=np.nan, right=np.nan)
+
+def fringes_from_crossings(crossings, n):
+    """
+    Renvoie, pour chacun des n échantillons d'une trace, le nombre de franges défilées depuis le
+    début d'après les basculements du trigger ("crossings" de luminosity_analyse) : une demi-frange par basculement.
+    """
+    return np.searchsorted(np.asarray(crossings), np.arange(n), side="right") / 2
+
+def calibrate(steps, fringes, wavelength=None, pitch=None, steps_per_turn=STEPS_PER_TURN):
+    """
+    Ajuste le nombre de franges défilées en fonction du nombre de pas du moteur (mêmes instants,
+    voir align_steps), les valeurs NaN étant ignorées.
+
+    Retourne un dictionnaire contenant la pente "fringes_per_step", l'ordonnée à l'origine,
+    l'écart-type des résidus (en franges), le nombre de points utilisés et :
+    - avec pitch (pas de la vis en m par tour) : la longueur d'onde "wavelength" (m),
+    - avec wavelength (m) : le pas de vis "pitch" (m par tour).
+    Le déplacement du miroir par pas "displacement_per_step" (m) est donné dans les deux cas.
+    Renvoie None s'il y a moins de deux points utilisables ou si le miroir n'a pas bougé.
+    """
+    steps = np.asarray(steps, dtype=float)
+    fringes = np.asarray(fringes, dtype=float)
+    valid = np.isfinite(steps) & np.isfinite(fringes)
+    if valid.sum() < 2 or np.ptp(steps[valid]) == 0:
+        return None
+
+    slope, intercept = np.polyfit(steps[valid], fringes[valid], 1)
+    residuals = fringes[valid] - (slope * steps[valid] + intercept)
+
+    res = {
+        "fringes_per_step": float(slope),
+        "intercept": float(intercept),
+        "residual": float(np.std(residuals)),
+        "points": int(valid.sum()),
+    }
+
+    # Une frange correspond à un déplacement du miroir de lambda / 2
+    if pitch is not None:
+        res["displacement_per_step"] = pitch / steps_per_turn
+        res["wavelength"] = 2 * res["displacement_per_step"] / abs(slope) if slope else None
+    elif wavelength is not None:
+        res["displacement_per_step"] = abs(slope) * wavelength / 2
+        res["pitch"] = res["displacement_per_step"] * steps_per_turn
+
+    return res
+
+def print_calibration(res):
+    """
+    Affiche le résultat de calibrate.
+
+    """
+    if res is None:
+        print("Erreur : Pas assez de pas du moteur pour la calibration.")
+        return
+
+    print(f"Franges par pas : {res['fringes_per_step']:.5f} (résidus {res['residual']:.2f} frange, {res['points']} points)")
+    if res.get("wavelength"):
+        print(f"Longueur d'onde : {res['wavelength'] * 1e9:.1f} nm")
+    if res.get("pitch"):
+        print(f"Pas de la vis : {res['pitch'] * 1e3:.4f} mm par tour ({res['displacement_per_step'] * 1e9:.2f} nm par pas)")
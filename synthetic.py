@@ -0,0 +1,138 @@
+"""
+Génération d'images et de traces synthétiques de l'interféromètre de Michelson.
+
+Les anneaux d'égale inclinaison d'une lame d'air d'épaisseur e sont observés au foyer d'un
+objectif de focale f (en pixels) : au rayon r, le déphasage vaut 4*pi*e*cos(theta)/lambda avec
+tan(theta) = r/f. Le déplacement du miroir fait varier e au cours du temps et défiler les anneaux.
+
+Chaque générateur renvoie aussi la vérité terrain (nombre de franges et d'extinctions au centre),
+ce qui permet de mesurer la vitesse et la justesse de l'analyse sans interféromètre :
+voir benchmark.bench_suite.
+
+Exemple :
+truth = write_synthetic_video("synthetique.avi", 600, displacement=mirror_displacement(600, 30, speed=1e-6))
+"""
+
+#%%
+
+import cv2
+import numpy as np
+
+#%%
+
+def mirror_displacement(n, fps=30, speed=0.5e-6, kind="linear", period=4.0, stall=0.0):
+    """
+    Renvoie le déplacement du miroir (en m) pour n images à fps images par seconde :
+    - "linear" : translation à vitesse constante speed (m/s),
+    - "sinusoidal" : aller-retour de vitesse maximale speed et de période period (s),
+    - "steps" : avance par à-coups comme le moteur pas à pas, en restant immobile une
+      fraction stall de chaque période.
+    """
+    t = np.arange(n) / fps
+
+    if kind == "linear":
+        return speed * t
+    if kind == "sinusoidal":
+        return speed * period / (2 * np.pi) * np.sin(2 * np.pi * t / period)
+    if kind == "steps":
+        # Vitesse moyenne speed, nulle pendant une fraction stall de chaque période
+        phase = (t / period) % 1
+        cycle = np.floor(t / period)
+        moving = np.clip(phase / (1 - stall), 0, 1) if stall < 1 else np.zeros_like(t)
+        return speed * period * (cycle + moving)
+
+    raise ValueError(f"Profil de déplacement inconnu : {kind}")
+
+def ground_truth(displacement, wavelength=632.8e-9, thickness=0.4e-3):
+    """
+    Renvoie la vérité terrain au centre des anneaux pour un déplacement du miroir :
+    - "phase" : déphasage au centre pour chaque image (rad),
+    - "fringes" : nombre de franges défilées (réel, |variation de phase| / 2 pi),
+    - "extinctions" : nombre de passages par une frange sombre (déphasage égal à pi modulo 2 pi).
+    """
+    phase = 4 * np.pi * (thickness + np.asarray(displacement, dtype=float)) / wavelength
+    dark = np.floor((phase - np.pi) / (2 * np.pi))
+
+    return {
+        "phase": phase,
+        "fringes": float(abs(phase[-1] - phase[0]) / (2 * np.pi)) if len(phase) else 0.0,
+        "extinctions": int(np.abs(np.diff(dark)).sum()),
+    }
+
+#%%
+
+def synthetic_frames(n, shape=(480, 640), center=None, wavelength=632.8e-9, thickness=0.4e-3, focal_px=1500,
+                     displacement=None, contrast=0.8, final_contrast=None, mean=120, noise=5.0, drift=(0.0, 0.0), seed=None):
+    """
+    Génère n images BGR (uint8) d'anneaux d'interférence de taille shape (hauteur, largeur).
+
+    - center : centre des anneaux (x, y) sur la première image (centre de l'image par défaut),
+    - displacement : déplacement du miroir pour chaque image (m), voir mirror_displacement,
+    - contrast : visibilité des franges, qui varie linéairement jusqu'à final_contrast,
+    - mean : luminosité moyenne, noise : écart-type du bruit (niveaux de gris),
+    - drift : dérive du centre des anneaux en pixels par image (dx, dy).
+    """
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    cx, cy = center if center is not None else (width / 2, height / 2)
+    displacement = np.zeros(n) if displacement is None else np.asarray(displacement, dtype=float)
+    contrasts = np.linspace(contrast, contrast if final_contrast is None else final_contrast, n)
+
+    x = np.arange(width, dtype=np.float32)
+    y = np.arange(height, dtype=np.float32)[:, None]
+
+    for i in range(n):
+        # cos(theta) = f / sqrt(f² + r²) autour du centre courant
+        r2 = (x - (cx + drift[0] * i)) ** 2 + (y - (cy + drift[1] * i)) ** 2
+        cos_theta = focal_px / np.sqrt(focal_px ** 2 + r2)
+
+        k = np.float32(4 * np.pi * (thickness + displacement[i]) / wavelength)
+        intensity = mean * (1 + contrasts[i] * np.cos(k * cos_theta))
+        if noise:
+            intensity += rng.normal(0, noise, intensity.shape).astype(np.float32)
+
+        gray = np.clip(intensity, 0, 255).astype(np.uint8)
+        yield cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+def write_synthetic_video(file_name, n, fps=30, codec="MJPG", **kwargs):
+    """
+    Enregistre n images de synthetic_frames (mêmes paramètres) dans un fichier vidéo.
+
+    Retourne la vérité terrain (voir ground_truth), complétée des paramètres de la vidéo.
+    """
+    shape = kwargs.get("shape", (480, 640))
+    writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*codec), fps, (shape[1], shape[0]))
+    if not writer.isOpened():
+        print("Erreur : Impossible de créer le fichier vidéo.")
+        return None
+
+    for frame in synthetic_frames(n, **kwargs):
+        writer.write(frame)
+    writer.release()
+
+    displacement = kwargs.get("displacement")
+    truth = ground_truth(np.zeros(n) if displacement is None else displacement,
+                         kwargs.get("wavelength", 632.8e-9), kwargs.get("thickness", 0.4e-3))
+    truth.update({"file": file_name, "frames": n, "fps": fps, "shape": shape})
+    return truth
+
+#%%
+
+def synthetic_trace(n, wavelength=632.8e-9, thickness=0.4e-3, displacement=None, contrast=0.8, final_contrast=None,
+                    mean=120, noise=5.0, seed=None):
+    """
+    Génère directement la trace de luminosité (uint8) au centre des anneaux, sans images :
+    mêmes paramètres que synthetic_frames.
+
+    Retourne la trace et la vérité terrain (voir ground_truth).
+    """
+    rng = np.random.default_rng(seed)
+    displacement = np.zeros(n) if displacement is None else np.asarray(displacement, dtype=float)
+    truth = ground_truth(displacement, wavelength, thickness)
+
+    contrasts = np.linspace(contrast, contrast if final_contrast is None else final_contrast, n)
+    L = mean * (1 + contrasts * np.cos(truth["phase"]))
+    if noise:
+        L += rng.normal(0, noise, n)
+
+    return np.clip(L, 0, 255).astype(np.uint8), truth
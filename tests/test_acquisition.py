@@ -0,0 +1,157 @@
+import threading
+import time
+import numpy as np
+import pytest
+import acquisition as acq
+
+#%%
+
+class FakeCapture:
+    """
+    Caméra simulée : n images (indéfiniment si n vaut None) dont tous les pixels valent
+    l'index de l'image. Avec gate, chaque cap.read attend que l'évènement soit levé.
+    """
+
+    def __init__(self, n=None, gate=None):
+        self.n = n
+        self.gate = gate
+        self.index = 0
+        self.props = {}
+        self.log = []  # Appels dans l'ordre : ("read", index) ou ("set", propriété)
+        self.reading = threading.Event()  # Levé pendant un cap.read
+        self.released = False
+
+    def read(self):
+        self.reading.set()
+        if self.gate is not None:
+            self.gate.wait()
+        self.reading.clear()
+        if self.released:
+            raise RuntimeError("cap.read après cap.release")
+        if self.n is not None and self.index >= self.n:
+            return False, None
+        frame = np.full((4, 4, 3), self.index % 256, np.uint8)
+        self.log.append(("read", self.index))
+        self.index += 1
+        return True, frame
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        self.log.append(("set", prop))
+        return True
+
+    def release(self):
+        self.released = True
+
+def drain(pipeline):
+    packets = []
+    while (packet := pipeline.get(timeout=5)) is not None:
+        packets.append(packet)
+    return packets
+
+#%%
+
+def test_block_policy_keeps_every_frame():
+    pipeline = acq.CapturePipeline(FakeCapture(200), maxsize=4, policy="block").start()
+    packets = drain(pipeline)
+    pipeline.stop()
+
+    assert [packet["index"] for packet in packets] == list(range(200))
+    assert [int(packet["frame"][0, 0, 0]) for packet in packets] == [k % 256 for k in range(200)]
+    assert pipeline.stats()["dropped"] == 0
+
+def test_drop_policy_counts_dropped_frames():
+    pipeline = acq.CapturePipeline(FakeCapture(50), maxsize=3, policy="drop").start()
+    pipeline.threads[0].join(5)  # Lecture terminée sans consommateur : tampon plein
+    packets = drain(pipeline)
+
+    assert [packet["index"] for packet in packets] == [47, 48, 49]  # Les plus récentes
+    assert pipeline.stats()["dropped"] == 47
+
+def test_consume_sees_frames_in_order():
+    seen = []
+    pipeline = acq.CapturePipeline(FakeCapture(100), maxsize=2, policy="block").start()
+    pipeline.consume(lambda packet: seen.append(packet["index"]))
+    pipeline.threads[0].join(5)
+    pipeline.stop()
+
+    assert seen == list(range(100))
+    assert pipeline.stats()["analysis"]["count"] == 100
+
+def test_latest_returns_newest_frame():
+    pipeline = acq.CapturePipeline(FakeCapture(10), maxsize=16).start()
+    pipeline.threads[0].join(5)
+
+    assert pipeline.latest()["index"] == 9
+    assert pipeline.latest(after=9, timeout=0.05) is None
+
+#%%
+
+def test_set_during_read_is_applied_before_next_read():
+    gate = threading.Event()
+    cap = FakeCapture(gate=gate)
+    pipeline = acq.CapturePipeline(cap, maxsize=8, policy="drop").start()
+    assert cap.reading.wait(5)  # Thread de lecture bloqué dans cap.read
+
+    pipeline.set("gain", 12)
+    assert cap.props == {}  # Pas de cap.set pendant cap.read
+    gate.set()
+
+    deadline = time.monotonic() + 5
+    while "gain" not in cap.props and time.monotonic() < deadline:
+        time.sleep(0.001)
+    pipeline.release()
+
+    assert cap.props == {"gain": 12}
+    position = cap.log.index(("set", "gain"))
+    assert cap.log[position - 1] == ("read", 0) and cap.log[position + 1][0] == "read"
+
+def test_concurrent_set_is_never_lost():
+    cap = FakeCapture()
+    pipeline = acq.CapturePipeline(cap, maxsize=8, policy="drop").start()
+
+    def setter(k):
+        for i in range(500):
+            pipeline.set((k, i), i)
+
+    threads = [threading.Thread(target=setter, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    deadline = time.monotonic() + 5
+    while len(cap.props) < 2000 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    pipeline.release()
+
+    assert len(cap.props) == 2000
+
+#%%
+
+def test_release_waits_for_reader():
+    gate = threading.Event()
+    cap = FakeCapture(gate=gate)
+    pipeline = acq.CapturePipeline(cap, maxsize=8).start()
+    assert cap.reading.wait(5)
+
+    assert pipeline.release(timeout=0.05) is False  # Lecteur encore dans cap.read
+    assert not cap.released
+
+    gate.set()
+    deadline = time.monotonic() + 5
+    while not cap.released and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert cap.released  # Libérée par le thread de lecture en sortant
+
+def test_release_after_reader_finished():
+    cap = FakeCapture(5)
+    pipeline = acq.CapturePipeline(cap).start()
+    drain(pipeline)
+
+    assert pipeline.stop() is True
+    assert pipeline.release() is True and cap.released
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        acq.FrameBuffer(policy="wait")
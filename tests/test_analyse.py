@@ -0,0 +1,168 @@
+import cv2
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+import analyse as an
+
+#%%
+
+def crossings_loop(L, interval, position):
+    # Trigger de Schmitt échantillon par échantillon (ancienne boucle de luminosity_analyse)
+    low = np.broadcast_to(interval[0], len(L))
+    high = np.broadcast_to(interval[1], len(L))
+    crossings = []
+    for k in range(len(L)):
+        if L[k] >= high[k] and not position:  # Passage au-dessus du seuil haut
+            crossings.append(k)
+            position = True
+        if L[k] <= low[k] and position:  # Passage en dessous du seuil bas
+            crossings.append(k)
+            position = False
+    return crossings, position
+
+@pytest.mark.parametrize("seed", range(20))
+def test_get_crossings_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    L = rng.integers(0, 256, rng.integers(1, 500)).astype(np.uint8)
+    interval, mean = an.get_interval(L)
+    position = bool(L[0] >= mean)
+
+    crossings, state = an.get_crossings(L, interval, position)
+    assert (list(crossings), state) == crossings_loop(L, interval, position)
+
+@pytest.mark.parametrize("interval", [(100, 100), (120, 90), (0, 255)])
+@pytest.mark.parametrize("position", [False, True])
+def test_get_crossings_degenerate_thresholds(interval, position):
+    L = np.random.default_rng(0).integers(80, 130, 300)
+
+    crossings, state = an.get_crossings(L, interval, position)
+    assert (list(crossings), state) == crossings_loop(L, interval, position)
+
+def test_get_crossings_array_thresholds():
+    rng = np.random.default_rng(1)
+    L = rng.integers(0, 256, 1000)
+    low = rng.integers(0, 128, 1000)
+    high = low + rng.integers(0, 64, 1000)
+
+    crossings, state = an.get_crossings(L, (low, high), False)
+    assert (list(crossings), state) == crossings_loop(L, (low, high), False)
+
+def test_get_crossings_empty_trace():
+    crossings, state = an.get_crossings(np.array([], dtype=np.uint8), (10, 20), True)
+    assert len(crossings) == 0 and state is True
+
+#%%
+
+@pytest.fixture(scope="module")
+def ring_frame():
+    import synthetic as sy
+    return next(sy.synthetic_frames(1, shape=(120, 160), seed=0))
+
+@pytest.mark.parametrize("y", [0, 3, 7, 60, 112, 119])
+def test_luminosity_array_band_matches_full(ring_frame, y):
+    center = (80, y)
+    band = an.luminosity_array(ring_frame, center, mode="band")
+    full = an.luminosity_array(ring_frame, center, mode="full")
+    np.testing.assert_array_equal(band, full)
+
+def test_luminosity_array_band_matches_full_on_noise():
+    frame = np.random.default_rng(2).integers(0, 256, (64, 96, 3), dtype=np.uint8)
+    for y in range(frame.shape[0]):
+        np.testing.assert_array_equal(an.luminosity_array(frame, (10, y), mode="band"), an.luminosity_array(frame, (10, y), mode="full"))
+
+#%%
+
+@pytest.mark.parametrize("window_length", [4, 5, 6, 12, 13, 14, 31])
+def test_savgol_smooth_matches_savgol_filter(window_length):
+    L = np.random.default_rng(window_length).integers(0, 256, 200).astype(np.uint8)
+    np.testing.assert_allclose(an.savgol_smooth(L, window_length, 3), savgol_filter(L.astype(float), window_length, 3), atol=1e-9)
+
+@pytest.mark.parametrize("window_length", [6, 13])
+def test_savgol_smooth_along_axis(window_length):
+    T = np.random.default_rng(3).normal(100, 20, (40, 3))
+    np.testing.assert_allclose(an.savgol_smooth(T, window_length, 3, axis=0), savgol_filter(T, window_length, 3, axis=0), atol=1e-9)
+
+#%%
+
+@pytest.mark.parametrize("window", [1, 2, 15, 16, 1000])
+def test_windowed_interval_matches_get_interval_per_window(window):
+    L = np.random.default_rng(window).integers(0, 256, 300)
+    (low, high), mean = an.get_windowed_interval(L, window, min_amplitude=0)
+
+    for k in range(len(L)):
+        # Fenêtre centrée de window échantillons, tronquée aux bords
+        part = L[max(k - window // 2, 0):k + (window - 1) // 2 + 1]
+        interval, l_mean = an.get_interval(part)
+        assert (low[k], high[k], mean[k]) == (*interval, l_mean)
+
+def test_windowed_interval_min_amplitude():
+    L = np.full(100, 120)
+    L[::2] += 3  # Bruit seul, miroir immobile
+    res = an.luminosity_analyse(L, verbose=False, window=20, min_amplitude=10)
+    low, high = res["interval"]
+    assert (high - low >= 5).all()
+    assert res["count"] == 0
+
+def fading_trace():
+    import synthetic as sy
+    displacement = sy.mirror_displacement(3000, fps=30, speed=2e-6)
+    return sy.synthetic_trace(3000, displacement=displacement, contrast=0.8, final_contrast=0.1, noise=2.0, seed=0)
+
+def test_window_mode_follows_fading_contrast():
+    L, truth = fading_trace()
+    fixed = an.luminosity_analyse(L, verbose=False)
+    windowed = an.luminosity_analyse(L, verbose=False, window=150)
+
+    assert fixed["count"] < 0.8 * truth["extinctions"]  # Seuils globaux : franges de faible contraste perdues
+    assert abs(windowed["count"] - truth["extinctions"]) <= 0.01 * truth["extinctions"]
+
+def test_fringe_counter_window_mode():
+    L, truth = fading_trace()
+    counter = an.FringeCounter(window=150)
+    for k in range(0, len(L), 64):
+        counter.update(L[k:k + 64])
+    assert abs(counter.count - truth["extinctions"]) <= 0.02 * truth["extinctions"]
+
+#%%
+
+@pytest.mark.parametrize("shape, inner", [("square", 0), ("disk", 0), ("annulus", 0), ("annulus", 3)])
+@pytest.mark.parametrize("center", [(30, 20), (0, 0), (63, 47), (-4, 10), (66, 50)])
+def test_roi_luminosity_matches_full_frame(shape, inner, center):
+    frames = np.random.default_rng(4).integers(0, 256, (3, 48, 64, 3), dtype=np.uint8)
+    rows, cols, mask = an.get_roi(center, frames.shape[1:], 11, shape, inner)
+
+    for frame, value in zip(frames, an.get_position_luminosity_stack(center, frames, 11, shape, inner)):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)  # Ancien calcul : image entière convertie
+        expected = int(np.mean(gray[rows, cols][mask]))
+        assert an.get_position_luminosity(center, frame, 11, shape, inner) == expected == value
+        assert an.PointSampler([center], frame.shape, 11, shape, inner)(frame)[0] == expected
+
+def test_annulus_differs_from_disk():
+    assert an.get_roi_mask(11, "annulus", 3).sum() < an.get_roi_mask(11, "disk").sum()
+
+@pytest.mark.parametrize("inner", [-1, 5, 8])
+def test_annulus_rejects_invalid_inner_radius(inner):
+    with pytest.raises(ValueError):
+        an.get_roi_mask(11, "annulus", inner)
+
+@pytest.mark.parametrize("center", [(500, 500), (70, 10), (-6, 10), (10, 53)])
+def test_roi_outside_frame_rejected(center):
+    frame = np.zeros((48, 64, 3), np.uint8)
+    with pytest.raises(ValueError):
+        an.get_position_luminosity(center, frame)
+    with pytest.raises(ValueError):
+        an.get_position_luminosity_stack(center, frame[None])
+    with pytest.raises(ValueError):
+        an.PointSampler([center], frame.shape)
+
+#%%
+
+def test_ring_radii_on_synthetic_rings(ring_frame):
+    engine = an.RadialProfile(ring_frame.shape, (80, 60))
+    radii = engine.rings(ring_frame)
+    assert len(radii) >= 2 and np.all(np.diff(radii) > 0)
+
+def test_ring_radii_without_valid_bin():
+    engine = an.RadialProfile((120, 160), (2000, 2000), max_radius=50)  # Aucune couronne dans l'image
+    radii = an.ring_radii(engine(np.zeros((120, 160), np.uint8)), engine.radii)
+    assert len(radii) == 0
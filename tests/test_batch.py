@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import batch as bt
+import main
+import synthetic as sy
+
+#%%
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    file_name = str(tmp_path_factory.mktemp("videos") / "anneaux.avi")
+    sy.write_synthetic_video(file_name, 120, shape=(120, 160), displacement=sy.mirror_displacement(120, 30, speed=1e-6), seed=0)
+    return file_name
+
+@pytest.mark.parametrize("workers, chunks", [(1, None), (2, None), (3, None), (2, 5), (3, 7)])
+def test_parallel_trace_identical_to_sequential(video, workers, chunks):
+    reference, fps = main.luminosity_trace_from_file(video, (80, 60))
+    L, fps_parallel = bt.parallel_luminosity_trace(video, (80, 60), workers, chunks=chunks)
+
+    assert L.dtype == reference.dtype
+    np.testing.assert_array_equal(L, reference)
+    assert fps_parallel == fps
+
+@pytest.mark.parametrize("start, stop", [(10, 100), (7, None), (0, 50)])
+def test_parallel_trace_range(video, start, stop):
+    reference, _ = main.luminosity_trace_from_file(video, (80, 60), start, stop, 7, "disk")
+    L, _ = bt.parallel_luminosity_trace(video, (80, 60), 3, start, stop, 7, "disk")
+    np.testing.assert_array_equal(L, reference)
+
+def test_parallel_trace_detected_center(video):
+    reference, _ = main.luminosity_trace_from_file(video, None)
+    L, _ = bt.parallel_luminosity_trace(video, None, 2)
+    np.testing.assert_array_equal(L, reference)
+
+def test_parallel_trace_rejects_roi_outside_frame(video):
+    assert bt.parallel_luminosity_trace(video, (500, 500), 2) == (None, None)
+
+#%%
+
+@pytest.fixture
+def folder(tmp_path, video):
+    import shutil
+    import cv2
+    for sub in ("a", "b"):
+        (tmp_path / sub).mkdir()
+        shutil.copy(video, tmp_path / sub / "v.avi")  # Même nom dans deux sous-dossiers
+    (tmp_path / "c").mkdir()
+    (tmp_path / "c" / "x.avi").write_bytes(b"pas une video")
+    
+    # Bruit sans anneaux : centre introuvable
+    writer = cv2.VideoWriter(str(tmp_path / "c" / "bruit.avi"), cv2.VideoWriter_fourcc(*"MJPG"), 30, (160, 120))
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        writer.write(rng.integers(0, 256, (120, 160, 3), dtype=np.uint8))
+    writer.release()
+    return tmp_path
+
+def read_table(output):
+    import csv
+    with open(output, newline="") as table:
+        return list(csv.DictReader(table))
+
+def test_trace_name_keeps_subfolders(folder):
+    files = bt.find_videos(str(folder / "*" / "*.avi"))
+    names = [bt.trace_name(file_name, str(folder)) for file_name in files]
+    assert len(set(names)) == len(files)
+    assert bt.trace_name(str(folder / "a" / "v.avi"), str(folder)) != bt.trace_name(str(folder / "b" / "v.avi"), str(folder))
+
+def test_batch_count_errors_and_traces(folder):
+    import tracefile as tf
+    output = str(folder / "resultats.csv")
+    bt.batch_count(str(folder / "*" / "*.avi"), None, output, workers=1)
+    rows = {row["file"]: row for row in read_table(output)}
+
+    assert rows[str(folder / "c" / "x.avi")]["error"] == "lecture impossible"
+    assert rows[str(folder / "c" / "bruit.avi")]["error"] == "centre introuvable"
+    
+    traces = {rows[str(folder / sub / "v.avi")]["trace"] for sub in ("a", "b")}
+    assert len(traces) == 2  # Pas d'écrasement entre sous-dossiers
+    for trace in traces:
+        L, _, header = tf.load_trace(trace)
+        assert len(L) == 120 and header["centers"] and rows[header["video"]]["center"] == " ".join(map(str, header["centers"][0]))
+
+def test_batch_count_resume_keeps_one_row_per_file(folder, video):
+    import shutil
+    output = str(folder / "resultats.csv")
+    pattern = str(folder / "*" / "*.avi")
+    bt.batch_count(pattern, (80, 60), output, workers=1)
+    
+    # Fichier réparé entre les deux passes et ligne tronquée par un arrêt brutal
+    shutil.copy(video, folder / "c" / "x.avi")
+    with open(output, "a") as table:
+        table.write(str(folder / "c" / "bruit.avi") + ",80 60,3")
+    
+    rows = bt.batch_count(pattern, (80, 60), output, workers=1)
+    table = read_table(output)
+    
+    assert sorted(row["file"] for row in table) == bt.find_videos(pattern)
+    assert len(rows) == len(table) == 4
+    assert all(row["error"] == "" for row in table)
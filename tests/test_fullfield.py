@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+import pytest
+import fullfield as ff
+
+#%%
+
+def tilted_fringes(shape=(96, 128), frequency=(0.03, 0.08), offset=0.0, mean=128, amplitude=100):
+    # Franges rectilignes : I = a + b cos(2 pi (fx x + fy y) + offset)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    return mean + amplitude * np.cos(2 * np.pi * (frequency[1] * x + frequency[0] * y) + offset)
+
+def test_find_carrier():
+    fy, fx = ff.find_carrier(tilted_fringes(frequency=(0.03125, 0.078125)))  # Fréquences exactes de la FFT
+    assert (fy, fx) == pytest.approx((0.03125, 0.078125))
+
+@pytest.mark.parametrize("frequency", [(0.03, 0.08), (-0.05, 0.06), (0.0, 0.1)])
+def test_fourier_phase_recovers_tilt(frequency):
+    res = ff.fourier_phase(tilted_fringes(frequency=frequency))
+    (ax, ay), _, _ = ff.fit_plane(ff.unwrap_phase(res["phase"]), res["modulation"])
+
+    tolerance = 0.02 * 2 * np.pi * np.hypot(*frequency)  # Fuite spectrale : nombre de franges non entier
+    assert (ax, ay) == pytest.approx((2 * np.pi * frequency[1], 2 * np.pi * frequency[0]), abs=tolerance)
+
+def test_fourier_phase_stack_matches_single_frames():
+    frames = np.array([tilted_fringes(offset=offset) for offset in (0.0, 0.5, 1.0)])
+    res = ff.fourier_phase(frames)
+    for frame, phase in zip(frames, res["phase"]):
+        np.testing.assert_allclose(ff.fourier_phase(frame, res["carrier"])["phase"], phase, atol=1e-4)
+
+#%%
+
+def test_unwrap_phase_recovers_smooth_phase():
+    y, x = np.mgrid[0:64, 0:80]
+    phase = 0.002 * ((x - 30) ** 2 + (y - 40) ** 2) + 0.2 * x  # Jusqu'à une quinzaine de tours
+    unwrapped = ff.unwrap_phase(ff.wrap_phase(phase))
+
+    difference = unwrapped - phase
+    assert np.ptp(difference) < 1e-3  # Égale à 2 k pi près, uniformément
+    assert np.round(difference.mean() / (2 * np.pi)) * 2 * np.pi == pytest.approx(difference.mean(), abs=1e-3)
+
+def test_fit_plane():
+    y, x = np.mgrid[0:40, 0:60]
+    (ax, ay), c, flatness = ff.fit_plane(0.3 * x - 0.1 * y + 2.0, step=1)
+    assert (ax, ay, c) == pytest.approx((0.3, -0.1, 2.0)) and flatness == pytest.approx(0, abs=1e-9)
+
+#%%
+
+def test_temporal_phase_recovers_phase():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:32, 0:48]
+    phase = 0.01 * ((x - 20) ** 2 + (y - 10) ** 2)
+    shifts = np.linspace(0, 3 * np.pi, 14)
+    shifts[5] = np.nan  # Image sans pas du moteur : ignorée
+    frames = np.array([100 + 60 * np.cos(phase + (delta if np.isfinite(delta) else 0.0)) + rng.normal(0, 1, phase.shape) for delta in shifts], dtype=np.float32)
+
+    res = ff.temporal_phase(iter(frames), shifts, chunk=4)
+
+    assert np.abs(ff.wrap_phase(res["phase"] - phase)).max() < 0.1
+    np.testing.assert_allclose(res["modulation"], 60, rtol=0.05)
+    np.testing.assert_allclose(res["mean"], 100, atol=2)
+
+def test_temporal_phase_insufficient_shifts():
+    frames = np.zeros((5, 8, 8), np.float32)
+    assert ff.temporal_phase(iter(frames), np.full(5, 0.1)) is None
+
+#%%
+
+def test_phase_maps_fourier(tmp_path):
+    file_name = str(tmp_path / "coin.avi")
+    writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*"MJPG"), 30, (128, 96))
+    for offset in np.linspace(0, 2, 6):
+        gray = np.clip(tilted_fringes(offset=offset), 0, 255).astype(np.uint8)
+        writer.write(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    writer.release()
+
+    res = ff.phase_maps(file_name, str(tmp_path / "carte"), chunk=4)
+
+    assert res["frames"] == 6
+    assert np.load(res["unwrapped"], mmap_mode="r").shape == (6, 96, 128)
+    np.testing.assert_allclose(res["tilt"][:, 0], 2 * np.pi * 0.08, rtol=0.02)
+
+def test_phase_maps_unknown_method(tmp_path):
+    assert ff.phase_maps(str(tmp_path / "absente.avi"), str(tmp_path / "carte"), method="zernike") is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import tracefile as tf
+
+#%%
+
+@pytest.mark.parametrize("shape, high", [((500,), 255), ((500,), 4000), ((300, 4), 255)])
+def test_save_load_round_trip(tmp_path, shape, high):
+    file_name = str(tmp_path / "mesure.trace")
+    L = np.random.default_rng(0).integers(0, high + 1, shape)
+    timestamps = np.arange(shape[0]) / 30
+
+    tf.save_trace(file_name, L, timestamps, video="video.avi", centers=[(320, 240)], fps=np.float64(30))
+    L_read, t_read, header = tf.load_trace(file_name)
+
+    np.testing.assert_array_equal(L_read, L)
+    np.testing.assert_array_equal(t_read, timestamps)
+    assert header["dtype"] == ("uint8" if high <= 255 else "uint16")
+    assert header["video"] == "video.avi" and header["centers"] == [[320, 240]] and header["fps"] == 30
+
+def test_writer_appends_and_ignores_partial_record(tmp_path):
+    file_name = str(tmp_path / "direct.trace")
+    with tf.TraceWriter(file_name, camera=0) as writer:
+        for k in range(10):
+            writer.append(k, k * 0.1)
+        writer.append([10, 11])  # Sans instants de capture
+
+    with open(file_name, "ab") as file:
+        file.write(b"\x00" * 3)  # Enregistrement incomplet (arrêt brutal)
+
+    L, t, header = tf.load_trace(file_name)
+    np.testing.assert_array_equal(L, np.arange(12))
+    np.testing.assert_allclose(t[:10], np.arange(10) * 0.1)
+    assert np.isnan(t[10:]).all() and header["camera"] == 0
+
+def test_writer_flushes_periodically(tmp_path):
+    file_name = str(tmp_path / "flush.trace")
+    writer = tf.TraceWriter(file_name, flush_records=4, flush_seconds=3600)
+    writer.append(np.arange(3))
+    assert len(tf.load_trace(file_name)[0]) == 0
+    writer.append(3)
+    assert len(tf.load_trace(file_name)[0]) == 4  # Visible sur le disque avant close
+    writer.close()
+
+def test_empty_trace(tmp_path):
+    file_name = str(tmp_path / "vide.trace")
+    tf.save_trace(file_name, np.empty(0, np.uint8))
+    L, t, header = tf.load_trace(file_name)
+    assert len(L) == 0 and len(t) == 0
+
+def test_save_trace_rejects_out_of_range(tmp_path):
+    with pytest.raises(ValueError):
+        tf.save_trace(str(tmp_path / "x.trace"), np.array([-1, 3]))
@@ -0,0 +1,165 @@
+"""
+Fichiers de trace de luminosité.
+
+Une trace est enregistrée dans un fichier binaire compact (extension .trace) :
+- une ligne d'en-tête "MICHELSON-TRACE <version>",
+- une ligne JSON décrivant la mesure (vidéo, centre(s), zone de mesure, fps, ...),
+- puis, pour chaque image, un enregistrement de taille fixe : l'instant de capture
+  (float64, en secondes) suivi de la luminosité de chaque point (uint8 ou uint16).
+
+Les enregistrements sont ajoutés au fur et à mesure de l'acquisition (TraceWriter) et écrits
+sur le disque au moins une fois par seconde : un arrêt brutal ne fait perdre que les dernières
+images. load_trace relit le fichier avec numpy.memmap, sans copie, ce qui permet de recompter
+une trace de plusieurs heures en quelques millisecondes avec d'autres seuils ou filtres.
+
+Exemple :
+L, timestamps, header = load_trace("20240312_153000.trace")
+an.luminosity_analyse(L, smooth=7)
+"""
+
+#%%
+
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+
+#%%
+
+MAGIC = b"MICHELSON-TRACE"
+VERSION = 1
+
+def record_dtype(points=1, dtype="uint8"):
+    """
+    Renvoie le type NumPy d'un enregistrement : instant de capture "t" et luminosité(s) "L".
+
+    """
+    if np.dtype(dtype) not in (np.uint8, np.uint16):
+        raise ValueError(f"Type d'échantillon non pris en charge : {dtype}")
+    return np.dtype([("t", "<f8"), ("L", np.dtype(dtype).newbyteorder("<"), (points,) if points > 1 else ())])
+
+def _to_json(value):
+    # Types NumPy présents dans les métadonnées (centres, fps, ...)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Métadonnée non sérialisable : {value!r}")
+
+#%%
+
+class TraceWriter:
+    """
+    Écrit une trace de luminosité au fur et à mesure de l'acquisition.
+
+    points est le nombre de points mesurés par image et dtype le type des échantillons
+    ("uint8" ou "uint16"). Les enregistrements sont écrits sur le disque toutes les
+    flush_records images ou toutes les flush_seconds secondes. Les autres arguments (video,
+    center, size, shape, fps, ...) sont enregistrés tels quels dans l'en-tête.
+    """
+
+    def __init__(self, file_name, points=1, dtype="uint8", flush_records=256, flush_seconds=1.0, **metadata):
+        self.file_name = file_name
+        self.dtype = record_dtype(points, dtype)
+        self.points = points
+        self.count = 0  # Nombre d'enregistrements écrits
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self.flushed = 0  # Nombre d'enregistrements au dernier flush
+        self.last_flush = time.monotonic()
+
+        header = {"version": VERSION, "dtype": np.dtype(dtype).name, "points": points,
+                  "created": datetime.now().isoformat(timespec="seconds"), **metadata}
+        text = json.dumps(header, default=_to_json, ensure_ascii=False).encode()
+        first = MAGIC + b" %d\n" % VERSION
+
+        # Complète l'en-tête pour que les enregistrements commencent sur un multiple de 16 octets
+        padding = -(len(first) + len(text) + 1) % 16
+        self.file = open(file_name, "wb")
+        self.file.write(first + text + b" " * padding + b"\n")
+        self.flush()  # En-tête lisible dès la création
+
+    def append(self, samples, timestamps=None):
+        """
+        Ajoute un ou plusieurs échantillons (tableau images [* points]) et leurs instants de
+        capture (NaN si timestamps vaut None).
+        """
+        samples = np.asarray(samples)
+        if self.points > 1:
+            samples = samples.reshape(-1, self.points)
+        else:
+            samples = samples.reshape(-1)
+
+        records = np.empty(len(samples), self.dtype)
+        records["L"] = samples
+        records["t"] = np.nan if timestamps is None else timestamps
+
+        self.file.write(records.tobytes())
+        self.count += len(records)
+
+        # Vidage périodique : un arrêt brutal ne perd que les dernières images
+        if self.count - self.flushed >= self.flush_records or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.flushed = self.count
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#%%
+
+def save_trace(file_name, L, timestamps=None, **metadata):
+    """
+    Enregistre en une fois la trace L (images [* points]) dans file_name.
+    Les échantillons sont stockés en uint8 s'ils le permettent, en uint16 sinon.
+    """
+    L = np.asarray(L)
+    if L.size and (L.min() < 0 or L.max() > np.iinfo(np.uint16).max):
+        raise ValueError("Les luminosités doivent être comprises entre 0 et 65535.")
+
+    dtype = "uint8" if not L.size or L.max() <= np.iinfo(np.uint8).max else "uint16"
+    points = L.shape[1] if L.ndim > 1 else 1
+
+    with TraceWriter(file_name, points, dtype, **metadata) as writer:
+        writer.append(L, timestamps)
+
+def read_header(file_name):
+    """
+    Renvoie l'en-tête (dictionnaire) d'un fichier de trace et la position du premier enregistrement.
+
+    """
+    with open(file_name, "rb") as file:
+        first = file.readline()
+        if not first.startswith(MAGIC):
+            raise ValueError(f"{file_name} n'est pas un fichier de trace.")
+        header = json.loads(file.readline())
+        return header, file.tell()
+
+def load_trace(file_name):
+    """
+    Relit un fichier de trace sans le charger en mémoire (numpy.memmap).
+
+    Retourne la trace de luminosité (images [* points], en lecture seule), les instants de
+    capture et l'en-tête. Un dernier enregistrement incomplet (arrêt brutal) est ignoré.
+    """
+    header, offset = read_header(file_name)
+    dtype = record_dtype(header["points"], header["dtype"])
+    n = (os.path.getsize(file_name) - offset) // dtype.itemsize
+
+    if n == 0:
+        records = np.empty(0, dtype)
+    else:
+        records = np.memmap(file_name, dtype, mode="r", offset=offset, shape=(n,))
+
+    return records["L"], records["t"], header
@@ -0,0 +1,225 @@
+"""
+Index des images d'un fichier vidéo et accès direct à une image quelconque.
+
+L'index (nombre réel d'images, instant de chaque image, précision du positionnement) est
+construit une fois en parcourant la vidéo sans la décoder, puis enregistré à côté du fichier
+(video.avi.index.npz) ; il est reconstruit si la vidéo a été modifiée.
+
+IndexedVideo s'en sert pour lire n'importe quelle image : les images déjà décodées sont
+gardées dans un petit cache LRU, la lecture vers l'avant continue le décodage en cours et un
+retour en arrière décode d'un coup le bloc d'images qui précède, si bien que les retours
+image par image sont ensuite servis par le cache.
+"""
+
+#%%
+
+import os
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+#%%
+
+INDEX_VERSION = 1
+
+def index_path(file_name):
+    """
+    Renvoie le chemin du fichier d'index associé à une vidéo.
+
+    """
+    return file_name + ".index.npz"
+
+def _thumbnail(frame):
+    # Empreinte d'une image pour vérifier le positionnement
+    return cv2.resize(frame, (16, 16), interpolation=cv2.INTER_AREA)
+
+class FrameIndex:
+    """
+    Index d'un fichier vidéo :
+    - frame_count : nombre d'images réellement lisibles (CAP_PROP_FRAME_COUNT est parfois faux),
+    - fps : nombre d'images par seconde annoncé,
+    - timestamps : instant de chaque image en millisecondes,
+    - exact_seek : True si le positionnement par CAP_PROP_POS_FRAMES donne exactement l'image demandée.
+    """
+
+    def __init__(self, frame_count, fps, timestamps, exact_seek, size=None, mtime=None):
+        self.frame_count = frame_count
+        self.fps = fps
+        self.timestamps = timestamps
+        self.exact_seek = exact_seek
+        self.size = size
+        self.mtime = mtime
+
+    def __len__(self):
+        return self.frame_count
+
+    @classmethod
+    def build(cls, file_name, probes=5):
+        """
+        Construit l'index d'une vidéo en la parcourant une fois (grab, sans décodage), puis
+        vérifie le positionnement direct sur probes images réparties dans la vidéo.
+
+        Retourne None si le fichier ne peut pas être ouvert.
+        """
+        cap = cv2.VideoCapture(file_name)
+        if not cap.isOpened():
+            print("Erreur : Impossible d'ouvrir le fichier.")
+            return None
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        announced = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        checks = set(np.linspace(0, max(announced - 1, 0), probes).astype(int)) if announced > 0 else set()
+
+        timestamps = []
+        thumbnails = {}
+        while cap.grab():
+            index = len(timestamps)
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+            if index in checks:
+                ret, frame = cap.retrieve()
+                if ret:
+                    thumbnails[index] = _thumbnail(frame)
+
+        # Le positionnement est exact si chaque image de contrôle est retrouvée à l'identique
+        exact_seek = bool(thumbnails)
+        for index, thumbnail in thumbnails.items():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret or not np.array_equal(_thumbnail(frame), thumbnail):
+                exact_seek = False
+                break
+        cap.release()
+
+        stat = os.stat(file_name)
+        return cls(len(timestamps), fps, np.array(timestamps), exact_seek, stat.st_size, stat.st_mtime)
+
+    def save(self, file_name):
+        """
+        Enregistre l'index à côté de la vidéo file_name.
+
+        """
+        np.savez(index_path(file_name), version=INDEX_VERSION, frame_count=self.frame_count, fps=self.fps,
+                 timestamps=self.timestamps, exact_seek=self.exact_seek, size=self.size, mtime=self.mtime)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Relit l'index enregistré d'une vidéo. Renvoie None s'il n'existe pas, s'il est illisible
+        ou si la vidéo a changé depuis sa construction.
+        """
+        path = index_path(file_name)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return None
+                index = cls(int(data["frame_count"]), float(data["fps"]), data["timestamps"], bool(data["exact_seek"]),
+                            int(data["size"]), float(data["mtime"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        stat = os.stat(file_name)
+        if (index.size, index.mtime) != (stat.st_size, stat.st_mtime):
+            return None
+        return index
+
+    @classmethod
+    def for_video(cls, file_name):
+        """
+        Renvoie l'index de la vidéo, construit et enregistré s'il n'existe pas encore.
+
+        """
+        index = cls.load(file_name)
+        if index is None:
+            index = cls.build(file_name)
+            if index is not None:
+                try:
+                    index.save(file_name)
+                except OSError:
+                    pass  # Dossier en lecture seule : l'index reste en mémoire
+        return index
+
+#%%
+
+class IndexedVideo:
+    """
+    Accès direct aux images d'une vidéo indexée (voir FrameIndex), avec un cache LRU des
+    cache_size dernières images décodées.
+
+    Un retour en arrière hors du cache décode les backfill images qui précèdent l'image
+    demandée, pour que les retours suivants soient immédiats.
+    """
+
+    def __init__(self, file_name, cache_size=64, backfill=8, index=None):
+        self.file_name = file_name
+        self.index = index or FrameIndex.for_video(file_name)
+        self.cap = cv2.VideoCapture(file_name)
+        self.position = 0  # Index de la prochaine image décodée par cap.read
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.backfill = min(backfill, cache_size)
+
+    def __len__(self):
+        return len(self.index) if self.index is not None else 0
+
+    def isOpened(self):
+        return self.index is not None and self.cap.isOpened()
+
+    def timestamp(self, i):
+        """
+        Renvoie l'instant de l'image i en secondes.
+
+        """
+        return self.index.timestamps[i] / 1000
+
+    def read(self, i):
+        """
+        Renvoie l'image numéro i, ou None si elle n'existe pas.
+
+        """
+        if not 0 <= i < len(self):
+            return None
+
+        if i in self.cache:
+            self.cache.move_to_end(i)
+            return self.cache[i]
+
+        if i < self.position or i - self.position > self.backfill:
+            # Retour en arrière ou saut lointain : repositionnement au début du bloc qui précède i
+            self._seek(max(i - self.backfill + 1, 0) if i < self.position else i)
+
+        frame = None
+        while self.position <= i:
+            ret, frame = self.cap.read()
+            if not ret:
+                return None
+            self._store(self.position, frame)
+            self.position += 1
+
+        return frame
+
+    def _seek(self, i):
+        if self.index.exact_seek:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+            self.position = i
+            return
+
+        # Positionnement imprécis : on repart du début si nécessaire et on avance sans décoder
+        if i < self.position:
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.file_name)
+            self.position = 0
+        while self.position < i and self.cap.grab():
+            self.position += 1
+
+    def _store(self, i, frame):
+        self.cache[i] = frame
+        self.cache.move_to_end(i)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def release(self):
+        self.cap.release()
+        self.cache.clear()